@@ -0,0 +1,302 @@
+import contextlib
+import json
+import os
+import re
+import time
+import traceback
+from collections import namedtuple
+import pandas as pd
+import erlang_staffing
+from erlang_staffing import DAYS_OF_WEEK, INTERVAL_MINUTES, MINUTES_PER_HOUR
+from output import DETAIL, Reporter, use_reporter
+from parallel_executor import run_tasks
+from pipeline import StaffingPipeline
+
+BATCH_OUTPUT_DIR = 'batch_output'  # Default directory of the per-site outputs
+BATCH_SUMMARY = 'batch_summary.csv'  # Consolidated summary, written to the output directory
+BATCH_CACHE = 'staffing_cache.sqlite'  # Staffing cache shared by every site and worker
+FORECAST_EXTENSIONS = ('.csv', '.parquet', '.pq', '.npy')
+
+# One site to plan: its forecast file, the site's name within that file (None for a
+# single-site file), the position of its first day in the forecast and the interval
+# length of a CSV or Parquet forecast (None for the batch's forecast_interval)
+SiteJob = namedtuple('SiteJob', ['site', 'path', 'forecast_site', 'start_day', 'forecast_interval'],
+                     defaults=(None,))
+
+# Staffing caches opened by this process, by path; they stay warm from one site to the next
+_worker_caches = {}
+
+
+def discover_sites(source):
+    """
+    List the sites of a batch
+
+    The source is either a directory or a manifest file:
+    - In a directory, every CSV or Parquet file is one site named after the file, and
+      every .npy forecast (from forecast_data, with its .json labels) adds all its sites.
+    - A manifest is a CSV with a 'site' and a 'path' column, and optionally
+      'forecast_site' (the site's name inside a multi-site file), 'start_day' and
+      'forecast_interval' (the interval length of a CSV or Parquet forecast in minutes).
+      Relative paths are taken from the manifest's directory.
+
+    Parameters:
+    source (str): Directory of forecasts or manifest CSV
+
+    Returns:
+    list: One SiteJob per site, sorted by site name for directories, in manifest order otherwise
+    """
+    if os.path.isdir(source):
+        jobs = []
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            stem, extension = os.path.splitext(name)
+            if extension.lower() not in FORECAST_EXTENSIONS:
+                continue
+            if extension.lower() == '.npy':
+                with open(f"{path}.json") as file:
+                    sites = json.load(file)['sites']
+                jobs.extend(SiteJob(site if len(sites) > 1 else stem, path, site, 0) for site in sites)
+            else:
+                jobs.append(SiteJob(stem, path, None, 0))
+        jobs.sort(key=lambda job: job.site)
+    else:
+        manifest = pd.read_csv(source)
+        if not {'site', 'path'} <= set(manifest.columns):
+            raise ValueError("A batch manifest needs 'site' and 'path' columns")
+        base = os.path.dirname(os.path.abspath(source))
+        jobs = []
+        for row in manifest.to_dict('records'):
+            forecast_site = row.get('forecast_site')
+            start_day = row.get('start_day')
+            forecast_interval = row.get('forecast_interval')
+            jobs.append(SiteJob(str(row['site']), os.path.join(base, str(row['path'])),
+                                None if pd.isna(forecast_site) else str(forecast_site),
+                                0 if pd.isna(start_day) else int(start_day),
+                                None if pd.isna(forecast_interval) else int(forecast_interval)))
+
+    sites = [job.site for job in jobs]
+    duplicates = sorted({site for site in sites if sites.count(site) > 1})
+    if duplicates:
+        raise ValueError(f"Sites listed more than once: {', '.join(duplicates)}")
+    if not jobs:
+        raise ValueError(f"No site forecasts found in {source}")
+    return jobs
+
+
+def site_directory(output_dir, site):
+    """Output directory of a site; characters that are not safe in file names become '_'"""
+    return os.path.join(output_dir, re.sub(r'[^\w.-]+', '_', site))
+
+
+def shared_cache(path):
+    """
+    The staffing cache of this process for a path
+
+    Every worker opens the SQLite file once and keeps its in-memory entries across the
+    sites it plans, so identical (arrival rate, AHT, SLA, interval) cells are solved once
+    per batch and later batches start warm.
+    """
+    if path is None:
+        return None
+    if path not in _worker_caches:
+        from staffing_cache import StaffingCache
+        _worker_caches[path] = StaffingCache(path=path)
+    return _worker_caches[path]
+
+
+def load_site_rates(job, forecast_interval=MINUTES_PER_HOUR):
+    """
+    Read one site's week of calls, at the interval length of its forecast file
+
+    Parameters:
+    job (SiteJob): The site to read
+    forecast_interval (int): Interval length of a CSV or Parquet forecast in minutes,
+                             unless the job has its own (default: 60)
+
+    Returns:
+    dict: Calls per day and interval
+    """
+    from forecast_data import load_forecast, open_forecast
+    if job.path.lower().endswith('.npy'):
+        forecast = open_forecast(job.path)
+    else:
+        if job.forecast_interval is not None:
+            forecast_interval = job.forecast_interval
+        forecast = load_forecast(job.path, interval_minutes=forecast_interval)
+    if job.forecast_site is None and len(forecast.sites) > 1:
+        raise ValueError(f"{job.path} holds {len(forecast.sites)} sites; list them in a manifest "
+                         f"with a forecast_site column")
+    return forecast.arrival_rates(job.forecast_site, job.start_day,
+                                  interval_minutes=forecast.interval_minutes)
+
+
+def run_site(job, output_dir=BATCH_OUTPUT_DIR, interval_minutes=INTERVAL_MINUTES, solver='batch',
+             simulate=False, plots=True, cache_path=None, seed=0, report_format='xlsx',
+             verbosity=DETAIL, ndjson=False, forecast_interval=MINUTES_PER_HOUR):
+    """
+    Run the whole pipeline for one site and write its outputs
+
+    The site's progress goes to run.log in its output directory, and with ndjson=True
+    every record also goes to run.ndjson, tagged with the site. Any error is caught and
+    reported in the returned row, with the traceback in run.log, so one site cannot
+    stop a batch.
+
+    Parameters:
+    job (SiteJob): The site to plan
+    output_dir (str): Batch output directory; the site writes to a subdirectory of it
+    interval_minutes (int): Staffing interval length (default: INTERVAL_MINUTES)
+    solver (str): Staffing solver, see calculate_hourly_staffing_needs (default: 'batch')
+    simulate (bool): Also simulate the ideal pattern with the fast engine (default: False)
+    plots (bool): Write the staffing chart (default: True)
+    cache_path (str): SQLite staffing cache shared by the batch (default: None, no cache)
+    seed (int): Root seed of the simulation; common random numbers make sites comparable
+    report_format (str): 'xlsx', 'csv' or 'parquet', see create_excel_report (default: 'xlsx')
+    verbosity (int or str): Level of run.log, see output.Reporter (default: DETAIL)
+    ndjson (bool): Also write the records to run.ndjson (default: False)
+    forecast_interval (int): Interval length of a CSV or Parquet forecast in minutes, unless
+                             the job has its own (default: 60)
+
+    Returns:
+    dict: A summary row: site, status, error, seconds and the site's key figures
+    """
+    directory = site_directory(output_dir, job.site)
+    os.makedirs(directory, exist_ok=True)
+    row = {'site': job.site, 'status': 'ok', 'error': None, 'output_dir': directory}
+    start = time.perf_counter()
+
+    reporter = Reporter(verbosity, ndjson=os.path.join(directory, 'run.ndjson') if ndjson else None,
+                        context={'site': job.site})
+    with open(os.path.join(directory, 'run.log'), 'w') as log, contextlib.redirect_stdout(log), \
+            reporter, use_reporter(reporter):
+        try:
+            cache = shared_cache(cache_path)
+            pipeline = StaffingPipeline(
+                arrival_rates=load_site_rates(job, forecast_interval), interval_minutes=interval_minutes, solver=solver,
+                cache=cache, simulation_options={'seed': seed, 'engine': 'fast', 'crn': True})
+            hits = cache.hits if cache is not None else 0
+            staffing_needs = pipeline.staffing_needs
+            if cache is not None:
+                row['cache_hits'] = cache.hits - hits
+            pd.DataFrame(staffing_needs, columns=DAYS_OF_WEEK).to_csv(
+                os.path.join(directory, 'staffing_needs.csv'), index_label='interval')
+            if plots:
+                erlang_staffing.visualize_staffing_needs(
+                    staffing_needs, os.path.join(directory, 'hourly_staffing_needs.png'))
+
+            ideal_pattern = pipeline.ideal_pattern
+
+            staff_hours = sum(map(sum, staffing_needs.values())) * interval_minutes / MINUTES_PER_HOUR
+            row.update({
+                'weekly_staff_hours': staff_hours,
+                'peak_staff': max(map(max, staffing_needs.values())),
+                'pattern_number': ideal_pattern['pattern_number'],
+                'shift_times': ", ".join(ideal_pattern['shift_times']),
+                'total_weekly_agents': ideal_pattern['total_weekly_agents'],
+                'total_weekly_hours': ideal_pattern['total_weekly_hours'],
+                'avg_utilization': ideal_pattern['avg_utilization'],
+            })
+
+            if simulate:
+                from shift_simulation import TARGET_SLA
+                from wait_metrics import merge_wait_histograms
+                shifts = [shift for day_shifts in pipeline.pattern_simulation.values()
+                          for shift in day_shifts]
+                calls_arrived = sum(shift['calls_arrived'] for shift in shifts)
+                calls_abandoned = sum(shift['calls_abandoned'] for shift in shifts)
+                wait_metrics = merge_wait_histograms(shift['wait_metrics'] for shift in shifts)
+                row.update({
+                    'calls_arrived': int(calls_arrived),
+                    'abandonment_rate': calls_abandoned / calls_arrived * 100 if calls_arrived > 0 else 0.0,
+                    'service_level': float(wait_metrics.service_level(TARGET_SLA)),
+                    'avg_wait': float(wait_metrics.mean),
+                })
+
+            pipeline.write_report(os.path.join(directory, 'StaffingReport.xlsx'), report_format)
+        except Exception as error:
+            traceback.print_exc(file=log)
+            row.update({'status': 'failed', 'error': f"{type(error).__name__}: {error}"})
+
+    row['seconds'] = time.perf_counter() - start
+    return row
+
+
+def run_batch(source, output_dir=BATCH_OUTPUT_DIR, workers=None, interval_minutes=INTERVAL_MINUTES,
+              solver='batch', simulate=False, plots=True, cache_path=None, seed=0,
+              report_format='xlsx', verbosity=DETAIL, ndjson=False, forecast_interval=MINUTES_PER_HOUR):
+    """
+    Plan every site of a batch across a process pool
+
+    Sites are independent, so they are spread over the workers (parallel_executor.run_tasks).
+    Each site writes its report, chart, staffing table and log to its own directory, and
+    the summary of every site, failed ones included, is written to batch_summary.csv.
+
+    Parameters:
+    source (str): Directory of forecasts or manifest CSV, see discover_sites
+    output_dir (str): Directory of the outputs (default: 'batch_output')
+    workers (int): Number of worker processes; 1 runs in this process, None uses every core
+    interval_minutes (int): Staffing interval length (default: INTERVAL_MINUTES)
+    solver (str): Staffing solver, see calculate_hourly_staffing_needs (default: 'batch')
+    simulate (bool): Also simulate each site's ideal pattern (default: False)
+    plots (bool): Write each site's staffing chart (default: True)
+    cache_path (str): SQLite staffing cache shared by every worker
+                      (default: None, staffing_cache.sqlite in output_dir)
+    seed (int): Root seed of the simulations (default: 0)
+    report_format (str): 'xlsx', 'csv' or 'parquet' reports (default: 'xlsx')
+    verbosity (int or str): Level of each site's run.log (default: DETAIL)
+    ndjson (bool): Also write each site's records to its run.ndjson (default: False)
+    forecast_interval (int): Interval length of the CSV and Parquet forecasts in minutes;
+                             a manifest's forecast_interval column overrides it (default: 60)
+
+    Returns:
+    pandas.DataFrame: One summary row per site, in discover_sites order
+    """
+    jobs = discover_sites(source)
+    directories = {}
+    for job in jobs:
+        directories.setdefault(site_directory(output_dir, job.site), []).append(job.site)
+    clashes = ["/".join(sites) for sites in directories.values() if len(sites) > 1]
+    if clashes:
+        raise ValueError(f"Sites would share an output directory: {', '.join(clashes)}")
+    os.makedirs(output_dir, exist_ok=True)
+    if cache_path is None:
+        cache_path = os.path.join(output_dir, BATCH_CACHE)
+
+    start = time.perf_counter()
+    rows = run_tasks(run_site, [(job,) for job in jobs], workers=workers, output_dir=output_dir,
+                     interval_minutes=interval_minutes, solver=solver, simulate=simulate,
+                     plots=plots, cache_path=cache_path, seed=seed, report_format=report_format,
+                     verbosity=verbosity, ndjson=ndjson, forecast_interval=forecast_interval)
+    summary = pd.DataFrame(rows)
+    summary.to_csv(os.path.join(output_dir, BATCH_SUMMARY), index=False)
+
+    failed = summary[summary['status'] == 'failed']
+    print(f"Planned {len(summary) - len(failed)} of {len(summary)} sites in "
+          f"{time.perf_counter() - start:.1f}s; summary written to "
+          f"{os.path.join(output_dir, BATCH_SUMMARY)}")
+    for failure in failed.itertuples():
+        print(f"  {failure.site} failed: {failure.error}")
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Plan the staffing of many sites at once")
+    parser.add_argument('source', help="directory of site forecasts or manifest CSV")
+    parser.add_argument('--output', default=BATCH_OUTPUT_DIR, help="output directory")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: every core)")
+    parser.add_argument('--interval', type=int, default=INTERVAL_MINUTES, help="interval length in minutes")
+    parser.add_argument('--forecast-interval', type=int, default=MINUTES_PER_HOUR,
+                        help="interval length of the CSV and Parquet forecasts in minutes (default: 60)")
+    parser.add_argument('--solver', default='batch', help="staffing solver")
+    parser.add_argument('--simulate', action='store_true', help="simulate each ideal pattern")
+    parser.add_argument('--no-plots', dest='plots', action='store_false', help="skip the charts")
+    parser.add_argument('--report-format', default='xlsx', choices=['xlsx', 'csv', 'parquet'],
+                        help="format of the site reports")
+    parser.add_argument('--verbosity', default='detail', choices=['quiet', 'summary', 'detail'],
+                        help="how much goes to each site's run.log")
+    parser.add_argument('--ndjson', action='store_true', help="also write each site's records to run.ndjson")
+    arguments = parser.parse_args()
+    run_batch(arguments.source, arguments.output, arguments.workers, arguments.interval,
+              arguments.solver, arguments.simulate, arguments.plots,
+              report_format=arguments.report_format, verbosity=arguments.verbosity,
+              ndjson=arguments.ndjson, forecast_interval=arguments.forecast_interval)
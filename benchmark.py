@@ -0,0 +1,356 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import shift_optimizer
+from output import QUIET, Reporter, use_reporter
+from erlang_staffing import (arrival_rate_urgent, DAYS_OF_WEEK, HOURS_PER_DAY, MINUTES_PER_HOUR,
+                             URGENT_TASK_WORK_MINUTES, calculate_required_staff_batch)
+
+BENCHMARK_SCALES = (1, 10, 100)  # Call volume multipliers of arrival_rate_urgent
+BENCHMARK_INTERVALS = (60, 30, 15)  # Interval lengths in minutes
+BENCHMARK_QUEUES = (1, 10, 100, 1000)  # Number of independent queues
+BENCHMARK_STAGES = ('staffing', 'pattern_evaluation', 'evaluate_shift_pattern', 'ideal_pattern',
+                    'simulation', 'excel_report')
+BENCHMARK_REPEAT = 3  # Timed runs per case; the fastest is reported
+QUEUE_VARIATION = 0.3  # Spread of the per-queue volume factors (lognormal sigma)
+SIMULATION_WORK_LIMIT = 100  # Largest scale x queues simulated unless run with --full
+BENCHMARK_OUTPUT = 'benchmark_results.json'
+STARTUP_BUDGET_SECONDS = 0.5  # Longest acceptable start of each STARTUP_COMMANDS entry
+# Commands whose start-up time is checked, run with the Python running the benchmark
+STARTUP_COMMANDS = {
+    'import erlang_staffing': ['-c', 'import erlang_staffing'],
+    'import pipeline': ['-c', 'import pipeline'],
+    'cli.py --help': ['cli.py', '--help'],
+    'cli.py staffing': ['cli.py', 'staffing'],
+}
+
+
+def synthetic_forecast(scale=1, interval_minutes=MINUTES_PER_HOUR, queues=1, seed=0):
+    """
+    Build a synthetic forecast from arrival_rate_urgent
+
+    The hourly volumes are multiplied by scale and split evenly over the intervals
+    of each hour. Every queue gets its own random volume factor around 1, so queues
+    are similar to the real data without being identical.
+
+    Parameters:
+    scale (float): Call volume multiplier (default: 1)
+    interval_minutes (int): Interval length in minutes, a divisor of 60 (default: 60)
+    queues (int): Number of queues (default: 1)
+    seed (int): Seed of the per-queue volume factors (default: 0)
+
+    Returns:
+    numpy.ndarray: Calls per interval, shape (queues, days, intervals per day)
+    """
+    if MINUTES_PER_HOUR % interval_minutes != 0:
+        raise ValueError(f"Interval of {interval_minutes} minutes does not divide an hour")
+    per_hour = MINUTES_PER_HOUR // interval_minutes
+
+    hourly = np.array([arrival_rate_urgent[day][:HOURS_PER_DAY] for day in DAYS_OF_WEEK], dtype=float)
+    intervals = np.repeat(hourly * scale / per_hour, per_hour, axis=1)
+    factors = np.random.default_rng(seed).lognormal(0, QUEUE_VARIATION, queues)
+    # The first queue keeps the real volumes
+    factors[0] = 1.0
+    return np.rint(intervals[None, :, :] * factors[:, None, None])
+
+
+def staffing_dict(staffing_matrix):
+    """Turn a (days, hours) staffing matrix into the staffing_needs dict used by the pipeline"""
+    return {day: [int(staff) for staff in staffing_matrix[day_index]]
+            for day_index, day in enumerate(DAYS_OF_WEEK)}
+
+
+def measure(func, repeat=BENCHMARK_REPEAT):
+    """
+    Time a function and measure its peak memory
+
+    The timed runs are made without tracemalloc, which slows Python code down, and
+    one more run under tracemalloc gives the peak of memory allocated during the call.
+
+    Parameters:
+    func (callable): Function without arguments to measure
+    repeat (int): Number of timed runs (default: 3)
+
+    Returns:
+    dict: 'seconds' (fastest run), 'mean_seconds' and 'peak_memory_bytes'
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": min(timings),
+        "mean_seconds": sum(timings) / len(timings),
+        "peak_memory_bytes": peak,
+    }
+
+
+def _stage_runner(stage, forecast, scale, interval_minutes, patterns, full):
+    """
+    Build the function timed for one stage, or return the reason it is skipped
+
+    Returns:
+    tuple: (callable, None) or (None, reason)
+    """
+    queues = forecast.shape[0]
+
+    def solve_staffing():
+        return calculate_required_staff_batch(forecast, URGENT_TASK_WORK_MINUTES, interval=interval_minutes)
+
+    if stage == 'staffing':
+        return solve_staffing, None
+
+    # The other stages work on the staffing of every queue, solved only once the stage is known to run
+    if stage == 'pattern_evaluation':
+        staffing = solve_staffing()
+        return (lambda: [shift_optimizer.evaluate_all_patterns(patterns, staffing[queue])
+                         for queue in range(queues)]), None
+
+    if stage == 'evaluate_shift_pattern':
+        staffing = solve_staffing()
+        needs = [staffing_dict(staffing[queue]) for queue in range(queues)]
+        return (lambda: [shift_optimizer.evaluate_shift_pattern(pattern, queue_needs[day])
+                         for queue_needs in needs for pattern in patterns
+                         for day in DAYS_OF_WEEK]), None
+
+    if stage == 'ideal_pattern':
+        from ideal_shift import find_ideal_shift_pattern
+        staffing = solve_staffing()
+        needs = [staffing_dict(staffing[queue]) for queue in range(queues)]
+        return (lambda: [find_ideal_shift_pattern(queue_needs, patterns) for queue_needs in needs]), None
+
+    if stage == 'simulation':
+        if not full and scale * queues > SIMULATION_WORK_LIMIT:
+            return None, f"more than {SIMULATION_WORK_LIMIT}x the base call volume (use --full)"
+        staffing = solve_staffing()
+        return (lambda: _simulate_queues(forecast, staffing, interval_minutes)), None
+
+    if stage == 'excel_report':
+        if queues > 1 and not full:
+            return None, "the report covers a single queue (use --full for one per queue)"
+        from create_excel_report import create_excel_report
+        from ideal_shift import find_ideal_shift_pattern
+        staffing = solve_staffing()
+        needs = [staffing_dict(staffing[queue]) for queue in range(queues)]
+        # The report reuses the pattern evaluation of the pipeline, as main does
+        evaluations = [shift_optimizer.evaluate_all_patterns(patterns, staffing[queue])
+                       for queue in range(queues)]
+        with use_reporter(Reporter(QUIET)):
+            ideal_patterns = [find_ideal_shift_pattern(queue_needs, patterns, evaluation)
+                              for queue_needs, evaluation in zip(needs, evaluations)]
+
+        def write_reports():
+            # The report is written to the working directory, so run it in a scratch one
+            with tempfile.TemporaryDirectory() as directory, contextlib.chdir(directory):
+                for queue_needs, ideal_pattern, evaluation in zip(needs, ideal_patterns, evaluations):
+                    create_excel_report(queue_needs, ideal_pattern, all_patterns=patterns,
+                                        pattern_evaluation=evaluation)
+        return write_reports, None
+
+    raise ValueError(f"Unknown benchmark stage: {stage}")
+
+
+def _simulate_queues(forecast, staffing, interval_minutes):
+    """Simulate every interval of every queue with one run_simulation per interval"""
+    from simulation import run_simulation
+
+    rng = np.random.default_rng(0)
+    for queue in range(forecast.shape[0]):
+        for day_index in range(len(DAYS_OF_WEEK)):
+            for period in range(forecast.shape[2]):
+                agents = max(int(staffing[queue, day_index, period]), 1)
+                run_simulation(agents, forecast[queue, day_index, period], rng=rng, engine='fast',
+                               duration_seconds=interval_minutes * 60)
+
+
+def measure_startup(commands=STARTUP_COMMANDS, budget=STARTUP_BUDGET_SECONDS, repeat=BENCHMARK_REPEAT):
+    """
+    Time how long short-lived runs take from process start to exit
+
+    Each command runs in a fresh interpreter, so the import of every module it needs
+    is included, as in a cron job or one process of a batch fan-out.
+
+    Parameters:
+    commands (dict): Name -> arguments of the Python interpreter (default: STARTUP_COMMANDS)
+    budget (float): Seconds each command may take (default: 0.5)
+    repeat (int): Runs per command; the fastest is reported (default: 3)
+
+    Returns:
+    list: One dict per command with its 'seconds', the 'budget' and 'within_budget'
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for name, arguments in commands.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + arguments, cwd=directory, check=True,
+                           stdout=subprocess.DEVNULL)
+            timings.append(time.perf_counter() - start)
+        seconds = min(timings)
+        results.append({"command": name, "seconds": seconds, "budget": budget,
+                        "within_budget": seconds <= budget})
+    return results
+
+
+def run_benchmarks(stages=BENCHMARK_STAGES, scales=BENCHMARK_SCALES, intervals=BENCHMARK_INTERVALS,
+                   queue_counts=BENCHMARK_QUEUES, repeat=BENCHMARK_REPEAT, full=False):
+    """
+    Time every stage on every combination of volume, interval length and number of queues
+
+    Parameters:
+    stages (tuple): Stages to measure (default: all of BENCHMARK_STAGES)
+    scales (tuple): Call volume multipliers (default: 1, 10 and 100)
+    intervals (tuple): Interval lengths in minutes (default: 60, 30 and 15)
+    queue_counts (tuple): Numbers of queues (default: 1, 10, 100 and 1000)
+    repeat (int): Timed runs per case (default: 3)
+    full (bool): Also run the very large simulation and report cases (default: False)
+
+    Returns:
+    dict: 'metadata' about the machine and run, and 'results' with one entry per case
+    """
+    # Shifts start on interval boundaries, so there is one set of patterns per interval length
+    patterns = {interval_minutes: shift_optimizer.generate_shift_patterns(interval_minutes=interval_minutes)
+                for interval_minutes in intervals}
+    results = []
+
+    for stage in stages:
+        for interval_minutes in intervals:
+            for scale in scales:
+                for queues in queue_counts:
+                    forecast = synthetic_forecast(scale, interval_minutes, queues)
+                    case = {
+                        "stage": stage,
+                        "scale": scale,
+                        "interval_minutes": interval_minutes,
+                        "queues": queues,
+                        "cells": int(forecast.size),
+                        "calls": float(forecast.sum()),
+                    }
+                    runner, reason = _stage_runner(stage, forecast, scale, interval_minutes,
+                                                   patterns[interval_minutes], full)
+                    if runner is None:
+                        case["skipped"] = reason
+                    else:
+                        # The stages report progress; only the measurements are of interest here
+                        with use_reporter(Reporter(QUIET)):
+                            case.update(measure(runner, repeat))
+                        case["cells_per_second"] = case["cells"] / case["seconds"] if case["seconds"] > 0 else None
+                    results.append(case)
+                    print(format_case(case))
+
+    return {"metadata": benchmark_metadata(repeat), "results": results}
+
+
+def benchmark_metadata(repeat=BENCHMARK_REPEAT):
+    """Describe the machine and software a benchmark ran on"""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+    }
+
+
+def format_case(case):
+    """One line describing a benchmark case"""
+    label = (f"{case['stage']:<22} x{case['scale']:<4} {case['interval_minutes']:>2}min "
+             f"{case['queues']:>5} queues")
+    if "skipped" in case:
+        return f"{label}  skipped: {case['skipped']}"
+    return (f"{label}  {case['seconds'] * 1000:10.1f} ms  "
+            f"{case['peak_memory_bytes'] / 2**20:8.1f} MiB peak")
+
+
+def save_results(results, path=BENCHMARK_OUTPUT):
+    """Write benchmark results to a JSON file"""
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def compare_results(baseline, current):
+    """
+    Compare two benchmark runs case by case
+
+    Parameters:
+    baseline (dict): Earlier results, as returned by run_benchmarks or loaded from JSON
+    current (dict): New results
+
+    Returns:
+    list: (case key, baseline seconds, current seconds, ratio) for cases measured in both runs
+    """
+    def key(case):
+        return case["stage"], case["scale"], case["interval_minutes"], case["queues"]
+
+    before = {key(case): case for case in baseline["results"] if "seconds" in case}
+    comparison = []
+    for case in current["results"]:
+        if "seconds" in case and key(case) in before:
+            old_seconds = before[key(case)]["seconds"]
+            comparison.append((key(case), old_seconds, case["seconds"],
+                               case["seconds"] / old_seconds if old_seconds > 0 else None))
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the staffing, shift and simulation stages")
+    parser.add_argument('--stages', nargs='+', default=list(BENCHMARK_STAGES), choices=BENCHMARK_STAGES)
+    parser.add_argument('--scales', nargs='+', type=int, default=list(BENCHMARK_SCALES))
+    parser.add_argument('--intervals', nargs='+', type=int, default=list(BENCHMARK_INTERVALS))
+    parser.add_argument('--queues', nargs='+', type=int, default=list(BENCHMARK_QUEUES))
+    parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT)
+    parser.add_argument('--full', action='store_true', help="Include the very large simulation and report cases")
+    parser.add_argument('--output', default=BENCHMARK_OUTPUT, help="JSON file for the results")
+    parser.add_argument('--compare', help="Earlier results JSON to compare against")
+    parser.add_argument('--startup-budget', type=float, default=STARTUP_BUDGET_SECONDS,
+                        help="Seconds the start-up commands may take; exceeding it fails the run")
+    parser.add_argument('--startup-only', action='store_true', help="Only check the start-up time")
+    args = parser.parse_args(argv)
+
+    if args.startup_only:
+        results = {"metadata": benchmark_metadata(args.repeat), "results": []}
+    else:
+        results = run_benchmarks(tuple(args.stages), tuple(args.scales), tuple(args.intervals),
+                                 tuple(args.queues), args.repeat, args.full)
+    results["startup"] = measure_startup(budget=args.startup_budget, repeat=args.repeat)
+    print("\nStart-up time:")
+    for startup in results["startup"]:
+        print(f"{startup['command']:<24} {startup['seconds'] * 1000:8.1f} ms"
+              + ("" if startup["within_budget"] else f"  over the {startup['budget'] * 1000:.0f} ms budget"))
+    save_results(results, args.output)
+    print(f"\nBenchmark results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"\nCompared with {args.compare}:")
+        for (stage, scale, interval_minutes, queues), old, new, ratio in compare_results(baseline, results):
+            print(f"{stage:<22} x{scale:<4} {interval_minutes:>2}min {queues:>5} queues  "
+                  f"{old * 1000:10.1f} ms -> {new * 1000:10.1f} ms  ({ratio:.2f}x)")
+
+    if not all(startup["within_budget"] for startup in results["startup"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+import numpy as np
+import pandas as pd
+from erlang_staffing import (AVERAGE_PATIENCE_MINUTES, DAYS_OF_WEEK, INTERVAL_MINUTES,
+                             URGENT_TASK_WORK_MINUTES, calculate_required_staff_batch, interval_arrival_rates,
+                             intervals_per_day)
+from forecast_data import Forecast, read_chunks
+
+CALL_LOG_CHUNK_ROWS = 1_000_000  # Rows read from a call log at a time
+# Columns of a call log; 'wait' (seconds before the answer or the hang-up) is optional
+# and only needed to estimate patience
+CALL_LOG_COLUMNS = {'arrival': 'arrival_time', 'handle': 'handle_seconds', 'abandoned': 'abandoned',
+                    'wait': 'wait_seconds'}
+ABANDONED_FLAGS = ('1', 'true', 't', 'yes', 'y')  # Text values of the abandonment flag that mean abandoned
+EPOCH_WEEKDAY = 4  # DAYS_OF_WEEK position of 1970-01-01, a Thursday
+SECONDS_PER_MINUTE = 60
+
+
+class CallLogProfile:
+    """
+    Calls, handle times and patience per day of the week and interval, from a call log
+
+    Holds the totals over the whole log as (day, interval) arrays (DAYS_OF_WEEK
+    order) and the number of times each day of the week occurs in the log, so
+    profiles of successive periods can be added up. From them:
+    - arrival_rates() is the average week of calls, in the layout of arrival_rate_urgent
+    - aht_minutes and patience_seconds are the estimates per interval
+    - staffing_needs() staffs every interval with its own handle time (and patience)
+    - parameters() gives the overall figures as scenario_sweep parameters
+
+    Patience is estimated as for an exponential patience, which is what the simulators
+    draw: every call waited min(patience, time to answer), so the total time waited
+    divided by the number of callers who hung up is the maximum likelihood estimate of
+    the mean patience, answered calls included as censored observations. Calls without
+    a wait time are left out of both totals.
+    """
+
+    def __init__(self, calls, handled, handle_seconds, abandoned, wait_seconds, abandoned_waited, day_counts,
+                 interval_minutes=INTERVAL_MINUTES):
+        """
+        Parameters:
+        calls (numpy.ndarray): Calls that arrived in each day and interval, over the whole log
+        handled (numpy.ndarray): Answered calls with a handle time
+        handle_seconds (numpy.ndarray): Total handle time of those calls in seconds
+        abandoned (numpy.ndarray): Calls whose caller hung up before an answer
+        wait_seconds (numpy.ndarray): Total wait of all calls in seconds, or None when
+                                      the log has no wait times
+        abandoned_waited (numpy.ndarray): Abandoned calls whose wait is known, or None
+                                          without wait times
+        day_counts (numpy.ndarray): How many of each day of the week the log covers
+        interval_minutes (int): Length of an interval in minutes (default: INTERVAL_MINUTES)
+        """
+        if calls.shape != (len(DAYS_OF_WEEK), intervals_per_day(interval_minutes)):
+            raise ValueError("calls must have one row per day of the week and one column per interval")
+        self.calls = calls
+        self.handled = handled
+        self.handle_seconds = handle_seconds
+        self.abandoned = abandoned
+        self.wait_seconds = wait_seconds
+        self.abandoned_waited = abandoned_waited
+        self.day_counts = day_counts
+        self.interval_minutes = interval_minutes
+
+    @property
+    def calls_per_day(self):
+        """Average calls per day of the week and interval; days the log does not cover are 0"""
+        days = np.maximum(self.day_counts, 1)[:, np.newaxis]
+        return self.calls / days
+
+    @property
+    def aht_minutes(self):
+        """Average handle time per day and interval in minutes, NaN where no call was answered"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.handle_seconds / self.handled / SECONDS_PER_MINUTE
+
+    @property
+    def patience_seconds(self):
+        """Mean patience per day and interval in seconds, NaN where nobody hung up or waits are unknown"""
+        if self.wait_seconds is None:
+            return np.full(self.calls.shape, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.abandoned_waited > 0, self.wait_seconds / self.abandoned_waited, np.nan)
+
+    @property
+    def abandonment_rate(self):
+        """Share of the calls in each day and interval whose caller hung up, NaN where none arrived"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.abandoned / self.calls
+
+    @property
+    def overall_aht_minutes(self):
+        """Average handle time over the whole log, or URGENT_TASK_WORK_MINUTES if no call was answered"""
+        handled = self.handled.sum()
+        if handled == 0:
+            return URGENT_TASK_WORK_MINUTES
+        return float(self.handle_seconds.sum() / handled / SECONDS_PER_MINUTE)
+
+    @property
+    def overall_patience_seconds(self):
+        """Mean patience over the whole log, or AVERAGE_PATIENCE_MINUTES if it cannot be estimated"""
+        if self.wait_seconds is None or self.abandoned_waited.sum() == 0:
+            return AVERAGE_PATIENCE_MINUTES * SECONDS_PER_MINUTE
+        return float(self.wait_seconds.sum() / self.abandoned_waited.sum())
+
+    def arrival_rates(self, whole_calls=False):
+        """
+        The average week of calls
+
+        The averages are fractional. The staffing stages use them as they are; the
+        simulations round them to whole calls per interval, keeping each day's rounded
+        total (interval_arrival_rates with whole_calls=True), which whole_calls=True
+        does here already.
+
+        Parameters:
+        whole_calls (bool): Round to whole calls, keeping each day's total (default: False)
+
+        Returns:
+        dict: Calls per day and interval, in the layout of arrival_rate_urgent; every stage
+              takes it as arrival_rates, with interval_minutes=self.interval_minutes (or 60,
+              as calculate_hourly_staffing_needs spreads and sums between interval lengths)
+        """
+        calls_per_day = self.calls_per_day
+        if whole_calls:
+            calls_per_day = interval_arrival_rates(
+                {day: calls_per_day[day_index] for day_index, day in enumerate(DAYS_OF_WEEK)},
+                self.interval_minutes, whole_calls=True)
+        return {day: calls_per_day[day_index].tolist() for day_index, day in enumerate(DAYS_OF_WEEK)}
+
+    def forecast(self, site='default'):
+        """The average week as a one-site forecast_data.Forecast, e.g. to save() it for the CLI"""
+        return Forecast.from_arrival_rates(self.arrival_rates(), site, self.interval_minutes)
+
+    def filled_aht_minutes(self):
+        """aht_minutes with the intervals without answered calls set to overall_aht_minutes"""
+        aht = self.aht_minutes
+        return np.where(np.isnan(aht), self.overall_aht_minutes, aht)
+
+    def filled_patience_minutes(self):
+        """patience_seconds in minutes, with the intervals without an estimate set to the overall one"""
+        patience = self.patience_seconds
+        return np.where(np.isnan(patience), self.overall_patience_seconds, patience) / SECONDS_PER_MINUTE
+
+    def staffing_needs(self, solver='batch', cache=None):
+        """
+        Staff every interval of the average week with its own handle time
+
+        Parameters:
+        solver (str): 'batch' for Erlang C, or 'erlang_a' to also use the patience of
+                      each interval (default: 'batch')
+        cache (StaffingCache): Optional cache for either solver (default: None)
+
+        Returns:
+        dict: Staffing needs for each day and interval, like calculate_hourly_staffing_needs
+        """
+        arrivals = self.calls_per_day
+        aht = self.filled_aht_minutes()
+        if solver == 'batch':
+            if cache is not None:
+                required = cache.required_staff(arrivals, aht, interval=self.interval_minutes)
+            else:
+                required = calculate_required_staff_batch(arrivals, aht, interval=self.interval_minutes)
+        elif solver == 'erlang_a':
+            # Imported here because erlang_a is only needed for this solver
+            from erlang_a import calculate_required_staff_erlang_a
+            patience = self.filled_patience_minutes()
+            if cache is not None:
+                required = cache.required_staff_erlang_a(arrivals, aht, patience, interval=self.interval_minutes)
+            else:
+                required = calculate_required_staff_erlang_a(arrivals, aht, patience,
+                                                             interval=self.interval_minutes)
+        else:
+            raise ValueError(f"Unknown staffing solver: {solver}")
+        return {day: [int(staff) for staff in required[day_index]]
+                for day_index, day in enumerate(DAYS_OF_WEEK)}
+
+    def parameters(self):
+        """The overall handle time and patience as scenario_sweep parameters"""
+        return {'URGENT_TASK_WORK_MINUTES': self.overall_aht_minutes,
+                'AVG_PATIENCE': self.overall_patience_seconds}
+
+    def __add__(self, other):
+        """The profile of two periods together, e.g. two months; logs of the same dates go to one load_call_log"""
+        if other.interval_minutes != self.interval_minutes:
+            raise ValueError("Profiles must have the same interval length")
+        waits = abandoned_waited = None
+        if self.wait_seconds is not None and other.wait_seconds is not None:
+            waits = self.wait_seconds + other.wait_seconds
+            abandoned_waited = self.abandoned_waited + other.abandoned_waited
+        return CallLogProfile(self.calls + other.calls, self.handled + other.handled,
+                              self.handle_seconds + other.handle_seconds, self.abandoned + other.abandoned,
+                              waits, abandoned_waited, self.day_counts + other.day_counts,
+                              self.interval_minutes)
+
+
+def _file_columns(path):
+    """Column names of a CSV or Parquet file, read from its header"""
+    if str(path).lower().endswith(('.parquet', '.pq')):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError("Reading Parquet files requires pyarrow: pip install pyarrow") from error
+        return pq.ParquetFile(path).schema_arrow.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _abandoned_flags(values):
+    """The abandonment column as booleans; numbers are abandoned when not 0, text when in ABANDONED_FLAGS"""
+    if pd.api.types.is_bool_dtype(values):
+        return values.to_numpy(dtype=bool)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.fillna(0).to_numpy() != 0
+    # A flag column has a handful of distinct values: only those are normalized, then mapped back
+    codes, uniques = pd.factorize(values)
+    flags = pd.Index(uniques).astype(str).str.strip().str.lower().isin(ABANDONED_FLAGS)
+    return np.append(flags, False)[codes]
+
+
+def _seconds(values):
+    """A column of seconds as floats, NaN where empty or not a number"""
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+
+
+def load_call_log(paths, interval_minutes=INTERVAL_MINUTES, columns=None, chunk_rows=CALL_LOG_CHUNK_ROWS,
+                  date_format=None):
+    """
+    Build a CallLogProfile from call detail records
+
+    The log is streamed in chunks of chunk_rows rows. Each chunk is binned into
+    (day of the week, interval) cells with NumPy: the timestamps become whole days
+    and minutes since 1970, which give the day of the week and the interval, and
+    np.bincount adds up the calls, handle times, hang-ups and waits of every cell.
+    Only one chunk and a few (7, intervals) totals are held, so the memory does not
+    grow with the log. Timestamps are taken as local times; time zones are dropped.
+
+    Days of the week are counted over the dates from the first call to the last, so
+    days without any call still lower the average.
+
+    Parameters:
+    paths (str or list): CSV or Parquet call logs (Parquet needs pyarrow)
+    interval_minutes (int): Length of the intervals in minutes (default: INTERVAL_MINUTES)
+    columns (dict): Column names that differ from CALL_LOG_COLUMNS, e.g. {'arrival': 'start'}
+                    (default: None)
+    chunk_rows (int): Rows read at a time (default: CALL_LOG_CHUNK_ROWS)
+    date_format (str): strftime format of the arrival timestamps, which parses much faster
+                       than guessing it, e.g. '%Y-%m-%d %H:%M:%S' (default: None, inferred)
+
+    Returns:
+    CallLogProfile: Totals of every day and interval over all the logs
+    """
+    periods = intervals_per_day(interval_minutes)
+    names = dict(CALL_LOG_COLUMNS, **(columns or {}))
+    if isinstance(paths, str):
+        paths = [paths]
+    cells = len(DAYS_OF_WEEK) * periods
+
+    calls = np.zeros(cells)
+    handled = np.zeros(cells)
+    handle_seconds = np.zeros(cells)
+    abandoned = np.zeros(cells)
+    wait_seconds = np.zeros(cells)
+    abandoned_waited = np.zeros(cells)
+    has_waits = True
+    first_day = last_day = None
+
+    for path in paths:
+        available = _file_columns(path)
+        missing = [names[key] for key in ('arrival', 'handle', 'abandoned') if names[key] not in available]
+        if missing:
+            raise ValueError(f"{path} has no column {', '.join(missing)}")
+        file_waits = names['wait'] in available
+        has_waits = has_waits and file_waits
+        usecols = [names['arrival'], names['handle'], names['abandoned']] + ([names['wait']] if file_waits else [])
+
+        for chunk in read_chunks(path, usecols, chunk_rows):
+            arrivals = pd.to_datetime(chunk[names['arrival']], format=date_format)
+            if arrivals.dt.tz is not None:
+                arrivals = arrivals.dt.tz_localize(None)
+            stamps = arrivals.to_numpy()
+            known = ~np.isnat(stamps)
+            if not known.all():
+                stamps = stamps[known]
+                chunk = chunk[known]
+            if len(stamps) == 0:
+                continue
+
+            # Day of the week and interval of every call, from whole days and minutes since 1970
+            days = stamps.astype('datetime64[D]')
+            minutes = (stamps - days).astype('timedelta64[m]').astype(np.int64)
+            day_numbers = days.astype(np.int64)
+            cell = (day_numbers + EPOCH_WEEKDAY) % len(DAYS_OF_WEEK) * periods + minutes // interval_minutes
+            first_day = day_numbers.min() if first_day is None else min(first_day, day_numbers.min())
+            last_day = day_numbers.max() if last_day is None else max(last_day, day_numbers.max())
+
+            calls += np.bincount(cell, minlength=cells)
+            hung_up = _abandoned_flags(chunk[names['abandoned']])
+            abandoned += np.bincount(cell[hung_up], minlength=cells)
+            handle = _seconds(chunk[names['handle']])
+            answered = ~hung_up & np.isfinite(handle)
+            handled += np.bincount(cell[answered], minlength=cells)
+            handle_seconds += np.bincount(cell[answered], weights=handle[answered], minlength=cells)
+            if file_waits:
+                wait = _seconds(chunk[names['wait']])
+                waited = np.isfinite(wait)
+                wait_seconds += np.bincount(cell[waited], weights=wait[waited], minlength=cells)
+                # Only hang-ups with a known wait count towards patience, as only their waits are in the total
+                abandoned_waited += np.bincount(cell[waited & hung_up], minlength=cells)
+
+    if first_day is None:
+        raise ValueError("The call log has no calls")
+    day_counts = np.bincount((np.arange(first_day, last_day + 1) + EPOCH_WEEKDAY) % len(DAYS_OF_WEEK),
+                             minlength=len(DAYS_OF_WEEK))
+    shape = (len(DAYS_OF_WEEK), periods)
+    return CallLogProfile(calls.reshape(shape), handled.reshape(shape), handle_seconds.reshape(shape),
+                          abandoned.reshape(shape), wait_seconds.reshape(shape) if has_waits else None,
+                          abandoned_waited.reshape(shape) if has_waits else None, day_counts,
+                          interval_minutes)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Average week, handle times and patience from call logs")
+    parser.add_argument('paths', nargs='+', help="CSV or Parquet call logs")
+    parser.add_argument('--interval', type=int, default=INTERVAL_MINUTES, help="interval length in minutes")
+    parser.add_argument('--date-format', help="strftime format of the arrival timestamps")
+    parser.add_argument('--save', metavar='NPY', help="save the average week as a forecast for cli.py --forecast")
+    args = parser.parse_args()
+
+    profile = load_call_log(args.paths, interval_minutes=args.interval, date_format=args.date_format)
+    print(f"{int(profile.calls.sum())} calls over {int(profile.day_counts.sum())} days")
+    print(f"Average handle time: {profile.overall_aht_minutes:.2f} minutes")
+    print(f"Average patience: {profile.overall_patience_seconds:.1f} seconds")
+    for day, calls in zip(DAYS_OF_WEEK, profile.calls_per_day):
+        print(f"  {day}: {calls.sum():.1f} calls per day")
+    if args.save:
+        profile.forecast().save(args.save)
+        print(f"Forecast saved to {args.save}")
@@ -0,0 +1,195 @@
+import argparse
+import sys
+from output import SUMMARY, VERBOSITY_LEVELS, Reporter, get_reporter, text_format, use_reporter
+
+# Only the standard library (and output, which needs nothing else) is imported here:
+# NumPy, pandas, matplotlib and SimPy are imported by the subcommands that need them,
+# so `--help` and the light subcommands start quickly in cron jobs and batch fan-out
+
+SIMULATION_PLANS = ('staffing', 'pattern', 'both')
+
+
+def _arrival_rates(args):
+    """One week of calls from --forecast, or None for the built-in forecast"""
+    if args.forecast is None:
+        return None
+    from forecast_data import load_forecast, open_forecast
+    if args.forecast.lower().endswith('.npy'):
+        forecast = open_forecast(args.forecast)
+    else:
+        forecast = load_forecast(args.forecast, interval_minutes=args.forecast_interval)
+    return forecast.arrival_rates(args.site, args.start_day, interval_minutes=forecast.interval_minutes)
+
+
+def build_pipeline(args):
+    """The StaffingPipeline described by the command-line options"""
+    from pipeline import StaffingPipeline
+
+    cache = None
+    if args.cache is not None:
+        from staffing_cache import StaffingCache
+        cache = StaffingCache(path=args.cache)
+    simulation_options = {'engine': getattr(args, 'engine', 'fast'), 'seed': getattr(args, 'seed', None),
+                          'workers': getattr(args, 'workers', 1), 'crn': getattr(args, 'crn', False)}
+    return StaffingPipeline(arrival_rates=_arrival_rates(args), interval_minutes=args.interval,
+                            solver=args.solver, cache=cache, shift_hours=args.shift_hours,
+                            optimizer_mode=getattr(args, 'mode', 'patterns'),
+                            simulation_options=simulation_options)
+
+
+@text_format('staffing_table')
+def _format_staffing_table(record):
+    from erlang_staffing import DAYS_OF_WEEK, period_label
+
+    staffing_needs = record['staffing_needs']
+    lines = ["Time   " + " ".join(f"{day[:3]:>5}" for day in DAYS_OF_WEEK)]
+    for period in range(len(staffing_needs[DAYS_OF_WEEK[0]])):
+        lines.append(f"{period_label(period, record['interval_minutes'])}  " +
+                     " ".join(f"{staffing_needs[day][period]:>5}" for day in DAYS_OF_WEEK))
+    return "\n".join(lines)
+
+
+@text_format('pattern_week')
+def _format_pattern_week(record):
+    shifts = ", ".join(record['shift_times'])
+    agents = " ".join(f"{agents:>5}" for agents in record['agents'])
+    return f"{record['pattern_number']:>7}  {shifts:<46}{agents}  {record['agent_hours']:>11g}"
+
+
+def command_staffing(args, pipeline):
+    """Report the required staff for every interval and day as one 'staffing_table' record"""
+    staffing_needs = pipeline.staffing_needs
+    reporter = get_reporter()
+    reporter.emit('staffing_table', SUMMARY, interval_minutes=args.interval,
+                  staffing_needs=staffing_needs)
+    if args.plot:
+        from erlang_staffing import visualize_staffing_needs
+        visualize_staffing_needs(staffing_needs, args.plot)
+        reporter.message(f"Staffing chart saved to {args.plot}")
+
+
+def command_patterns(args, pipeline):
+    """Report every shift pattern with its agents on each day as 'pattern_week' records"""
+    from erlang_staffing import DAYS_OF_WEEK
+
+    evaluation = pipeline.pattern_evaluation
+    reporter = get_reporter()
+    reporter.message("Pattern  Shifts" + " " * 40 + " ".join(f"{day[:3]:>5}" for day in DAYS_OF_WEEK)
+                     + "  Agent hours")
+    for pattern_index, pattern in enumerate(pipeline.patterns):
+        reporter.emit('pattern_week', SUMMARY, pattern_number=pattern['pattern_number'],
+                      shift_times=[f"{shift['start_time']}-{shift['end_time']}" for shift in pattern['shifts']],
+                      agents=evaluation['total_agents'][pattern_index].tolist(),
+                      agent_hours=evaluation['total_agent_hours'][pattern_index].sum())
+
+
+def command_ideal(args, pipeline):
+    """Find and print the pattern to use on every day of the week"""
+    from ideal_shift import display_ideal_shift_pattern
+    display_ideal_shift_pattern(pipeline.ideal_pattern)
+
+
+def command_simulate(args, pipeline):
+    """Simulate the staffing plan, the ideal pattern, or both"""
+    reporter = get_reporter()
+    if args.plan in ('staffing', 'both'):
+        reporter.message("\n=== RUNNING SIMULATION TO VALIDATE STAFFING NEEDS ===")
+        pipeline.get('staffing_simulation')
+    if args.plan in ('pattern', 'both'):
+        reporter.message("\n=== SIMULATING IDEAL PATTERN PERFORMANCE ===")
+        pipeline.get('pattern_simulation')
+
+
+def command_report(args, pipeline):
+    """Write the staffing report, and the staffing chart with --plot"""
+    pipeline.write_report(args.output, args.format)
+    if args.plot:
+        from erlang_staffing import visualize_staffing_needs
+        visualize_staffing_needs(pipeline.staffing_needs, args.plot)
+        get_reporter().message(f"Staffing chart saved to {args.plot}")
+
+
+def build_parser():
+    """The argument parser of every subcommand"""
+    # Options shared by every subcommand; defaults mirror the module constants without importing them
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--forecast', help="CSV, Parquet or .npy forecast (default: the built-in week)")
+    common.add_argument('--forecast-interval', type=int, default=60,
+                        help="interval length of a CSV or Parquet forecast in minutes (default: 60)")
+    common.add_argument('--site', help="site of a multi-site forecast (default: the first)")
+    common.add_argument('--start-day', type=int, default=0, help="first day of the week in the forecast")
+    common.add_argument('--interval', type=int, default=60, help="staffing interval in minutes (default: 60)")
+    common.add_argument('--solver', default='batch', choices=['batch', 'pyworkforce', 'erlang_a', 'simulation'],
+                        help="staffing solver (default: batch)")
+    common.add_argument('--shift-hours', type=int, default=8, help="shift length in hours (default: 8)")
+    common.add_argument('--cache', help="SQLite staffing cache to read and extend")
+    common.add_argument('--verbosity', default='detail', choices=list(VERBOSITY_LEVELS),
+                        help="how much is printed: quiet, summary or detail (default: detail)")
+    common.add_argument('--ndjson', metavar='PATH',
+                        help="also write every record as NDJSON to PATH; '-' writes it to stdout "
+                             "and the text to stderr")
+
+    parser = argparse.ArgumentParser(prog='cli.py', description="Call center staffing from the command line")
+    commands = parser.add_subparsers(dest='command', required=True, metavar='command')
+
+    staffing = commands.add_parser('staffing', parents=[common], help="required staff per interval and day")
+    staffing.add_argument('--plot', metavar='PNG', help="also save the staffing chart")
+    staffing.set_defaults(handler=command_staffing)
+
+    patterns = commands.add_parser('patterns', parents=[common], help="shift patterns and their daily cost")
+    patterns.set_defaults(handler=command_patterns)
+
+    ideal = commands.add_parser('ideal', parents=[common], help="the pattern to use on every day")
+    ideal.add_argument('--mode', default='patterns', choices=['patterns', 'ilp'],
+                       help="fixed patterns or the integer-programming scheduler (default: patterns)")
+    ideal.set_defaults(handler=command_ideal)
+
+    simulate = commands.add_parser('simulate', parents=[common], help="simulate the plan and the ideal pattern")
+    simulate.add_argument('--plan', default='both', choices=SIMULATION_PLANS,
+                          help="what to simulate (default: both)")
+    simulate.add_argument('--engine', default='fast', choices=['fast', 'simpy'],
+                          help="simulation engine (default: fast)")
+    simulate.add_argument('--seed', type=int, help="root seed of the random streams")
+    simulate.add_argument('--workers', type=int, default=1, help="worker processes; 0 uses every core")
+    simulate.add_argument('--crn', action='store_true', help="common random numbers keyed by day and interval")
+    simulate.add_argument('--mode', default='patterns', choices=['patterns', 'ilp'],
+                          help="how the simulated ideal pattern is found; the overlapping shifts of "
+                               "'ilp' are simulated as one queue per day (default: patterns)")
+    simulate.set_defaults(handler=command_simulate)
+
+    report = commands.add_parser('report', parents=[common], help="write the staffing report")
+    report.add_argument('--output', default='StaffingReport.xlsx', help="workbook, or directory for csv/parquet")
+    report.add_argument('--format', default='xlsx', choices=['xlsx', 'csv', 'parquet'])
+    report.add_argument('--plot', metavar='PNG', help="also save the staffing chart")
+    report.set_defaults(handler=command_report)
+    return parser
+
+
+def main(argv=None):
+    """
+    Run one subcommand
+
+    Parameters:
+    argv (list): Command-line arguments (default: None, sys.argv[1:])
+
+    Returns:
+    int: Exit status
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        with Reporter(args.verbosity, ndjson=args.ndjson) as reporter, use_reporter(reporter):
+            args.handler(args, build_pipeline(args))
+    except (ValueError, KeyError, FileNotFoundError) as error:
+        print(f"{parser.prog} {args.command}: error: {error}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # The reader went away (e.g. `| head`); silence the flush of stdout at exit
+        import os
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
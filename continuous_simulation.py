@@ -0,0 +1,261 @@
+import heapq
+import itertools
+from collections import deque
+import numpy as np
+from erlang_staffing import DAYS_OF_WEEK, interval_arrival_rates, interval_length
+from output import SUMMARY, get_reporter, text_format
+from simulation import AHT, AVG_PATIENCE, SIM_DURATION, RAW_RESULT_FIELDS, TARGET_SLA
+from rng_streams import as_call_streams, interval_streams
+from wait_metrics import WaitHistogram
+
+
+def stream_continuous_simulation(intervals, interval_seconds=SIM_DURATION,
+                                 service_time_seconds=AHT, avg_patience_seconds=AVG_PATIENCE,
+                                 rng=None, seed=None):
+    """
+    Simulate one continuous run over any number of intervals, yielding metrics as it goes
+
+    Unlike run_simulation, the queue is not reset between intervals: callers still
+    waiting or in service at the end of an interval carry over into the next one,
+    where the number of agents and the arrival rate may be different. When the
+    number of agents drops, agents finish the call they are on before leaving.
+
+    Arrivals are generated one interval at a time and only the callers currently
+    waiting or in service are kept, so memory does not grow with the horizon.
+    Calls are counted in the interval in which they are answered or abandon.
+
+    With a seed, interval i draws its calls from common random number streams keyed
+    by i, so two staffing plans run with the same seed face exactly the same callers.
+
+    Parameters:
+    intervals (iterable): (num_agents, arrival_rate) for each interval, e.g. a generator
+    interval_seconds (float): Length of every interval in seconds (default: 3600)
+    service_time_seconds (float): Average service time in seconds
+    avg_patience_seconds (float): Average caller patience in seconds
+    rng (numpy.random.Generator or CallStreams): Random generator (default: None, the global
+                                                 numpy random state)
+    seed (int): Root seed for per-interval common random numbers; overrides rng (default: None)
+
+    Yields:
+    dict: Metrics of each interval: 'interval', 'agents', 'calls_expected',
+          'calls_arrived', 'calls_handled', 'calls_abandoned', 'avg_wait', 'max_wait',
+          'service_level', 'calls_within_target', 'wait_metrics' (a WaitHistogram of the
+          interval's answered calls), plus 'calls_waiting' and 'calls_in_service' at the
+          end of the interval (the backlog carried into the next one)
+    """
+    # Fall back to the global numpy random state when no generator is given
+    streams = as_call_streams(rng)
+
+    in_service = []  # Heap of the times agents on a call become free
+    waiting = deque()  # FCFS queue of (arrival time, abandon time, service time)
+    capacity = 0
+
+    for index, (num_agents, arrival_rate) in enumerate(intervals):
+        interval_start = index * interval_seconds
+        interval_end = interval_start + interval_seconds
+        capacity = num_agents
+
+        handled = 0
+        within_target = 0
+        abandoned = 0
+        total_wait = 0.0
+        max_wait = 0.0
+        wait_metrics = WaitHistogram(thresholds=(TARGET_SLA,))
+
+        def start_calls(now):
+            """Give free agents to waiting callers at time now"""
+            nonlocal handled, within_target, abandoned, total_wait, max_wait
+            while waiting and len(in_service) < capacity:
+                arrival, abandon_time, service = waiting.popleft()
+                if abandon_time < now:
+                    # This caller hung up before reaching the front of the queue
+                    abandoned += 1
+                    continue
+                wait = now - arrival
+                handled += 1
+                total_wait += wait
+                max_wait = max(max_wait, wait)
+                if wait <= TARGET_SLA:
+                    within_target += 1
+                wait_metrics.add(wait)
+                heapq.heappush(in_service, now + service)
+
+        def finish_calls(until):
+            """Process every call that ends up to time until"""
+            while in_service and in_service[0] <= until:
+                start_calls(heapq.heappop(in_service))
+
+        # Agents that joined at the start of the interval pick up the backlog
+        start_calls(interval_start)
+
+        # Arrivals for this interval only
+        if seed is not None:
+            streams = interval_streams(seed, index)
+        num_calls = int(arrival_rate)
+        arrivals = np.sort(streams.arrivals.uniform(interval_start, interval_end, num_calls))
+        services = streams.services.exponential(service_time_seconds, num_calls)
+        patiences = streams.patience.exponential(avg_patience_seconds, num_calls)
+
+        for arrival, service, patience in zip(arrivals.tolist(), services.tolist(),
+                                              patiences.tolist()):
+            finish_calls(arrival)
+            waiting.append((arrival, arrival + patience, service))
+            start_calls(arrival)
+
+        finish_calls(interval_end)
+
+        # Callers whose patience ran out in this interval have abandoned
+        still_waiting = deque(call for call in waiting if call[1] >= interval_end)
+        abandoned += len(waiting) - len(still_waiting)
+        waiting = still_waiting
+
+        yield {
+            "interval": index,
+            "agents": num_agents,
+            "calls_expected": arrival_rate,
+            "calls_arrived": num_calls,
+            "calls_handled": handled,
+            "calls_abandoned": abandoned,
+            "avg_wait": total_wait / handled if handled > 0 else 0,
+            "max_wait": max_wait,
+            "service_level": within_target / handled * 100 if handled > 0 else 100,
+            "calls_within_target": within_target,
+            "wait_metrics": wait_metrics,
+            "calls_waiting": len(waiting),
+            "calls_in_service": len(in_service),
+        }
+
+
+def run_continuous_simulation(intervals, interval_seconds=SIM_DURATION,
+                              service_time_seconds=AHT, avg_patience_seconds=AVG_PATIENCE,
+                              rng=None, seed=None):
+    """
+    Run stream_continuous_simulation to the end and aggregate the results
+
+    Parameters:
+    intervals (iterable): (num_agents, arrival_rate) for each interval
+    interval_seconds (float): Length of every interval in seconds (default: 3600)
+    service_time_seconds (float): Average service time in seconds
+    avg_patience_seconds (float): Average caller patience in seconds
+    rng (numpy.random.Generator): Random generator (default: None, the global numpy random state)
+    seed (int): Root seed for per-interval common random numbers (default: None)
+
+    Returns:
+    dict: Totals over the horizon: number of intervals, calls arrived, handled and
+          abandoned, average and maximum wait, service level, wait histogram and
+          percentiles, agent hours and the calls still waiting or in service at the end
+    """
+    totals = _empty_totals()
+    record = None
+    for record in stream_continuous_simulation(intervals, interval_seconds, service_time_seconds,
+                                               avg_patience_seconds, rng, seed):
+        _add_to_totals(totals, record, interval_seconds)
+
+    return _finish_totals(totals, record)
+
+
+def simulate_continuous_plan(staffing_needs, weeks=1, arrival_rates=None, rng=None, seed=None):
+    """
+    Simulate the weekly staffing plan as one continuous run over several weeks
+
+    The weekly profile is repeated `weeks` times and fed to the simulation hour by
+    hour (or interval by interval, following the length of the staffing needs rows),
+    so a month or a year runs without building the whole horizon in memory.
+    A 'continuous_simulation_day' record is reported for every day and a
+    'continuous_simulation_summary' record for the whole horizon.
+
+    Parameters:
+    staffing_needs (dict): Dictionary with staffing needs for each day and hour
+    weeks (int): Number of weeks to simulate (default: 1)
+    arrival_rates (dict): Calls per day and hour (default: arrival_rate_urgent)
+    rng (numpy.random.Generator): Random generator (default: None, the global numpy random state)
+    seed (int): Root seed for per-hour common random numbers, so several plans can be
+                compared on the same callers (default: None)
+
+    Returns:
+    dict: Totals over the whole horizon, as returned by run_continuous_simulation
+    """
+    periods = len(staffing_needs[DAYS_OF_WEEK[0]])
+    interval_seconds = interval_length(periods) * 60
+    arrivals = interval_arrival_rates(arrival_rates, interval_length(periods),
+                                      whole_calls=True).tolist()
+
+    # Built lazily, one interval at a time
+    intervals = ((staffing_needs[day][period], arrivals[day_index][period])
+                 for _ in range(weeks) for day_index, day in enumerate(DAYS_OF_WEEK)
+                 for period in range(periods))
+    records = stream_continuous_simulation(intervals, interval_seconds, rng=rng, seed=seed)
+
+    reporter = get_reporter()
+    reporter.message(f"\nSimulating {weeks} week(s) continuously, carrying queues across hours:")
+    totals = _empty_totals()
+    record = None
+    day_names = itertools.cycle(DAYS_OF_WEEK)
+    for day_index in range(weeks * len(DAYS_OF_WEEK)):
+        day_totals = _empty_totals()
+        for record in itertools.islice(records, periods):
+            _add_to_totals(day_totals, record, interval_seconds)
+            _add_to_totals(totals, record, interval_seconds)
+        day = _finish_totals(day_totals, record)
+        reporter.emit('continuous_simulation_day', SUMMARY, week=day_index // len(DAYS_OF_WEEK) + 1,
+                      day=next(day_names),
+                      **{key: value for key, value in day.items() if key not in RAW_RESULT_FIELDS})
+
+    totals = _finish_totals(totals, record)
+    reporter.emit('continuous_simulation_summary', SUMMARY,
+                  **{key: value for key, value in totals.items() if key not in RAW_RESULT_FIELDS})
+    return totals
+
+
+@text_format('continuous_simulation_day')
+def _format_day(day):
+    return (f"Week {day['week']} {day['day']}: "
+            f"{day['calls_arrived']} calls, {day['calls_handled']} handled, "
+            f"{day['calls_abandoned']} abandoned, {day['avg_wait']:.1f}s avg wait, "
+            f"{day['service_level']:.1f}% service level, "
+            f"{day['calls_waiting']} waiting at end of day")
+
+
+@text_format('continuous_simulation_summary')
+def _format_summary(totals):
+    return (f"\nContinuous Summary: {totals['calls_arrived']} calls, "
+            f"{totals['calls_handled']} handled, "
+            f"{totals['calls_abandoned']} abandoned, "
+            f"{totals['service_level']:.1f}% service level, "
+            f"P90 wait {totals['wait_p90']:.1f}s")
+
+
+def _empty_totals():
+    return {"intervals": 0, "calls_arrived": 0, "calls_handled": 0, "calls_abandoned": 0,
+            "total_wait": 0.0, "max_wait": 0.0, "within_target": 0, "agent_hours": 0.0,
+            "wait_metrics": WaitHistogram(thresholds=(TARGET_SLA,))}
+
+
+def _add_to_totals(totals, record, interval_seconds):
+    totals["intervals"] += 1
+    totals["calls_arrived"] += record["calls_arrived"]
+    totals["calls_handled"] += record["calls_handled"]
+    totals["calls_abandoned"] += record["calls_abandoned"]
+    totals["total_wait"] += record["avg_wait"] * record["calls_handled"]
+    totals["max_wait"] = max(totals["max_wait"], record["max_wait"])
+    totals["within_target"] += record["calls_within_target"]
+    totals["agent_hours"] += record["agents"] * interval_seconds / 3600
+    totals["wait_metrics"].merge(record["wait_metrics"])
+
+
+def _finish_totals(totals, last_record):
+    handled = totals["calls_handled"]
+    return {
+        "intervals": totals["intervals"],
+        "calls_arrived": totals["calls_arrived"],
+        "calls_handled": handled,
+        "calls_abandoned": totals["calls_abandoned"],
+        "avg_wait": totals["total_wait"] / handled if handled > 0 else 0,
+        "max_wait": totals["max_wait"],
+        "service_level": totals["within_target"] / handled * 100 if handled > 0 else 100,
+        "agent_hours": totals["agent_hours"],
+        "wait_metrics": totals["wait_metrics"],
+        **totals["wait_metrics"].percentiles(),
+        "calls_waiting": last_record["calls_waiting"] if last_record else 0,
+        "calls_in_service": last_record["calls_in_service"] if last_record else 0,
+    }
@@ -1,210 +1,233 @@
-import pandas as pd
+import csv
+import os
+import re
+from collections import namedtuple
+from itertools import islice
+import numpy as np
 import erlang_staffing
 import shift_optimizer
-import os
+from output import SUMMARY, get_reporter, text_format
+
+REPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+REPORT_CHUNK_ROWS = 10000  # Rows per Parquet row group
+TABLE_GAP_ROWS = 2  # Empty rows between two tables on the same sheet
+
+# One table of the report: the sheet it goes on, its file name for CSV and Parquet
+# output, its column names and an iterator over its rows
+ReportTable = namedtuple('ReportTable', ['sheet', 'name', 'columns', 'rows'])
+
+SHIFT_NAMES = ["First", "Second", "Third", "Fourth", "Fifth", "Sixth", "Seventh", "Eighth"]
+
+
+@text_format('report')
+def _format_report(record):
+    if record['format'] == 'xlsx':
+        return f"Excel report saved to {record['path']}"
+    return f"{record['format'].upper()} report saved to {record['path']}"
+
 
+def _shift_name(index):
+    """Name of the index-th shift of a pattern"""
+    return SHIFT_NAMES[index] if index < len(SHIFT_NAMES) else f"Shift {index+1}"
 
-def create_excel_report(staffing_needs, ideal_pattern):
+
+def report_tables(staffing_needs, ideal_pattern, all_patterns=None, pattern_evaluation=None):
+    """
+    Generate the tables of the staffing report, one row at a time
+
+    Nothing is recomputed when the patterns and their evaluation are passed in: main
+    has already generated them for the same staffing needs.
+
+    Parameters:
+    staffing_needs (dict): Dictionary with staffing needs for each day and hour (or interval)
+    ideal_pattern (dict): Result of find_ideal_shift_pattern, or None to leave its sheet out
+    all_patterns (list): Shift patterns (default: None, generated for the staffing intervals)
+    pattern_evaluation (dict): evaluate_all_patterns of all_patterns and staffing_needs
+                               (default: None, evaluated here)
+
+    Returns:
+    generator: ReportTable tuples in sheet order
+    """
+    periods = len(staffing_needs[erlang_staffing.DAYS_OF_WEEK[0]])
+    interval_minutes = erlang_staffing.interval_length(periods)
+    hourly = interval_minutes == erlang_staffing.MINUTES_PER_HOUR
+    if all_patterns is None:
+        all_patterns = shift_optimizer.generate_shift_patterns(interval_minutes=interval_minutes)
+        pattern_evaluation = None
+    if pattern_evaluation is None:
+        pattern_evaluation = shift_optimizer.evaluate_all_patterns(all_patterns, staffing_needs)
+
+    # Staffing needs by hour (or sub-hourly interval), with time labels for easier reading
+    if hourly:
+        labels = (f"{hour}:00" for hour in range(periods))
+    else:
+        labels = (erlang_staffing.period_label(period, interval_minutes) for period in range(periods))
+    yield ReportTable(
+        'Hourly Staffing Needs' if hourly else 'Interval Staffing Needs', 'staffing_needs',
+        ["Hour" if hourly else "Interval"] + erlang_staffing.DAYS_OF_WEEK,
+        ([label] + [staffing_needs[day][period] for day in erlang_staffing.DAYS_OF_WEEK]
+         for period, label in enumerate(labels)))
+
+    # Shift patterns
+    shift_count = len(all_patterns[0]['shifts']) if all_patterns else 0
+    columns = ['Pattern Number']
+    for i in range(shift_count):
+        columns += [f'{_shift_name(i)} Shift Start', f'{_shift_name(i)} Shift End',
+                    f'{_shift_name(i)} Shift Hours']
+    yield ReportTable('Shift Patterns', 'shift_patterns', columns,
+                      ([pattern['pattern_number']] +
+                       [value for shift in pattern['shifts']
+                        for value in (shift['start_time'], shift['end_time'],
+                                      ','.join(str(h) for h in shift['hours']))]
+                       for pattern in all_patterns))
+
+    # Pattern evaluation by day, fewest agents first
+    columns = ['Pattern Number', 'Total Agents', 'Agent Hours', 'Utilization (%)']
+    for i in range(shift_count):
+        columns += [f'{_shift_name(i)} Shift Time', f'{_shift_name(i)} Shift Agents',
+                    f'{_shift_name(i)} Shift Hours']
+    for day_index, day in enumerate(erlang_staffing.DAYS_OF_WEEK):
+        order = np.argsort(pattern_evaluation['total_agents'][:, day_index], kind='stable')
+        yield ReportTable(f'{day} Patterns', f'{day.lower()}_patterns', columns,
+                          _day_pattern_rows(all_patterns, pattern_evaluation, order, day_index))
+
+    if not ideal_pattern:
+        return
+
+    # The ideal weekly pattern: summary, shift times and daily breakdown on one sheet
+    yield ReportTable('Ideal Weekly Pattern', 'ideal_pattern_summary',
+                      ['Pattern Number', 'Total Weekly Agents', 'Total Weekly Hours',
+                       'Average Utilization (%)'],
+                      iter([[ideal_pattern['pattern_number'], ideal_pattern['total_weekly_agents'],
+                             ideal_pattern['total_weekly_hours'], ideal_pattern['avg_utilization']]]))
+    yield ReportTable('Ideal Weekly Pattern', 'ideal_shift_times', ['Shift', 'Time'],
+                      ([_shift_name(i), shift_time]
+                       for i, shift_time in enumerate(ideal_pattern['shift_times'])))
+    # In ILP mode the number of shifts differs from day to day; the widest day sets the columns
+    columns = ['Day', 'Total Agents', 'Agent Hours', 'Utilization (%)']
+    for i in range(max(len(day_stat['shifts']) for day_stat in ideal_pattern['daily_stats'])):
+        columns += [f'{_shift_name(i)} Shift Agents', f'{_shift_name(i)} Shift Hours']
+    yield ReportTable('Ideal Weekly Pattern', 'ideal_daily_breakdown', columns,
+                      ([day_stat['day'], day_stat['agents'], day_stat['hours'], day_stat['utilization']] +
+                       [value for shift in day_stat['shifts']
+                        for value in (shift['agents_needed'], shift['agent_hours'])]
+                       for day_stat in ideal_pattern['daily_stats']))
+
+
+def _day_pattern_rows(all_patterns, pattern_evaluation, order, day_index):
+    """Rows of one day's pattern sheet, in the given pattern order"""
+    for pattern_index in order:
+        evaluated_pattern = shift_optimizer.evaluated_pattern_for_day(
+            all_patterns, pattern_evaluation, pattern_index, day_index)
+        # Utilization using agent hours
+        utilization = float(pattern_evaluation['utilization'][pattern_index, day_index])
+        row = [evaluated_pattern['pattern_number'], evaluated_pattern['total_agents'],
+               evaluated_pattern['total_agent_hours'], round(utilization, 1)]
+        for shift in evaluated_pattern['shifts']:
+            row += [f"{shift['start_time']}-{shift['end_time']}", shift['agents_needed'],
+                    shift['agent_hours']]
+        yield row
+
+
+def _write_xlsx(path, tables):
+    """Stream the tables into a write-only workbook; rows go to disk as they are appended"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = sheet_name = None
+    for table in tables:
+        if table.sheet != sheet_name:
+            sheet = workbook.create_sheet(table.sheet)
+            sheet_name = table.sheet
+        else:
+            for _ in range(TABLE_GAP_ROWS):
+                sheet.append([])
+        sheet.append(table.columns)
+        for row in table.rows:
+            sheet.append(row)
+    workbook.save(path)
+
+
+def _write_csv(directory, tables):
+    """Write every table to its own CSV file, one row at a time"""
+    for table in tables:
+        with open(os.path.join(directory, f"{table.name}.csv"), 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(table.columns)
+            writer.writerows(table.rows)
+
+
+def _write_parquet(directory, tables, chunk_rows=REPORT_CHUNK_ROWS):
+    """Write every table to its own Parquet file, chunk_rows rows per row group"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError("Parquet reports require pyarrow: pip install pyarrow") from error
+
+    for table in tables:
+        path = os.path.join(directory, f"{table.name}.parquet")
+        writer = None
+        try:
+            while True:
+                chunk = list(islice(table.rows, chunk_rows))
+                if not chunk:
+                    break
+                batch = pa.Table.from_pylist([dict(zip(table.columns, row)) for row in chunk])
+                if writer is None:
+                    writer = pq.ParquetWriter(path, batch.schema)
+                writer.write_table(batch.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            pq.write_table(pa.table({column: [] for column in table.columns}), path)
+
+
+def create_excel_report(staffing_needs, ideal_pattern, excel_path='StaffingReport.xlsx',
+                        all_patterns=None, pattern_evaluation=None, output_format='xlsx'):
     """
     Create a comprehensive Excel report with all staffing data and shift information
 
+    The workbook is written in openpyxl's write-only mode: rows are streamed to disk
+    as they are generated, so memory stays flat however many intervals, patterns or
+    sites are reported. Pass the patterns and evaluation main has already computed
+    to skip recomputing them.
+
     Parameters:
     staffing_needs (dict): Dictionary with staffing needs for each day and hour
-    shift_plan (dict): Dictionary with optimal shift pattern for each day
+    ideal_pattern (dict): The ideal pattern from find_ideal_shift_pattern()
+    excel_path (str): Workbook to write (default: 'StaffingReport.xlsx')
+    all_patterns (list): Shift patterns already generated (default: None, generated here)
+    pattern_evaluation (dict): evaluate_all_patterns of all_patterns and staffing_needs
+                               (default: None, evaluated here)
+    output_format (str): 'xlsx', or 'csv' or 'parquet' (needs pyarrow) to write one file
+                         per table to a directory named after excel_path without its
+                         extension (default: 'xlsx')
+
+    Returns:
+    str: Path of the workbook, or of the directory of CSV or Parquet files
     """
-    print("\nCreating Excel report...")
-
-    # Create a new Excel writer
-    excel_path = 'StaffingReport.xlsx'
-    writer = pd.ExcelWriter(excel_path, engine='openpyxl')
-
-    # Create a sheet for hourly staffing needs
-    hours = list(range(erlang_staffing.HOURS_PER_DAY))
-    staffing_df = pd.DataFrame(index=hours)
-
-    for day in erlang_staffing.DAYS_OF_WEEK:
-        staffing_df[day] = staffing_needs[day]
-
-    # Add time labels for easier reading
-    staffing_df.index = [f"{hour}:00" for hour in hours]
-    staffing_df.index.name = "Hour"
-
-    # Save to Excel sheet
-    staffing_df.to_excel(writer, sheet_name='Hourly Staffing Needs')
-
-    # Create a sheet for shift patterns
-    all_patterns = shift_optimizer.generate_shift_patterns()
-    pattern_data = []
-
-    for pattern in all_patterns:
-        pattern_info = {
-            'Pattern Number': pattern['pattern_number']
-        }
-
-        # Add shift information
-        for i, shift in enumerate(pattern['shifts']):
-            shift_type = "First" if i == 0 else (
-                "Second" if i == 1 else "Third")
-            start_time = f"{shift['start_hour']:02d}:00"
-            end_time = f"{shift['end_hour']:02d}:00"
-            pattern_info[f'{shift_type} Shift Start'] = start_time
-            pattern_info[f'{shift_type} Shift End'] = end_time
-            pattern_info[f'{shift_type} Shift Hours'] = ','.join(
-                str(h) for h in shift['hours'])
-
-        pattern_data.append(pattern_info)
-
-    patterns_df = pd.DataFrame(pattern_data)
-    patterns_df.to_excel(writer, sheet_name='Shift Patterns', index=False)
-
-    # Create a sheet for pattern evaluation by day
-    for day in erlang_staffing.DAYS_OF_WEEK:
-        day_data = []
-
-        for pattern in all_patterns:
-            evaluated_pattern = shift_optimizer.evaluate_shift_pattern(
-                pattern, staffing_needs[day])
-
-            # Calculate utilization using agent hours
-            total_staff_hours = sum(staffing_needs[day])
-            total_agent_hours = evaluated_pattern['total_agent_hours']
-            utilization = (total_staff_hours / total_agent_hours) * \
-                100 if total_agent_hours > 0 else 0
-
-            # # Check if this is the optimal pattern for this day
-            # is_optimal = False
-            # if shift_plan and shift_plan[day]['pattern_number'] == pattern['pattern_number']:
-            #     is_optimal = True
-
-            pattern_info = {
-                'Pattern Number': pattern['pattern_number'],
-                'Total Agents': evaluated_pattern['total_agents'],
-                'Agent Hours': evaluated_pattern['total_agent_hours'],
-                'Utilization (%)': round(utilization, 1),
-                # 'Is Optimal': 'Yes' if is_optimal else 'No'
-            }
-
-            # Add shift details
-            for i, shift in enumerate(evaluated_pattern['shifts']):
-                shift_names = ["First", "Second", "Third", "Fourth", "Fifth", "Sixth", "Seventh", "Eighth"]
-                shift_type = shift_names[i] if i < len(shift_names) else f"Shift {i+1}"
-                start_time = f"{shift['start_hour']:02d}:00"
-                end_time = f"{shift['end_hour']:02d}:00"
-                agents = shift['agents_needed']
-                agent_hours = shift['agent_hours']
-
-                pattern_info[f'{shift_type} Shift Time'] = f"{start_time}-{end_time}"
-                pattern_info[f'{shift_type} Shift Agents'] = agents
-                pattern_info[f'{shift_type} Shift Hours'] = agent_hours
-
-            day_data.append(pattern_info)
-
-        # Create DataFrame and save to Excel
-        day_df = pd.DataFrame(day_data)
-        day_df = day_df.sort_values('Total Agents')  # Sort by total agents
-        day_df.to_excel(writer, sheet_name=f'{day} Patterns', index=False)
-
-    # # Add a summary sheet for optimal patterns
-    # if shift_plan:
-    #     optimal_data = []
-    #     for day in erlang_staffing.DAYS_OF_WEEK:
-    #         optimal_pattern = shift_plan[day]
-    #         total_agents = optimal_pattern['total_agents']
-    #         total_agent_hours = optimal_pattern['total_agent_hours']
-
-    #         # Calculate utilization using agent hours
-    #         total_staff_hours = sum(staffing_needs[day])
-    #         utilization = (total_staff_hours / total_agent_hours) * \
-    #             100 if total_agent_hours > 0 else 0
-
-    #         day_info = {
-    #             'Day': day,
-    #             'Optimal Pattern': optimal_pattern['pattern_number'],
-    #             'Total Agents': optimal_pattern['total_agents'],
-    #             'Agent Hours': total_agent_hours,
-    #             'Utilization (%)': round(utilization, 1)
-    #         }
-
-    #         # Add details for each shift
-    #         for i, shift in enumerate(optimal_pattern['shifts']):
-    #             shift_type = "First" if i == 0 else (
-    #                 "Second" if i == 1 else "Third")
-    #             start_time = f"{shift['start_hour']:02d}:00"
-    #             end_time = f"{shift['end_hour']:02d}:00"
-    #             agents = shift['agents_needed']
-    #             agent_hours = shift['agent_hours']
-
-    #             day_info[f'{shift_type} Shift Time'] = f"{start_time}-{end_time}"
-    #             day_info[f'{shift_type} Shift Agents'] = agents
-    #             day_info[f'{shift_type} Shift Hours'] = agent_hours
-
-    #         optimal_data.append(day_info)
-
-    #     # Create DataFrame and save to Excel
-    #     optimal_df = pd.DataFrame(optimal_data)
-    #     optimal_df.to_excel(writer, sheet_name='Optimal Patterns', index=False)
-
-        # Add a sheet for the ideal weekly shift pattern
-    if ideal_pattern:
-        # Create summary table for the ideal pattern
-        ideal_summary = pd.DataFrame([{
-            'Pattern Number': ideal_pattern['pattern_number'],
-            'Total Weekly Agents': ideal_pattern['total_weekly_agents'],
-            'Total Weekly Hours': ideal_pattern['total_weekly_hours'],
-            'Average Utilization (%)': ideal_pattern['avg_utilization']
-        }])
-        
-        # Create shift times table
-        shift_times_data = []
-        for i, shift_time in enumerate(ideal_pattern['shift_times']):
-            shift_names = ["First", "Second", "Third", "Fourth", "Fifth"]
-            shift_type = shift_names[i] if i < len(shift_names) else f"Shift {i+1}"
-            shift_times_data.append({
-                'Shift': shift_type,
-                'Time': shift_time
-            })
-        shift_times_df = pd.DataFrame(shift_times_data)
-        
-        # Create daily breakdown table
-        daily_data = []
-        for day_stat in ideal_pattern['daily_stats']:
-            day_info = {
-                'Day': day_stat['day'],
-                'Total Agents': day_stat['agents'],
-                'Agent Hours': day_stat['hours'],
-                'Utilization (%)': day_stat['utilization']
-            }
-            
-            # Add shift details
-            for i, shift in enumerate(day_stat['shifts']):
-                shift_names = ["First", "Second", "Third", "Fourth", "Fifth"]
-                shift_type = shift_names[i] if i < len(shift_names) else f"Shift {i+1}"
-                agents = shift['agents_needed']
-                agent_hours = shift['agent_hours']
-                
-                day_info[f'{shift_type} Shift Agents'] = agents
-                day_info[f'{shift_type} Shift Hours'] = agent_hours
-                
-            daily_data.append(day_info)
-            
-        daily_df = pd.DataFrame(daily_data)
-        
-        # Write to Excel with appropriate spacing
-        ideal_summary.to_excel(writer, sheet_name='Ideal Weekly Pattern', index=False)
-        
-        # Add shift times table a few rows below
-        shift_times_df.to_excel(writer, sheet_name='Ideal Weekly Pattern', 
-                              startrow=ideal_summary.shape[0] + 3, index=False)
-        
-        # Add daily breakdown table a few rows below that
-        daily_df.to_excel(writer, sheet_name='Ideal Weekly Pattern', 
-                        startrow=ideal_summary.shape[0] + shift_times_df.shape[0] + 6, index=False)
-
-
-    # Save and close the Excel file
-    writer.close()
-
-    print(f"Excel report saved to {excel_path}")
+    if output_format not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format: {output_format}")
+    reporter = get_reporter()
+    reporter.message("\nCreating Excel report..." if output_format == 'xlsx'
+                     else f"\nCreating {output_format.upper()} report...")
+
+    tables = report_tables(staffing_needs, ideal_pattern, all_patterns, pattern_evaluation)
+    if output_format == 'xlsx':
+        path = excel_path
+        _write_xlsx(path, tables)
+    else:
+        path = re.sub(r'\.xlsx$', '', excel_path)
+        os.makedirs(path, exist_ok=True)
+        if output_format == 'csv':
+            _write_csv(path, tables)
+        else:
+            _write_parquet(path, tables)
+
+    reporter.emit('report', SUMMARY, path=path, format=output_format)
+    return path
 
 
 if __name__ == "__main__":
@@ -0,0 +1,230 @@
+import numpy as np
+from erlang_staffing import (URGENT_TASK_WORK_MINUTES, SLA, AVERAGE_SPEED_OF_ANSWER,
+                             AVERAGE_PATIENCE_MINUTES, MINUTES_PER_HOUR,
+                             calculate_required_staff_batch)
+
+QUEUE_TAIL_LENGTH = 60  # Queue states kept after arrivals fall below half the departure rate
+POISSON_TAIL_WIDTH = 10  # Standard deviations of uniformization steps beyond the mean
+
+
+def erlang_a_metrics(arrival_rates, agents, service_time_minutes=URGENT_TASK_WORK_MINUTES,
+                     patience_minutes=AVERAGE_PATIENCE_MINUTES, asa=AVERAGE_SPEED_OF_ANSWER,
+                     interval=MINUTES_PER_HOUR):
+    """
+    Erlang A (M/M/c+M) performance of many intervals at once
+
+    Unlike Erlang C, callers hang up after an exponential patience time, as in the
+    simulators. The stationary distribution of the birth-death process is built in
+    log space (using the same Erlang B recursion as calculate_required_staff_batch)
+    and truncated once the queue is too long to matter. A caller who finds k others
+    waiting is answered when the k callers ahead have left and an agent is free,
+    unless they run out of patience first; the probability of that happening within
+    the answer target is computed for all k at once by uniformization.
+
+    Every argument can be a scalar or an array and they are broadcast against each other.
+
+    Parameters:
+    arrival_rates (array-like): Arrival rate for each interval
+    agents (array-like): Number of agents for each interval
+    service_time_minutes (float or array-like): Average service time in minutes
+    patience_minutes (float or array-like): Average caller patience in minutes
+    asa (float or array-like): Target answer time in minutes for the service level
+    interval (float or array-like): Interval length in minutes (default: 60)
+
+    Returns:
+    dict: Arrays with the broadcast shape of the inputs:
+          'service_level' - share of answered calls answered within asa,
+          'asa' - average wait of answered calls in minutes,
+          'abandonment' - probability that a caller hangs up,
+          'waiting_probability' - probability that a caller has to wait
+    """
+    rates, agents, aht, patience, asa, interval = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in
+          (arrival_rates, agents, service_time_minutes, patience_minutes, asa, interval)))
+    shape = rates.shape
+    rates, agents, aht, patience, asa, interval = (
+        value.ravel() for value in (rates, agents, aht, patience, asa, interval))
+
+    if np.any(rates < 0):
+        raise ValueError("arrival rates can't be negative")
+    if np.any((agents < 0) | (agents != np.round(agents))):
+        raise ValueError("agents must be non-negative integers")
+    if np.any(aht <= 0):
+        raise ValueError("aht can't be smaller or equals than 0")
+    if np.any(patience <= 0):
+        raise ValueError("patience can't be smaller or equals than 0")
+    if np.any(asa <= 0):
+        raise ValueError("asa can't be smaller or equals than 0")
+    if np.any(interval <= 0):
+        raise ValueError("interval can't be smaller or equals than 0")
+
+    # Intervals without calls are perfect, intervals without agents lose every caller
+    service_level = np.ones(rates.shape)
+    average_wait = np.zeros(rates.shape)
+    abandonment = np.zeros(rates.shape)
+    waiting_probability = np.zeros(rates.shape)
+    unstaffed = (rates > 0) & (agents == 0)
+    service_level[unstaffed] = 0
+    abandonment[unstaffed] = 1
+    waiting_probability[unstaffed] = 1
+
+    cells = np.flatnonzero((rates > 0) & (agents > 0))
+    if cells.size > 0:
+        metrics = _erlang_a_cells(rates[cells] / interval[cells], agents[cells].astype(np.int64),
+                                  1 / aht[cells], 1 / patience[cells], asa[cells])
+        for values, result in zip((service_level, average_wait, abandonment, waiting_probability),
+                                  metrics):
+            values[cells] = result
+
+    return {
+        'service_level': service_level.reshape(shape),
+        'asa': average_wait.reshape(shape),
+        'abandonment': abandonment.reshape(shape),
+        'waiting_probability': waiting_probability.reshape(shape),
+    }
+
+
+def _erlang_a_cells(arrival, servers, service_rate, abandon_rate, answer_time):
+    """Erlang A metrics for cells with calls and agents; all rates per minute"""
+    log_intensity = np.log(arrival / service_rate)
+
+    # log(1 / ErlangB(c)) at each cell's number of agents
+    log_inverse_b = np.zeros(servers.shape)
+    at_servers = np.zeros(servers.shape)
+    for positions in range(1, int(servers.max()) + 1):
+        log_inverse_b = np.logaddexp(0.0, np.log(positions) - log_intensity + log_inverse_b)
+        at_servers[servers == positions] = log_inverse_b[servers == positions]
+    # Weight of the states with a free agent, relative to the state with c busy agents:
+    # sum over n < c of A^n / n! divided by A^c / c!, which is 1 / B(c) - 1
+    log_free = at_servers + np.log(-np.expm1(-at_servers))
+
+    # Queue states c + k for k = 0..K, relative to state c; past the point where the
+    # departure rate is twice the arrival rate, every step halves the weight
+    capacity = servers * service_rate
+    queue_length = int(np.ceil(max(0.0, np.max((2 * arrival - capacity) / abandon_rate))))
+    queue_length += QUEUE_TAIL_LENGTH
+    ahead = np.arange(queue_length + 1)
+    # Rate at which a caller with k callers ahead moves up the queue
+    advance = capacity[:, None] + ahead[None, :] * abandon_rate[:, None]
+    log_queue = np.zeros(advance.shape)
+    log_queue[:, 1:] = np.cumsum(np.log(arrival[:, None] / advance[:, 1:]), axis=1)
+
+    # Normalize in log space
+    peak = np.maximum(log_queue.max(axis=1), log_free)
+    log_total = peak + np.log(np.exp(log_free - peak)
+                              + np.exp(log_queue - peak[:, None]).sum(axis=1))
+    answered_at_once = np.exp(log_free - log_total)
+    queue_probability = np.exp(log_queue - log_total[:, None])
+
+    # A caller with k ahead is answered if the k + 1 moves up the queue all happen
+    # before their own patience runs out
+    step_answered = advance / (advance + abandon_rate[:, None])
+    answered_from = np.cumprod(step_answered, axis=1)
+    # Expected wait on the answered paths: the time spent in each position does not
+    # depend on how the caller leaves it
+    answered_wait = answered_from * np.cumsum(1 / (advance + abandon_rate[:, None]), axis=1)
+
+    within_target = _answered_within(advance, abandon_rate, answer_time)
+
+    answered = answered_at_once + (queue_probability * answered_from).sum(axis=1)
+    answered_in_time = answered_at_once + (queue_probability * within_target).sum(axis=1)
+    service_level = np.where(answered > 0, answered_in_time / answered, 0)
+    average_wait = np.where(answered > 0, (queue_probability * answered_wait).sum(axis=1) / answered, 0)
+    return service_level, average_wait, 1 - answered, 1 - answered_at_once
+
+
+def _answered_within(advance, abandon_rate, answer_time):
+    """
+    Probability that a caller with k callers ahead is answered within answer_time
+
+    The caller's position is a pure-death chain that also ends at rate abandon_rate
+    when they hang up. It is uniformized at the largest total rate, and the chance
+    of being answered within n steps is weighted by the Poisson number of steps.
+    """
+    total_rate = advance + abandon_rate[:, None]
+    uniform_rate = total_rate[:, -1]
+    move_up = advance / uniform_rate[:, None]
+    stay = 1 - total_rate / uniform_rate[:, None]
+
+    mean_steps = uniform_rate * answer_time
+    steps = int(np.ceil(np.max(mean_steps + POISSON_TAIL_WIDTH * np.sqrt(mean_steps)))) + POISSON_TAIL_WIDTH
+    log_mean_steps = np.log(mean_steps)
+
+    answered_by_step = np.zeros(advance.shape)
+    within_target = np.zeros(advance.shape)
+    log_poisson = -mean_steps
+    for step in range(1, steps + 1):
+        # Answered within `step` uniformized steps; from the front of the queue the
+        # next move up means being answered
+        previous = np.empty(answered_by_step.shape)
+        previous[:, 0] = 1
+        previous[:, 1:] = answered_by_step[:, :-1]
+        answered_by_step = move_up * previous + stay * answered_by_step
+        log_poisson = log_poisson + log_mean_steps - np.log(step)
+        within_target += np.exp(log_poisson)[:, None] * answered_by_step
+    return within_target
+
+
+def calculate_required_staff_erlang_a(arrival_rates, service_time_minutes=URGENT_TASK_WORK_MINUTES,
+                                      patience_minutes=AVERAGE_PATIENCE_MINUTES,
+                                      target_wait_probability=SLA, asa=AVERAGE_SPEED_OF_ANSWER,
+                                      interval=MINUTES_PER_HOUR):
+    """
+    Calculate the required number of staff for many intervals with Erlang A
+
+    The smallest number of agents whose Erlang A service level (share of answered
+    calls answered within asa) reaches the target. The search is a vectorized
+    bisection below the Erlang C answer, which is an upper bound because callers who
+    hang up shorten the queue for everybody else.
+
+    Parameters:
+    arrival_rates (array-like): Arrival rate for each interval
+    service_time_minutes (float or array-like): Average service time in minutes
+    patience_minutes (float or array-like): Average caller patience in minutes
+    target_wait_probability (float or array-like): Target service level (default: SLA)
+    asa (float or array-like): Target answer time in minutes (default: AVERAGE_SPEED_OF_ANSWER)
+    interval (float or array-like): Interval length in minutes (default: 60)
+
+    Returns:
+    numpy.ndarray: Required number of staff, with the broadcast shape of the inputs
+    """
+    rates, aht, patience, target, asa, interval = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in
+          (arrival_rates, service_time_minutes, patience_minutes, target_wait_probability,
+           asa, interval)))
+    shape = rates.shape
+    rates, aht, patience, target, asa, interval = (
+        value.ravel() for value in (rates, aht, patience, target, asa, interval))
+    if np.any((target < 0) | (target > 1)):
+        raise ValueError("service_level must be between 0 and 1")
+
+    def meets_target(cells, agents):
+        service_level = erlang_a_metrics(rates[cells], agents, aht[cells], patience[cells],
+                                         asa[cells], interval[cells])['service_level']
+        return service_level >= target[cells]
+
+    required = np.zeros(rates.shape, dtype=np.int64)
+    cells = np.flatnonzero(rates > 0)
+    if cells.size == 0:
+        return required.reshape(shape)
+
+    # Bracket: low never meets the target (0 agents answer nobody), high does
+    high = np.maximum(calculate_required_staff_batch(rates[cells], aht[cells], target[cells],
+                                                     asa[cells], interval[cells]), 1)
+    short = ~meets_target(cells, high)
+    while np.any(short):
+        high[short] *= 2
+        short[short] = ~meets_target(cells[short], high[short])
+    low = np.zeros(high.shape, dtype=np.int64)
+
+    # Bisect every open bracket at once
+    active = np.flatnonzero(high - low > 1)
+    while active.size > 0:
+        middle = (low[active] + high[active]) // 2
+        met = meets_target(cells[active], middle)
+        high[active[met]] = middle[met]
+        low[active[~met]] = middle[~met]
+        active = active[high[active] - low[active] > 1]
+
+    required[cells] = high
+    return required.reshape(shape)
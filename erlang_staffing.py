@@ -1,7 +1,5 @@
 import math
 import numpy as np
-import matplotlib.pyplot as plt
-from pyworkforce.queuing import ErlangC
 
 # Data provided
 arrival_rate_urgent = {
@@ -18,23 +16,29 @@ DAYS_OF_WEEK = ['Sunday', 'Monday', 'Tuesday',
                 'Wednesday', 'Thursday', 'Friday', 'Saturday']
 HOURS_PER_DAY = 24
 MINUTES_PER_HOUR = 60
+INTERVAL_MINUTES = 60  # Length of a staffing interval in minutes: 60, 30, 15, ... (must divide an hour)
 URGENT_TASK_WORK_MINUTES = 6.3  # Average work time for urgent tasks in minutes
 SHIFT_HOURS = 8  # We can change the shift hours 4, 6, 8, or 12
 SHIFT_PATTERN = 3  # Number of shift pattern to cover a full day according to SHIFT_HOURS
+SHIFT_LENGTH_OPTIONS = (4, 6, 8, 12)  # Shift lengths the integer-programming scheduler may use
 WORKDAYS_PER_WEEK = 6
 SLA = 0.8
 AVERAGE_SPEED_OF_ANSWER = 0.3  # Average speed of answer target in seconds
+AVERAGE_PATIENCE_MINUTES = 2.0  # Average caller patience before hanging up, used by Erlang A
 
 
-def calculate_required_staff(arrival_rate, service_time_minutes=URGENT_TASK_WORK_MINUTES, target_wait_probability=SLA):
+def calculate_required_staff(arrival_rate, service_time_minutes=URGENT_TASK_WORK_MINUTES, target_wait_probability=SLA,
+                             cache=None, interval=MINUTES_PER_HOUR):
     """
     Calculate the required number of staff based on arrival rate and service time
     using pyworkforce ErlangC implementation
 
     Parameters:
-    arrival_rate (float): Average arrival rate per hour
+    arrival_rate (float): Average arrival rate per interval
     service_time_minutes (float): Average service time in minutes (default: URGENT_TASK_WORK_MINUTES)
     target_wait_probability (float): Target probability of waiting (default: 0.2 or 20%)
+    cache (StaffingCache): Optional cache consulted before computing (default: None)
+    interval (float): Interval length in minutes (default: 60)
 
     Returns:
     int: Required number of staff
@@ -43,13 +47,23 @@ def calculate_required_staff(arrival_rate, service_time_minutes=URGENT_TASK_WORK
     if arrival_rate == 0:
         return 0
 
+    if cache is not None:
+        key = cache.make_key(arrival_rate, service_time_minutes, target_wait_probability,
+                             AVERAGE_SPEED_OF_ANSWER, interval)
+        cached_staff = cache.lookup(key)
+        if cached_staff is not None:
+            return cached_staff
+
+    # pyworkforce brings in pandas, so it is only imported by the per-hour solver
+    from pyworkforce.queuing import ErlangC
+
     # Set up the ErlangC model with our parameters
     erlang = ErlangC(
         transactions=arrival_rate,
         aht=service_time_minutes,
         # Average speed of answer target (seconds)
         asa=AVERAGE_SPEED_OF_ANSWER,
-        interval=60,  # 60-minute interval (1 hour)
+        interval=interval,  # Interval length in minutes (60 for hourly forecasts)
         shrinkage=0  # Convert efficiency to shrinkage
     )
 
@@ -63,50 +77,325 @@ def calculate_required_staff(arrival_rate, service_time_minutes=URGENT_TASK_WORK
     agents_needed = result['positions']
 
     # Return the result as an integer, rounding up to ensure adequate staffing
-    return int(np.ceil(agents_needed))
+    agents_needed = int(np.ceil(agents_needed))
+    if cache is not None:
+        cache.store(key, agents_needed)
+
+    return agents_needed
 
 
-def calculate_hourly_staffing_needs():
+def calculate_required_staff_batch(arrival_rates, service_time_minutes=URGENT_TASK_WORK_MINUTES,
+                                   target_wait_probability=SLA, asa=AVERAGE_SPEED_OF_ANSWER,
+                                   interval=MINUTES_PER_HOUR):
     """
-    Calculate staffing needs for each hour of each day
+    Calculate the required number of staff for many intervals at once
+
+    This is a vectorized version of calculate_required_staff. Every argument can be
+    a scalar or an array and they are broadcast against each other, so a whole week
+    (or many queues) is solved in one call. Erlang B is computed with the recursion
+    1/B(n) = 1 + n/A * 1/B(n-1) in log space, so large agent counts do not overflow,
+    and the search for the required positions moves all cells forward together.
+    The results are the same integers pyworkforce's ErlangC.required_positions returns.
+
+    Parameters:
+    arrival_rates (array-like): Arrival rate for each interval
+    service_time_minutes (float or array-like): Average service time in minutes
+    target_wait_probability (float or array-like): Target service level (default: SLA)
+    asa (float or array-like): Target answer time used in the service level formula (minutes)
+    interval (float or array-like): Interval length in minutes (default: 60)
 
     Returns:
-    dict: Dictionary with staffing needs for each day and hour
+    numpy.ndarray: Required number of staff, with the broadcast shape of the inputs
     """
-    staffing_needs = {}
+    rates, aht, asa, service_level, interval = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in
+          (arrival_rates, service_time_minutes, asa, target_wait_probability, interval)))
+    shape = rates.shape
+    rates, aht, asa, service_level, interval = (
+        value.ravel() for value in (rates, aht, asa, service_level, interval))
 
-    for day in DAYS_OF_WEEK:
-        staffing_needs[day] = []
-        for hour in range(HOURS_PER_DAY):
-            arrival = arrival_rate_urgent[day][hour]
-            required_staff = calculate_required_staff(
-                arrival, URGENT_TASK_WORK_MINUTES)
-            staffing_needs[day].append(required_staff)
+    # Same input checks as pyworkforce's ErlangC
+    if np.any(rates < 0):
+        raise ValueError("arrival rates can't be negative")
+    if np.any(aht <= 0):
+        raise ValueError("aht can't be smaller or equals than 0")
+    if np.any(asa <= 0):
+        raise ValueError("asa can't be smaller or equals than 0")
+    if np.any(interval <= 0):
+        raise ValueError("interval can't be smaller or equals than 0")
+    if np.any((service_level < 0) | (service_level > 1)):
+        raise ValueError("service_level must be between 0 and 1")
+
+    required = np.zeros(rates.shape, dtype=np.int64)
+
+    # Intervals without arrivals need no staff
+    pending = np.flatnonzero(rates > 0)
+    intensity = rates[pending] / interval[pending] * aht[pending]
+    log_intensity = np.log(intensity)
+    answer_ratio = asa[pending] / aht[pending]
+    targets = service_level[pending]
+    # ErlangC starts its search at round(intensity + 1)
+    start = np.round(intensity + 1)
+
+    # log(1 / ErlangB(k)) for every pending cell, starting from ErlangB(0) = 1
+    log_inverse_b = np.zeros(pending.shape)
+    positions = 0
+
+    while pending.size > 0:
+        positions += 1
+        log_inverse_b = np.logaddexp(
+            0.0, np.log(positions) - log_intensity + log_inverse_b)
+
+        # Only cells whose search has reached this many positions are checked
+        candidates = start <= positions
+        if not np.any(candidates):
+            continue
+
+        erlang_b = np.exp(-log_inverse_b[candidates])
+        load = intensity[candidates]
+        waiting_probability = positions * erlang_b / \
+            (positions - load * (1 - erlang_b))
+        achieved = np.maximum(0, 1 - waiting_probability *
+                              np.exp(-(positions - load) * answer_ratio[candidates]))
+
+        solved = np.zeros(pending.shape, dtype=bool)
+        solved[candidates] = achieved >= targets[candidates]
+        if np.any(solved):
+            required[pending[solved]] = positions
+            keep = ~solved
+            pending = pending[keep]
+            intensity = intensity[keep]
+            log_intensity = log_intensity[keep]
+            answer_ratio = answer_ratio[keep]
+            targets = targets[keep]
+            start = start[keep]
+            log_inverse_b = log_inverse_b[keep]
+
+    return required.reshape(shape)
+
+
+def intervals_per_day(interval_minutes=INTERVAL_MINUTES):
+    """
+    Number of staffing intervals in a day
+
+    Parameters:
+    interval_minutes (int): Interval length in minutes; must divide an hour (default: INTERVAL_MINUTES)
+
+    Returns:
+    int: 24 for hourly intervals, 96 for 15-minute intervals, ...
+    """
+    if interval_minutes <= 0 or MINUTES_PER_HOUR % interval_minutes != 0:
+        raise ValueError("interval_minutes must divide an hour (60, 30, 20, 15, ...)")
+    return HOURS_PER_DAY * MINUTES_PER_HOUR // interval_minutes
+
+
+def interval_length(periods):
+    """
+    Interval length in minutes of a day split into a number of periods
+
+    Parameters:
+    periods (int): Number of intervals in the day, e.g. the length of a staffing needs row
+
+    Returns:
+    int: 60 for 24 periods, 15 for 96 periods, ...
+    """
+    if periods <= 0 or (HOURS_PER_DAY * MINUTES_PER_HOUR) % periods != 0:
+        raise ValueError(f"A day cannot be split into {periods} equal intervals")
+    return HOURS_PER_DAY * MINUTES_PER_HOUR // periods
+
+
+def period_label(period, interval_minutes=INTERVAL_MINUTES):
+    """Clock time at which a period of the day starts, e.g. '08:15'"""
+    minutes = (period * interval_minutes) % (HOURS_PER_DAY * MINUTES_PER_HOUR)
+    return f"{minutes // MINUTES_PER_HOUR:02d}:{minutes % MINUTES_PER_HOUR:02d}"
+
+
+def interval_arrival_rates(arrival_rates=None, interval_minutes=INTERVAL_MINUTES, whole_calls=False):
+    """
+    Calls per interval for every day, as a (7, intervals per day) array
+
+    Rows already at interval_minutes are used as they are. Coarser rows, such as the
+    hourly arrival_rate_urgent at 15-minute intervals, are spread evenly over the
+    intervals they contain; finer rows are added up.
 
+    The simulations generate a whole number of calls per interval, so with
+    whole_calls=True the intervals get whole calls instead: the running total of each
+    day is rounded, which keeps every hour's count when coarser rows are split and
+    spreads the remainder over the hour (2 calls an hour become 0, 1, 1, 0 per
+    quarter). Fractional rows, such as average weeks from call logs or float32
+    forecasts, are rounded the same way, so each day keeps its rounded total of calls
+    instead of losing the fractions.
+
+    Parameters:
+    arrival_rates (dict): Calls per period for each day; every row covers the whole day
+                          (default: arrival_rate_urgent)
+    interval_minutes (int): Interval length in minutes (default: INTERVAL_MINUTES)
+    whole_calls (bool): Round the intervals to whole calls (default: False)
+
+    Returns:
+    numpy.ndarray: Float array with rows ordered as DAYS_OF_WEEK
+    """
+    if arrival_rates is None:
+        arrival_rates = arrival_rate_urgent
+    periods = intervals_per_day(interval_minutes)
+    rows = np.array([np.asarray(arrival_rates[day], dtype=float) for day in DAYS_OF_WEEK])
+
+    source_periods = rows.shape[1]
+    if source_periods == periods:
+        rates = rows
+    elif source_periods < periods:
+        if periods % source_periods != 0:
+            raise ValueError(f"Cannot split {source_periods} periods a day into {periods} intervals")
+        split = periods // source_periods
+        rates = np.repeat(rows / split, split, axis=1)
+    else:
+        if source_periods % periods != 0:
+            raise ValueError(f"Cannot add {source_periods} periods a day up into {periods} intervals")
+        rates = rows.reshape(len(DAYS_OF_WEEK), periods, -1).sum(axis=2)
+    if whole_calls:
+        totals = np.floor(np.cumsum(rates, axis=1) + 0.5)
+        rates = np.diff(totals, axis=1, prepend=0)
+    return rates
+
+
+def calculate_hourly_staffing_needs(solver='batch', cache=None, arrival_rates=None,
+                                    interval_minutes=INTERVAL_MINUTES):
+    """
+    Calculate staffing needs for each interval (by default, each hour) of each day
+
+    Parameters:
+    solver (str): 'batch' to solve the whole week at once with calculate_required_staff_batch,
+                  'pyworkforce' to call calculate_required_staff for every hour, or
+                  'erlang_a' to solve the week with calculate_required_staff_erlang_a, which
+                  accounts for callers hanging up, or 'simulation' to search for the smallest
+                  staffing whose simulated service level, abandonment included, meets the SLA
+                  (default: 'batch')
+    cache (StaffingCache): Optional cache so repeated (arrival rate, AHT, SLA) cells are only solved
+                           once by the 'batch' and 'erlang_a' solvers
+    arrival_rates (dict): Calls per day and hour, or per day and interval, e.g. from
+                          forecast_data.Forecast.arrival_rates (default: arrival_rate_urgent)
+    interval_minutes (int): Length of the staffing intervals in minutes; hourly arrival
+                            rates are spread evenly over shorter intervals (default: 60)
+
+    Returns:
+    dict: Dictionary with staffing needs for each day and interval
+    """
+    if solver == 'simulation':
+        # Imported here because the simulation itself depends on this module
+        from simulated_staffing import calculate_simulated_staffing_needs
+        return calculate_simulated_staffing_needs(arrival_rates, interval_minutes=interval_minutes)
+
+    required = _solve_cells(interval_arrival_rates(arrival_rates, interval_minutes), solver, cache,
+                            interval_minutes)
+    staffing_needs = {}
+    for day_index, day in enumerate(DAYS_OF_WEEK):
+        staffing_needs[day] = [int(staff) for staff in required[day_index]]
     return staffing_needs
 
+
+def _solve_cells(arrivals, solver, cache, interval_minutes):
+    """Required staff for an array of interval arrival rates, with a solver that treats every cell on its own"""
+    if solver == 'batch':
+        if cache is not None:
+            return cache.required_staff(arrivals, URGENT_TASK_WORK_MINUTES, interval=interval_minutes)
+        return calculate_required_staff_batch(arrivals, URGENT_TASK_WORK_MINUTES, interval=interval_minutes)
+    if solver == 'pyworkforce':
+        required = [calculate_required_staff(arrival, URGENT_TASK_WORK_MINUTES, cache=cache,
+                                             interval=interval_minutes)
+                    for arrival in np.ravel(arrivals).tolist()]
+        return np.array(required, dtype=np.int64).reshape(np.shape(arrivals))
+    if solver == 'erlang_a':
+        # Imported here because erlang_a builds on this module
+        from erlang_a import calculate_required_staff_erlang_a
+        if cache is not None:
+            return cache.required_staff_erlang_a(arrivals, URGENT_TASK_WORK_MINUTES, interval=interval_minutes)
+        return calculate_required_staff_erlang_a(arrivals, URGENT_TASK_WORK_MINUTES,
+                                                 interval=interval_minutes)
+    raise ValueError(f"Unknown staffing solver: {solver}")
+
+
+def changed_cells(old_arrival_rates, new_arrival_rates, interval_minutes=INTERVAL_MINUTES,
+                  whole_calls=False):
+    """
+    The (day, interval) cells whose calls differ between two forecasts
+
+    Parameters:
+    old_arrival_rates (dict): Calls per day and hour (or interval); None is arrival_rate_urgent
+    new_arrival_rates (dict): The new forecast, in the same form
+    interval_minutes (int): Interval length the forecasts are compared at (default: 60)
+    whole_calls (bool): Compare the whole calls the simulations generate (default: False)
+
+    Returns:
+    numpy.ndarray: Boolean (7, intervals per day) mask, True where the calls changed
+    """
+    return (interval_arrival_rates(old_arrival_rates, interval_minutes, whole_calls) !=
+            interval_arrival_rates(new_arrival_rates, interval_minutes, whole_calls))
+
+
+def update_staffing_needs(staffing_needs, arrival_rates, cells, solver='batch', cache=None,
+                          interval_minutes=INTERVAL_MINUTES):
+    """
+    Re-solve the staffing needs of some cells after the forecast changed
+
+    Every cell is solved on its own by the 'batch', 'pyworkforce' and 'erlang_a'
+    solvers, so the others keep their values; an intraday re-forecast of a few hours
+    costs a few cells instead of the whole week.
+
+    Parameters:
+    staffing_needs (dict): Staffing needs for the old forecast, left unchanged
+    arrival_rates (dict): The new forecast (None is arrival_rate_urgent)
+    cells (numpy.ndarray): Boolean (7, intervals per day) mask of the cells to re-solve,
+                           e.g. from changed_cells
+    solver (str): 'batch', 'pyworkforce' or 'erlang_a' (default: 'batch')
+    cache (StaffingCache): Optional cache, see calculate_hourly_staffing_needs
+    interval_minutes (int): Length of the staffing intervals (default: 60)
+
+    Returns:
+    dict: New staffing needs for each day and interval
+    """
+    if solver == 'simulation':
+        raise ValueError("The simulation solver cannot re-solve single cells")
+    day_indices, periods = np.nonzero(cells)
+    arrivals = interval_arrival_rates(arrival_rates, interval_minutes)
+    required = _solve_cells(arrivals[day_indices, periods], solver, cache, interval_minutes)
+
+    updated = {day: list(staffing_needs[day]) for day in DAYS_OF_WEEK}
+    for day_index, period, staff in zip(day_indices.tolist(), periods.tolist(), required.tolist()):
+        updated[DAYS_OF_WEEK[day_index]][period] = int(staff)
+    return updated
+
 # Function to visualize staffing needs
 
 
-def visualize_staffing_needs(staffing_needs):
+def visualize_staffing_needs(staffing_needs, path='hourly_staffing_needs.png'):
     """
     Create a visualization of staffing needs for each day
 
     Parameters:
-    staffing_needs (dict): Dictionary with staffing needs for each day and hour
+    staffing_needs (dict): Dictionary with staffing needs for each day and hour (or interval)
+    path (str): Image file to write (default: 'hourly_staffing_needs.png')
     """
-    plt.figure(figsize=(14, 8))
+    # A bare Figure renders with the non-interactive Agg canvas: no display is needed
+    # and pyplot, the slowest part of matplotlib to import, is never loaded
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(14, 8))
+    axes = figure.subplots()
 
     hours = list(range(HOURS_PER_DAY))
+    # Sub-hourly intervals are drawn at their start time in hours
+    periods = len(staffing_needs[DAYS_OF_WEEK[0]])
+    times = np.arange(periods) * interval_length(periods) / MINUTES_PER_HOUR
 
     for day in DAYS_OF_WEEK:
-        plt.plot(hours, staffing_needs[day], marker='o', label=day)
-
-    plt.xlabel('Hour of Day')
-    plt.ylabel('Required Staff')
-    plt.title('Hourly Staffing Needs Based on Erlang C')
-    plt.grid(True)
-    plt.legend()
-    plt.xticks(hours)
-    plt.savefig('hourly_staffing_needs.png')
-    plt.close()
+        axes.plot(times, staffing_needs[day], marker='o' if periods <= HOURS_PER_DAY else None,
+                  label=day)
+
+    axes.set_xlabel('Hour of Day')
+    axes.set_ylabel('Required Staff')
+    axes.set_title('Hourly Staffing Needs Based on Erlang C' if periods == HOURS_PER_DAY
+                   else f'Staffing Needs per {interval_length(periods)}-Minute Interval Based on Erlang C')
+    axes.grid(True)
+    axes.legend()
+    axes.set_xticks(hours)
+    figure.savefig(path)
@@ -0,0 +1,84 @@
+import heapq
+import numpy as np
+from rng_streams import hourly_streams
+
+SIMULATION_ENGINES = ('simpy', 'fast')  # Engines accepted by run_simulation and run_shift_simulation
+
+
+def run_queue(num_agents, arrival_times, service_times, patience_times, horizon):
+    """
+    Simulate a first-come-first-served multi-agent queue with caller abandonment
+
+    This is the M/M/c+M model of the SimPy simulators without the event machinery.
+    Calls are taken in arrival order and a heap holds the time each agent becomes
+    free. A caller is answered by the earliest free agent if that happens within
+    their patience, otherwise they abandon and the agent stays free. Because the
+    queue is FCFS, this gives the same answer and abandonment times as the SimPy model.
+
+    As in the SimPy run, the clock stops at the horizon: calls answered before it are
+    handled, callers whose patience ran out before it abandoned, and callers still
+    waiting at the horizon are neither.
+
+    Parameters:
+    num_agents (int): Number of agents
+    arrival_times (numpy.ndarray): Sorted arrival times in seconds
+    service_times (numpy.ndarray): Service time of each call in seconds
+    patience_times (numpy.ndarray): Patience of each caller in seconds
+    horizon (float): End of the simulation in seconds
+
+    Returns:
+    tuple: (wait_times, calls_handled, calls_abandoned) where wait_times is a list
+           with the wait of every handled call
+    """
+    if num_agents <= 0:
+        raise ValueError('"capacity" must be > 0.')
+
+    agent_free_times = [0.0] * num_agents
+    wait_times = []
+    calls_abandoned = 0
+
+    for arrival, service, patience in zip(arrival_times.tolist(), service_times.tolist(),
+                                          patience_times.tolist()):
+        start = max(arrival, agent_free_times[0])
+        wait = start - arrival
+
+        if wait > patience:
+            # The caller hangs up before an agent is free
+            if arrival + patience < horizon:
+                calls_abandoned += 1
+            continue
+
+        if start >= horizon:
+            # Still waiting when the simulation stops
+            continue
+
+        heapq.heapreplace(agent_free_times, start + service)
+        wait_times.append(wait)
+
+    return wait_times, len(wait_times), calls_abandoned
+
+
+def sample_calls(rng, arrival_windows, service_time_seconds, avg_patience_seconds):
+    """
+    Draw arrival, service and patience times for a run in bulk
+
+    Parameters:
+    rng: Random generator (or the numpy.random module), CallStreams, or a list with
+         CallStreams for each arrival window
+    arrival_windows (list): (start, end, number of calls) for each period; arrivals
+                            are spread uniformly within each period
+    service_time_seconds (float): Average service time in seconds
+    avg_patience_seconds (float): Average patience time in seconds
+
+    Returns:
+    tuple: (arrival_times, service_times, patience_times) arrays, sorted by arrival
+    """
+    window_streams = hourly_streams(rng, len(arrival_windows))
+    # The calls of each window draw from that window's streams, in arrival order
+    arrivals = [np.sort(streams.arrivals.uniform(start, end, int(calls)))
+                for streams, (start, end, calls) in zip(window_streams, arrival_windows)]
+    services = [streams.services.exponential(service_time_seconds, times.size)
+                for streams, times in zip(window_streams, arrivals)]
+    patiences = [streams.patience.exponential(avg_patience_seconds, times.size)
+                 for streams, times in zip(window_streams, arrivals)]
+    return tuple(np.concatenate(draws or [np.empty(0)]) for draws in (arrivals, services, patiences))
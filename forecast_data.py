@@ -0,0 +1,284 @@
+import datetime
+import json
+import numpy as np
+import pandas as pd
+from erlang_staffing import DAYS_OF_WEEK, MINUTES_PER_HOUR
+
+FORECAST_CHUNK_ROWS = 1_000_000  # Rows read from a forecast file at a time
+FORECAST_DTYPE = np.float32  # Calls per interval; float32 halves the memory of float64
+FORECAST_COLUMNS = {'site': 'site', 'day': 'day', 'interval': 'interval', 'calls': 'calls'}
+
+
+class Forecast:
+    """
+    Call forecasts of one or more sites as a (site, day, interval) array
+
+    The day axis holds either the seven days of the week (DAYS_OF_WEEK order) or a
+    run of calendar dates. The array can be a numpy.memmap, so forecasts larger than
+    the memory are read from disk only where they are used.
+
+    arrival_rates() turns one site's week into the {day: calls per interval} dict
+    the staffing, shift and simulation stages take in place of arrival_rate_urgent.
+    """
+
+    def __init__(self, rates, sites, days, interval_minutes=MINUTES_PER_HOUR):
+        """
+        Parameters:
+        rates (numpy.ndarray): Calls per site, day and interval
+        sites (list): Site names, one per row of rates
+        days (list): Day names (DAYS_OF_WEEK) or ISO dates, one per day of rates
+        interval_minutes (int): Length of an interval in minutes (default: 60)
+        """
+        if rates.shape[:2] != (len(sites), len(days)):
+            raise ValueError("rates must have one row per site and one column per day")
+        if rates.shape[2] * interval_minutes != 24 * MINUTES_PER_HOUR:
+            raise ValueError("rates must cover the whole day in intervals of interval_minutes")
+        self.rates = rates
+        self.sites = list(sites)
+        self.days = list(days)
+        self.interval_minutes = interval_minutes
+
+    @property
+    def intervals_per_day(self):
+        """Number of intervals in a day"""
+        return self.rates.shape[2]
+
+    @property
+    def is_weekly(self):
+        """Whether the day axis is the seven days of the week rather than dates"""
+        return self.days == DAYS_OF_WEEK
+
+    def site_rates(self, site=None):
+        """
+        The (day, interval) forecast of one site
+
+        Parameters:
+        site (str): Site name (default: None, the first site)
+
+        Returns:
+        numpy.ndarray: A view of the site's rows of the forecast array
+        """
+        if site is None:
+            return self.rates[0]
+        if site not in self.sites:
+            raise KeyError(f"Unknown site: {site}")
+        return self.rates[self.sites.index(site)]
+
+    def arrival_rates(self, site=None, start_day=0, interval_minutes=MINUTES_PER_HOUR):
+        """
+        One week of a site in the layout of erlang_staffing.arrival_rate_urgent
+
+        Parameters:
+        site (str): Site name (default: None, the first site)
+        start_day (int): Position of the first of seven consecutive days on the day axis;
+                         dated forecasts are keyed by the weekday of each date (default: 0)
+        interval_minutes (int): Length of the returned intervals; finer forecast intervals
+                                are added up, e.g. four 15-minute intervals per hour (default: 60)
+
+        Returns:
+        dict: Calls per interval for each day name, as float arrays
+        """
+        if interval_minutes % self.interval_minutes != 0:
+            raise ValueError(f"Cannot split {self.interval_minutes}-minute intervals "
+                             f"into {interval_minutes}-minute ones")
+        if start_day < 0 or start_day + len(DAYS_OF_WEEK) > len(self.days):
+            raise ValueError("The forecast does not hold seven days from start_day")
+
+        week = np.asarray(self.site_rates(site)[start_day:start_day + len(DAYS_OF_WEEK)], dtype=float)
+        group = interval_minutes // self.interval_minutes
+        week = week.reshape(week.shape[0], -1, group).sum(axis=2)
+
+        if self.is_weekly:
+            names = DAYS_OF_WEEK[start_day:start_day + len(DAYS_OF_WEEK)]
+        else:
+            # DAYS_OF_WEEK starts on Sunday, date.weekday() on Monday
+            names = [DAYS_OF_WEEK[(datetime.date.fromisoformat(day).weekday() + 1) % 7]
+                     for day in self.days[start_day:start_day + len(DAYS_OF_WEEK)]]
+        return {day: week[position] for position, day in enumerate(names)}
+
+    def save(self, path):
+        """
+        Save the forecast as a .npy array with a .json file of its labels, for open_forecast
+
+        Parameters:
+        path (str): Path of the .npy file; the labels go to the same path with .json appended
+        """
+        np.save(path, self.rates)
+        self._save_labels(path)
+
+    def _save_labels(self, path):
+        """Write the sites, days and interval length next to the array file"""
+        with open(f"{path}.json", 'w') as file:
+            json.dump({'sites': self.sites, 'days': self.days,
+                       'interval_minutes': self.interval_minutes}, file)
+
+    @classmethod
+    def from_arrival_rates(cls, arrival_rates, site='default', interval_minutes=MINUTES_PER_HOUR):
+        """
+        Wrap a {day: calls per interval} dict such as arrival_rate_urgent
+
+        Parameters:
+        arrival_rates (dict): Calls per interval for each day in DAYS_OF_WEEK
+        site (str): Name of the site (default: 'default')
+        interval_minutes (int): Length of an interval in minutes (default: 60)
+
+        Returns:
+        Forecast: A single-site weekly forecast
+        """
+        rates = np.array([arrival_rates[day] for day in DAYS_OF_WEEK], dtype=FORECAST_DTYPE)
+        return cls(rates[None], [site], DAYS_OF_WEEK, interval_minutes)
+
+
+def open_forecast(path, mmap_mode='r'):
+    """
+    Open a forecast saved by Forecast.save or load_forecast(memmap_path=...)
+
+    Parameters:
+    path (str): Path of the .npy file
+    mmap_mode (str): numpy memory-map mode; None reads the whole array into memory (default: 'r')
+
+    Returns:
+    Forecast: The forecast, backed by the file unless mmap_mode is None
+    """
+    with open(f"{path}.json") as file:
+        labels = json.load(file)
+    return Forecast(np.load(path, mmap_mode=mmap_mode), labels['sites'], labels['days'],
+                    labels['interval_minutes'])
+
+
+def read_chunks(path, columns, chunk_rows):
+    """Yield the given columns of a CSV or Parquet file as DataFrames of at most chunk_rows rows"""
+    if str(path).lower().endswith(('.parquet', '.pq')):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError("Reading Parquet files requires pyarrow: pip install pyarrow") from error
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+
+def _is_weekday(values):
+    """Whether a day column holds day names or day-of-week numbers rather than dates"""
+    if pd.api.types.is_integer_dtype(values):
+        return True
+    return bool(values.astype(str).str.capitalize().isin(DAYS_OF_WEEK).all())
+
+
+def _day_positions(values, weekly, first_date):
+    """Position of each row's day on the day axis"""
+    if not weekly:
+        dates = pd.to_datetime(values).to_numpy().astype('datetime64[D]')
+        return (dates - first_date).astype(np.int64)
+    if pd.api.types.is_integer_dtype(values):
+        positions = values.to_numpy().astype(np.int64)
+    else:
+        positions = pd.Categorical(values.astype(str).str.capitalize(),
+                                   categories=DAYS_OF_WEEK).codes.astype(np.int64)
+    if np.any((positions < 0) | (positions >= len(DAYS_OF_WEEK))):
+        raise ValueError("Day of week must be a day name or a number from 0 (Sunday) to 6")
+    return positions
+
+
+def _interval_positions(values, interval_minutes, intervals_per_day):
+    """Position of each row's interval: interval numbers, or start times such as '08:15'"""
+    if pd.api.types.is_integer_dtype(values):
+        positions = values.to_numpy().astype(np.int64)
+    else:
+        # 'HH:MM' or 'HH:MM:SS'
+        parts = values.astype(str).str.split(':', expand=True)
+        minutes = parts[0].astype(np.int64).to_numpy() * MINUTES_PER_HOUR + parts[1].astype(np.int64).to_numpy()
+        positions = minutes // interval_minutes
+    if np.any((positions < 0) | (positions >= intervals_per_day)):
+        raise ValueError(f"Intervals must fall within the day ({intervals_per_day} intervals "
+                         f"of {interval_minutes} minutes)")
+    return positions
+
+
+def load_forecast(path, interval_minutes=MINUTES_PER_HOUR, columns=None, memmap_path=None,
+                  chunk_rows=FORECAST_CHUNK_ROWS, dtype=FORECAST_DTYPE):
+    """
+    Load interval forecasts of many sites from a CSV or Parquet file
+
+    The file is read in chunks of chunk_rows rows, twice: first to find the sites
+    and the range of days, then to add each chunk's calls into the (site, day,
+    interval) array. Memory use is the array plus one chunk, and with memmap_path
+    the array itself lives in a .npy file on disk, so forecasts larger than the
+    memory can be loaded and reopened later with open_forecast.
+
+    The file has one row per site, day and interval (rows for the same cell, e.g.
+    of several queues, are added up):
+    - site: any label; sites are kept in the order they first appear
+    - day: a day name or day-of-week number (0 = Sunday) for a weekly profile, or
+      a date, in which case the day axis runs from the first to the last date
+    - interval: the interval number within the day, or its start time ('08:15')
+    - calls: forecast calls in the interval
+    Parquet files need pyarrow.
+
+    Parameters:
+    path (str): CSV or Parquet (.parquet, .pq) file
+    interval_minutes (int): Length of an interval in minutes (default: 60)
+    columns (dict): Names of the site, day, interval and calls columns in the file, for
+                    those that differ from FORECAST_COLUMNS (default: None)
+    memmap_path (str): Build the array in this .npy file instead of in memory (default: None)
+    chunk_rows (int): Rows read at a time (default: 1,000,000)
+    dtype (numpy.dtype): Type of the calls array (default: float32)
+
+    Returns:
+    Forecast: The forecast of every site
+    """
+    if (24 * MINUTES_PER_HOUR) % interval_minutes != 0:
+        raise ValueError("interval_minutes must divide the day evenly")
+    intervals_per_day = 24 * MINUTES_PER_HOUR // interval_minutes
+    names = dict(FORECAST_COLUMNS, **(columns or {}))
+    site_column, day_column, interval_column, calls_column = (
+        names['site'], names['day'], names['interval'], names['calls'])
+
+    # First pass: sites and days
+    sites = {}
+    weekly = None
+    first_date = last_date = None
+    for chunk in read_chunks(path, [site_column, day_column], chunk_rows):
+        for site in pd.unique(chunk[site_column].astype(str)):
+            sites.setdefault(site, len(sites))
+        if weekly is None:
+            weekly = _is_weekday(chunk[day_column])
+        if not weekly:
+            dates = pd.to_datetime(chunk[day_column])
+            low, high = dates.min().to_datetime64(), dates.max().to_datetime64()
+            first_date = low if first_date is None else min(first_date, low)
+            last_date = high if last_date is None else max(last_date, high)
+    if not sites:
+        raise ValueError(f"No forecast rows in {path}")
+
+    if weekly:
+        days = list(DAYS_OF_WEEK)
+    else:
+        first_date = np.datetime64(first_date, 'D')
+        last_date = np.datetime64(last_date, 'D')
+        days = [str(day) for day in np.arange(first_date, last_date + 1)]
+
+    shape = (len(sites), len(days), intervals_per_day)
+    if memmap_path is not None:
+        rates = np.lib.format.open_memmap(memmap_path, mode='w+', dtype=dtype, shape=shape)
+    else:
+        rates = np.zeros(shape, dtype=dtype)
+
+    # Second pass: add every chunk's calls into the array
+    site_categories = list(sites)
+    for chunk in read_chunks(path, [site_column, day_column, interval_column, calls_column],
+                              chunk_rows):
+        site_positions = pd.Categorical(chunk[site_column].astype(str),
+                                        categories=site_categories).codes.astype(np.int64)
+        day_positions = _day_positions(chunk[day_column], weekly, first_date)
+        interval_positions = _interval_positions(chunk[interval_column], interval_minutes,
+                                                 intervals_per_day)
+        np.add.at(rates, (site_positions, day_positions, interval_positions),
+                  chunk[calls_column].to_numpy(dtype=float))
+
+    forecast = Forecast(rates, site_categories, days, interval_minutes)
+    if memmap_path is not None:
+        rates.flush()
+        forecast._save_labels(memmap_path)
+    return forecast
@@ -1,93 +1,106 @@
 import shift_optimizer
 import erlang_staffing
-import matplotlib.pyplot as plt
 import numpy as np
+from output import SUMMARY, get_reporter, text_format
 
 
-def find_ideal_shift_pattern(staffing_needs):
+def find_ideal_shift_pattern(staffing_needs, patterns=None, evaluation=None, mode='patterns'):
     """
     Find the ideal shift pattern to use consistently across all days of the week
     
     Parameters:
     staffing_needs (dict): Dictionary with staffing needs for each day and hour
+    patterns (list): Shift patterns to compare (default: generate_shift_patterns())
+    evaluation (dict): Precomputed shift_optimizer.evaluate_all_patterns result for
+                       these patterns, so the evaluation is not repeated (default: None)
+    mode (str): 'patterns' to pick the best of the fixed shift patterns, or 'ilp' to
+                solve for overlapping shifts at any start hour with
+                shift_scheduler.find_ilp_shift_pattern (default: 'patterns')
     
     Returns:
     dict: Information about the optimal pattern and its weekly resource requirements
     """
-    print("\nAnalyzing patterns for consistent weekly scheduling...")
-    all_patterns = shift_optimizer.generate_shift_patterns()
-    weekly_pattern_stats = []
+    if mode == 'ilp':
+        get_reporter().message("\nSolving the shift covering problem for all start hours and shift lengths...")
+        import shift_scheduler
+        return shift_scheduler.find_ilp_shift_pattern(staffing_needs)
+    if mode != 'patterns':
+        raise ValueError(f"Unknown shift optimizer mode: {mode}")
+
+    get_reporter().message("\nAnalyzing patterns for consistent weekly scheduling...")
+    staffing_matrix = shift_optimizer.build_staffing_matrix(staffing_needs)
+    interval_minutes = erlang_staffing.interval_length(staffing_matrix.shape[1])
+    if patterns is None:
+        patterns = shift_optimizer.generate_shift_patterns(interval_minutes=interval_minutes)
+    if evaluation is None:
+        evaluation = shift_optimizer.evaluate_all_patterns(patterns, staffing_matrix)
     
-    # For each pattern, calculate total resources needed across all days
-    for pattern in all_patterns:
-        pattern_number = pattern['pattern_number']
-        total_weekly_agents = 0
-        total_weekly_hours = 0
-        daily_stats = []
-        
-        # Evaluate this pattern for each day
-        for day in erlang_staffing.DAYS_OF_WEEK:
-            evaluated_pattern = shift_optimizer.evaluate_shift_pattern(
-                pattern, staffing_needs[day])
-            
-            # Add to weekly totals
-            total_weekly_agents += evaluated_pattern['total_agents']
-            total_weekly_hours += evaluated_pattern['total_agent_hours']
-            
-            # Calculate utilization for this day
-            total_staff_hours = sum(staffing_needs[day])
-            utilization = (total_staff_hours / evaluated_pattern['total_agent_hours']) * 100 if evaluated_pattern['total_agent_hours'] > 0 else 0
-            
-            # Store daily data
-            daily_stats.append({
-                'day': day,
-                'agents': evaluated_pattern['total_agents'],
-                'hours': evaluated_pattern['total_agent_hours'],
-                'utilization': round(utilization, 1),
-                'shifts': evaluated_pattern['shifts']
-            })
-        
-        # Store pattern summary
-        weekly_pattern_stats.append({
-            'pattern_number': pattern_number,
-            'total_weekly_agents': total_weekly_agents,
-            'total_weekly_hours': total_weekly_hours,
-            'avg_utilization': round(sum(day['utilization'] for day in daily_stats) / len(daily_stats), 1),
-            'daily_stats': daily_stats,
-            'shift_times': [f"{shift['start_hour']:02d}:00-{shift['end_hour']:02d}:00" for shift in pattern['shifts']]
-        })
+    # Weekly totals for every pattern at once
+    total_weekly_agents = evaluation['total_agents'].sum(axis=1)
+    total_weekly_hours = evaluation['total_agent_hours'].sum(axis=1)
     
     # Find the optimal pattern (minimizing total agent hours)
-    optimal_pattern = min(weekly_pattern_stats, key=lambda p: p['total_weekly_hours'])
+    optimal_index = int(np.argmin(total_weekly_hours))
+    pattern = patterns[optimal_index]
+    
+    # Only the optimal pattern's daily breakdown is built as dicts
+    daily_stats = []
+    for day_index, day in enumerate(erlang_staffing.DAYS_OF_WEEK):
+        evaluated_pattern = shift_optimizer.evaluated_pattern_for_day(
+            patterns, evaluation, optimal_index, day_index)
+        utilization = float(evaluation['utilization'][optimal_index, day_index])
+        
+        # Store daily data
+        daily_stats.append({
+            'day': day,
+            'agents': evaluated_pattern['total_agents'],
+            'hours': evaluated_pattern['total_agent_hours'],
+            'utilization': round(utilization, 1),
+            'shifts': evaluated_pattern['shifts']
+        })
     
-    return optimal_pattern
+    return {
+        'pattern_number': pattern['pattern_number'],
+        'total_weekly_agents': int(total_weekly_agents[optimal_index]),
+        'total_weekly_hours': int(total_weekly_hours[optimal_index]),
+        'avg_utilization': round(sum(day['utilization'] for day in daily_stats) / len(daily_stats), 1),
+        'daily_stats': daily_stats,
+        'shift_times': [f"{shift['start_time']}-{shift['end_time']}" for shift in pattern['shifts']],
+        'interval_minutes': interval_minutes
+    }
 
 
 def display_ideal_shift_pattern(optimal_pattern):
-    """Display the results of the ideal shift pattern analysis"""
-    print("\n=== IDEAL WEEKLY SHIFT PATTERN ===")
-    print(f"Pattern {optimal_pattern['pattern_number']} is optimal for consistent weekly scheduling:")
-    print(f"Total weekly agents required: {optimal_pattern['total_weekly_agents']}")
-    print(f"Total weekly agent hours: {optimal_pattern['total_weekly_hours']}")
-    print(f"Average utilization: {optimal_pattern['avg_utilization']}%")
-    print("\nShift times for this pattern:")
+    """Report the results of the ideal shift pattern analysis as an 'ideal_pattern' record"""
+    get_reporter().emit('ideal_pattern', SUMMARY, **optimal_pattern)
+
+
+@text_format('ideal_pattern')
+def _format_ideal_pattern(optimal_pattern):
+    lines = ["\n=== IDEAL WEEKLY SHIFT PATTERN ===",
+             f"Pattern {optimal_pattern['pattern_number']} is optimal for consistent weekly scheduling:",
+             f"Total weekly agents required: {optimal_pattern['total_weekly_agents']}",
+             f"Total weekly agent hours: {optimal_pattern['total_weekly_hours']}",
+             f"Average utilization: {optimal_pattern['avg_utilization']}%",
+             "\nShift times for this pattern:"]
     
     for i, shift_time in enumerate(optimal_pattern['shift_times']):
         shift_names = ["First", "Second", "Third", "Fourth", "Fifth"]
         shift_type = shift_names[i] if i < len(shift_names) else f"Shift {i+1}"
-        print(f"  {shift_type} Shift: {shift_time}")
+        lines.append(f"  {shift_type} Shift: {shift_time}")
     
-    print("\nDaily breakdown with this pattern:")
+    lines.append("\nDaily breakdown with this pattern:")
     for day_stat in optimal_pattern['daily_stats']:
-        print(f"\n{day_stat['day']}: {day_stat['agents']} agents, {day_stat['hours']} agent hours, {day_stat['utilization']}% utilization")
+        lines.append(f"\n{day_stat['day']}: {day_stat['agents']} agents, {day_stat['hours']} agent hours, {day_stat['utilization']}% utilization")
         for i, shift in enumerate(day_stat['shifts']):
             shift_names = ["First", "Second", "Third", "Fourth", "Fifth"]
             shift_type = shift_names[i] if i < len(shift_names) else f"Shift {i+1}"
-            start_time = f"{shift['start_hour']:02d}:00"
-            end_time = f"{shift['end_hour']:02d}:00"
+            start_time = shift['start_time']
+            end_time = shift['end_time']
             agents = shift['agents_needed']
             agent_hours = shift['agent_hours']
-            print(f"  {shift_type} Shift ({start_time}-{end_time}): {agents} agents, {agent_hours} agent hours")
+            lines.append(f"  {shift_type} Shift ({start_time}-{end_time}): {agents} agents, {agent_hours} agent hours")
+    return "\n".join(lines)
 
 
 def visualize_pattern_comparison(weekly_pattern_stats):
@@ -95,27 +108,30 @@ def visualize_pattern_comparison(weekly_pattern_stats):
     patterns = [p['pattern_number'] for p in weekly_pattern_stats]
     agent_hours = [p['total_weekly_hours'] for p in weekly_pattern_stats]
     
-    plt.figure(figsize=(12, 6))
-    bars = plt.bar(patterns, agent_hours, color='skyblue')
+    # Drawn on a bare Figure (Agg canvas), see erlang_staffing.visualize_staffing_needs
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(12, 6))
+    axes = figure.subplots()
+    bars = axes.bar(patterns, agent_hours, color='skyblue')
     
     # Highlight the optimal pattern
     optimal_idx = agent_hours.index(min(agent_hours))
     bars[optimal_idx].set_color('green')
     
-    plt.xlabel('Pattern Number')
-    plt.ylabel('Total Weekly Agent Hours')
-    plt.title('Comparison of Weekly Resource Requirements by Pattern')
-    plt.xticks(patterns)
+    axes.set_xlabel('Pattern Number')
+    axes.set_ylabel('Total Weekly Agent Hours')
+    axes.set_title('Comparison of Weekly Resource Requirements by Pattern')
+    axes.set_xticks(patterns)
     
     # Add value labels on top of each bar
     for i, bar in enumerate(bars):
-        plt.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 50,
-                f'{agent_hours[i]}',
-                ha='center', va='bottom')
+        axes.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 50,
+                  f'{agent_hours[i]}',
+                  ha='center', va='bottom')
     
-    plt.savefig('pattern_comparison.png')
-    plt.close()
-    print("\nPattern comparison chart saved as 'pattern_comparison.png'")
+    figure.savefig('pattern_comparison.png')
+    get_reporter().message("\nPattern comparison chart saved as 'pattern_comparison.png'")
 
 
 if __name__ == "__main__":
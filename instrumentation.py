@@ -0,0 +1,200 @@
+import cProfile
+import json
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_TOP_FUNCTIONS = 15  # Functions listed per profiled stage in reports
+
+
+class Instrumentation:
+    """
+    Timing, profiling and memory spans around the stages of a run
+
+    Every `with instrumentation.stage(name):` block records its wall and CPU time.
+    Blocks can be nested; a stage entered several times is aggregated under the
+    same path. With profile=True each stage also runs under cProfile (nested stages
+    get their own profile and are left out of their parent's), and with
+    trace_memory=True tracemalloc records the peak and net memory of each stage.
+
+    The spans can be printed as a table, saved as JSON, or saved as collapsed stacks
+    ("main;stage;function microseconds" per line) for flame graph tools such as
+    flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, enabled=True, profile=False, trace_memory=False):
+        """
+        Parameters:
+        enabled (bool): Record spans at all; False makes stage() a no-op (default: True)
+        profile (bool): Run each stage under cProfile (default: False)
+        trace_memory (bool): Record peak and net memory per stage with tracemalloc (default: False)
+        """
+        self.enabled = enabled
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.spans = {}  # path tuple -> aggregated span record
+        self._stack = []  # Open spans: dicts with the path, profiler and memory peak so far
+        self._started_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Record a span around a block of code
+
+        Parameters:
+        name (str): Name of the stage; nested stages are recorded as parent;child
+        """
+        if not self.enabled:
+            yield
+            return
+
+        path = (self._stack[-1]['path'] if self._stack else ()) + (name,)
+        frame = {'path': path, 'profiler': None, 'peak': 0}
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak is reset for this stage, so open stages keep the peak seen so far
+            for open_frame in self._stack:
+                open_frame['peak'] = max(open_frame['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['memory_start'] = current
+
+        if self.profile:
+            # Only one profiler can collect at a time: pause the parent stage's
+            if self._stack and self._stack[-1]['profiler'] is not None:
+                self._stack[-1]['profiler'].disable()
+            frame['profiler'] = cProfile.Profile()
+            frame['profiler'].enable()
+
+        # Created on entry so the report lists stages in the order they started
+        record = self.spans.setdefault(path, {
+            'path': list(path), 'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+        self._stack.append(frame)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            self._stack.pop()
+
+            record['calls'] += 1
+            record['wall_seconds'] += wall
+            record['cpu_seconds'] += cpu
+
+            if frame['profiler'] is not None:
+                frame['profiler'].disable()
+                self._add_profile(record, frame['profiler'])
+                if self._stack and self._stack[-1]['profiler'] is not None:
+                    self._stack[-1]['profiler'].enable()
+
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(frame['peak'], peak)
+                record['peak_memory_bytes'] = max(record.get('peak_memory_bytes', 0), peak)
+                record['net_memory_bytes'] = (record.get('net_memory_bytes', 0)
+                                              + current - frame['memory_start'])
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+                elif self._started_tracemalloc:
+                    tracemalloc.stop()
+                    self._started_tracemalloc = False
+
+    @staticmethod
+    def _add_profile(record, profiler):
+        """Fold a stage's cProfile statistics into its span record"""
+        stats = pstats.Stats(profiler)
+        record['function_calls'] = record.get('function_calls', 0) + stats.total_calls
+        functions = record.setdefault('functions', {})
+        for (filename, line, function), (_, calls, own_time, cumulative_time, _) in stats.stats.items():
+            key = f"{filename}:{line}({function})"
+            entry = functions.setdefault(key, {'calls': 0, 'own_seconds': 0.0, 'cumulative_seconds': 0.0})
+            entry['calls'] += calls
+            entry['own_seconds'] += own_time
+            entry['cumulative_seconds'] += cumulative_time
+
+    def report(self):
+        """
+        Span records in the order the stages were first entered
+
+        Returns:
+        list: One dict per stage path with 'path', 'calls', 'wall_seconds', 'cpu_seconds'
+              and, when captured, 'peak_memory_bytes', 'net_memory_bytes',
+              'function_calls' and the slowest 'functions'
+        """
+        records = []
+        for record in self.spans.values():
+            record = dict(record)
+            if 'functions' in record:
+                slowest = sorted(record['functions'].items(),
+                                 key=lambda item: item[1]['own_seconds'], reverse=True)
+                record['functions'] = [dict(entry, function=key)
+                                       for key, entry in slowest[:PROFILE_TOP_FUNCTIONS]]
+            records.append(record)
+        return records
+
+    def format_report(self):
+        """
+        Human-readable table of the spans
+
+        Returns:
+        str: One line per stage with wall and CPU time, entries, function calls and memory
+        """
+        lines = [f"{'Stage':<40} {'Wall (s)':>9} {'CPU (s)':>9} {'Entries':>8} "
+                 f"{'Func calls':>11} {'Peak MiB':>9} {'Net MiB':>8}"]
+        for record in self.spans.values():
+            name = "  " * (len(record['path']) - 1) + record['path'][-1]
+            function_calls = str(record.get('function_calls', '-'))
+            peak = (f"{record['peak_memory_bytes'] / 2**20:.1f}"
+                    if 'peak_memory_bytes' in record else '-')
+            net = (f"{record['net_memory_bytes'] / 2**20:.1f}"
+                   if 'net_memory_bytes' in record else '-')
+            lines.append(
+                f"{name:<40} {record['wall_seconds']:9.3f} {record['cpu_seconds']:9.3f} "
+                f"{record['calls']:8d} {function_calls:>11} {peak:>9} {net:>8}")
+        return "\n".join(lines)
+
+    def save_json(self, path):
+        """Write the span records to a JSON file"""
+        with open(path, 'w') as file:
+            json.dump({'profile': self.profile, 'trace_memory': self.trace_memory,
+                       'stages': self.report()}, file, indent=2)
+
+    def collapsed_stacks(self):
+        """
+        Spans as collapsed stacks for flame graph tools
+
+        Each line is "stage;substage;... microseconds" with the time spent in the
+        stage itself (not in its recorded substages). For profiled stages, that time
+        is split over the stage's functions by their own time.
+
+        Returns:
+        list: Lines in the collapsed stack format
+        """
+        lines = []
+        for path, record in self.spans.items():
+            children = sum(child['wall_seconds'] for child_path, child in self.spans.items()
+                           if child_path[:-1] == path)
+            own = max(record['wall_seconds'] - children, 0.0)
+            stack = ";".join(part.replace(";", ",") for part in path)
+
+            functions = record.get('functions', {})
+            profiled = sum(entry['own_seconds'] for entry in functions.values())
+            if profiled > 0:
+                for function, entry in functions.items():
+                    microseconds = round(own * entry['own_seconds'] / profiled * 1e6)
+                    if microseconds > 0:
+                        lines.append(f"{stack};{function.replace(';', ',')} {microseconds}")
+            elif round(own * 1e6) > 0:
+                lines.append(f"{stack} {round(own * 1e6)}")
+        return lines
+
+    def save_collapsed(self, path):
+        """Write the spans as collapsed stacks (see collapsed_stacks) for flame graph tools"""
+        with open(path, 'w') as file:
+            file.write("\n".join(self.collapsed_stacks()) + "\n")
@@ -1,65 +1,131 @@
 import erlang_staffing
 import shift_optimizer
-import matplotlib.pyplot as plt
-import pandas as pd
-import os
-from create_excel_report import create_excel_report
-from erlang_staffing import SHIFT_HOURS
-from ideal_shift import find_ideal_shift_pattern, display_ideal_shift_pattern
-from simulation import simulate_staffing_plan
-from shift_simulation import simulate_ideal_pattern
-
-
-def main():
-    # Calculate staffing needs
-    print("Calculating staffing needs based on Erlang C formula...")
-    staffing_needs = erlang_staffing.calculate_hourly_staffing_needs()
-
-    # Print staffing needs
-    for day in erlang_staffing.DAYS_OF_WEEK:
-        print(f"\n{day} staffing needs:")
-        for hour, staff in enumerate(staffing_needs[day]):
-            print(f"  Hour {hour}: {staff} staff needed")
-
-    erlang_staffing.visualize_staffing_needs(staffing_needs)
-
-    # Generate all possible shift patterns
-    print(
-        f"\nGenerating the {erlang_staffing.SHIFT_HOURS} distinct shift patterns...")
-    all_patterns = shift_optimizer.generate_shift_patterns()
-    print(f"\nGenerated {len(all_patterns)} shift patterns:")
-    for pattern in all_patterns:
-        print(f"  Pattern {pattern['pattern_number']}:")
-        for i, shift in enumerate(pattern['shifts']):
-            shift_names = ["First", "Second", "Third",
-                           "Fourth", "Fifth", "Sixth", "Seventh", "Eighth"]
-            shift_type = shift_names[i] if i < len(
-                shift_names) else f"Shift {i+1}"
-            start_time = f"{shift['start_hour']:02d}:00"
-            end_time = f"{shift['end_hour']:02d}:00"
-            # Analyze all shift patterns for each day
-            print(f"    {shift_type} Shift: {start_time}-{end_time}")
-    print("\nAnalyzing staffing needs for each shift pattern and day:")
-    for day in erlang_staffing.DAYS_OF_WEEK:
-        print(f"\n{day} - Staffing needs by pattern:")
-        for pattern in all_patterns:
-            evaluated_pattern = shift_optimizer.evaluate_shift_pattern(
-                pattern, staffing_needs[day])
-            total_agents = evaluated_pattern['total_agents']
-            total_agent_hours = evaluated_pattern['total_agent_hours']
-            print(
-                f"  Pattern {pattern['pattern_number']}: Total {total_agents} agents needed, {total_agent_hours} agent hours")
-            for i, shift in enumerate(evaluated_pattern['shifts']):
-                shift_names = ["First", "Second", "Third",
-                               "Fourth", "Fifth", "Sixth", "Seventh", "Eighth"]
-                shift_type = shift_names[i] if i < len(
-                    shift_names) else f"Shift {i+1}"
-                start_time = f"{shift['start_hour']:02d}:00"
-                end_time = f"{shift['end_hour']:02d}:00"
-                agents = shift['agents_needed']
-                agent_hours = shift['agent_hours']
-                print(
-                    f"    {shift_type} Shift ({start_time}-{end_time}): {agents} agents, {agent_hours} agent hours")
+from instrumentation import Instrumentation
+from pipeline import StaffingPipeline
+from erlang_staffing import SHIFT_HOURS, INTERVAL_MINUTES
+from ideal_shift import display_ideal_shift_pattern
+from output import DETAIL, SUMMARY, get_reporter, text_format, use_reporter
+
+
+def main(instrumentation=None, arrival_rates=None, interval_minutes=INTERVAL_MINUTES, pipeline=None,
+         reporter=None):
+    """
+    Run the whole staffing pipeline and print where the time went
+
+    Parameters:
+    instrumentation (Instrumentation): Records a span per stage; pass one created with
+                                       profile=True or trace_memory=True for cProfile and
+                                       memory figures, or to export the spans afterwards
+                                       (default: None, timing only)
+    arrival_rates (dict): Calls per day and hour, e.g. one site's week from
+                          forecast_data.load_forecast(...).arrival_rates(site)
+                          (default: None, erlang_staffing.arrival_rate_urgent)
+    interval_minutes (int): Length of the staffing intervals, e.g. 15 for shift starts and
+                            staffing every quarter of an hour (default: INTERVAL_MINUTES)
+    pipeline (StaffingPipeline): Pipeline to run, to read its results afterwards or to set
+                                 its other inputs; arrival_rates and interval_minutes are
+                                 then taken from it (default: None, a new pipeline)
+    reporter (output.Reporter): Where progress and results go, e.g. Reporter('summary',
+                                ndjson='run.ndjson') for summaries on screen and every
+                                record as NDJSON (default: None, output.get_reporter(),
+                                which prints everything)
+
+    Returns:
+    Instrumentation: The spans recorded for this run
+    """
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    if pipeline is None:
+        pipeline = StaffingPipeline(arrival_rates=arrival_rates, interval_minutes=interval_minutes)
+    interval_minutes = pipeline.inputs['interval_minutes']
+    if reporter is None:
+        reporter = get_reporter()
+
+    with use_reporter(reporter):
+        _run(pipeline, instrumentation, reporter, interval_minutes)
+    return instrumentation
+
+
+@text_format('staffing_interval')
+def _format_staffing_interval(record):
+    if record['interval_minutes'] == erlang_staffing.MINUTES_PER_HOUR:
+        return f"  Hour {record['interval']}: {record['staff']} staff needed"
+    return f"  {record['time']}: {record['staff']} staff needed"
+
+
+@text_format('shift_pattern')
+def _format_shift_pattern(record):
+    lines = [f"  Pattern {record['pattern_number']}:"]
+    for i, shift in enumerate(record['shifts']):
+        shift_names = ["First", "Second", "Third",
+                       "Fourth", "Fifth", "Sixth", "Seventh", "Eighth"]
+        shift_type = shift_names[i] if i < len(
+            shift_names) else f"Shift {i+1}"
+        lines.append(f"    {shift_type} Shift: {shift['start_time']}-{shift['end_time']}")
+    return "\n".join(lines)
+
+
+@text_format('pattern_day')
+def _format_pattern_day(record):
+    lines = [f"  Pattern {record['pattern_number']}: Total {record['total_agents']} agents needed, "
+             f"{record['total_agent_hours']} agent hours"]
+    for i, shift in enumerate(record['shifts']):
+        shift_names = ["First", "Second", "Third",
+                       "Fourth", "Fifth", "Sixth", "Seventh", "Eighth"]
+        shift_type = shift_names[i] if i < len(
+            shift_names) else f"Shift {i+1}"
+        start_time = shift['start_time']
+        end_time = shift['end_time']
+        agents = shift['agents_needed']
+        agent_hours = shift['agent_hours']
+        lines.append(
+            f"    {shift_type} Shift ({start_time}-{end_time}): {agents} agents, {agent_hours} agent hours")
+    return "\n".join(lines)
+
+
+def _run(pipeline, instrumentation, reporter, interval_minutes):
+    """The stages of main(), reporting to reporter"""
+    with instrumentation.stage('staffing'):
+        # Calculate staffing needs
+        reporter.message("Calculating staffing needs based on Erlang C formula...")
+        staffing_needs = pipeline.staffing_needs
+
+        # Report staffing needs
+        if reporter.enabled(DETAIL):
+            for day in erlang_staffing.DAYS_OF_WEEK:
+                reporter.message(f"\n{day} staffing needs:", DETAIL)
+                for hour, staff in enumerate(staffing_needs[day]):
+                    reporter.emit('staffing_interval', DETAIL, day=day, interval=hour,
+                                  time=erlang_staffing.period_label(hour, interval_minutes),
+                                  interval_minutes=interval_minutes, staff=staff)
+
+    with instrumentation.stage('visualize_staffing'):
+        erlang_staffing.visualize_staffing_needs(staffing_needs)
+
+    with instrumentation.stage('shift_patterns'):
+        # Generate all possible shift patterns
+        reporter.message(
+            f"\nGenerating the {erlang_staffing.SHIFT_HOURS} distinct shift patterns...")
+        all_patterns = pipeline.patterns
+        reporter.message(f"\nGenerated {len(all_patterns)} shift patterns:")
+        if reporter.enabled(DETAIL):
+            for pattern in all_patterns:
+                reporter.emit('shift_pattern', DETAIL, pattern_number=pattern['pattern_number'],
+                              shifts=[{'start_time': shift['start_time'], 'end_time': shift['end_time']}
+                                      for shift in pattern['shifts']])
+
+    with instrumentation.stage('pattern_analysis'):
+        # Every pattern is evaluated for every day once; the ideal pattern and the report reuse it
+        pattern_evaluation = pipeline.pattern_evaluation
+        # Analyze all shift patterns for each day; the per-day dicts are only built to be reported
+        if reporter.enabled(DETAIL):
+            reporter.message("\nAnalyzing staffing needs for each shift pattern and day:", DETAIL)
+            for day_index, day in enumerate(erlang_staffing.DAYS_OF_WEEK):
+                reporter.message(f"\n{day} - Staffing needs by pattern:", DETAIL)
+                for pattern_index in range(len(all_patterns)):
+                    evaluated_pattern = shift_optimizer.evaluated_pattern_for_day(
+                        all_patterns, pattern_evaluation, pattern_index, day_index)
+                    reporter.emit('pattern_day', DETAIL, day=day, **evaluated_pattern)
 
     # # Find optimal shift pattern for each day
     # print("\nFinding optimal shift pattern for each day...")
@@ -90,23 +156,29 @@ def main():
     #         print(
     #             f"  {shift_type} Shift ({start_time}-{end_time}): {agents} agents, {agent_hours} agent hours")
 
-    print("\n=== ANALYZING IDEAL PATTERN FOR CONSISTENT WEEKLY SCHEDULING ===")
-    ideal_pattern = find_ideal_shift_pattern(staffing_needs)
-    display_ideal_shift_pattern(ideal_pattern)
+    with instrumentation.stage('ideal_pattern'):
+        reporter.message("\n=== ANALYZING IDEAL PATTERN FOR CONSISTENT WEEKLY SCHEDULING ===")
+        ideal_pattern = pipeline.ideal_pattern
+        display_ideal_shift_pattern(ideal_pattern)
 
-    # Run simulation to validate staffing needs
-    print("\n=== RUNNING SIMULATION TO VALIDATE STAFFING NEEDS ===")
-    simulate_staffing_plan(staffing_needs)
+    with instrumentation.stage('hourly_simulation'):
+        # Run simulation to validate staffing needs
+        reporter.message("\n=== RUNNING SIMULATION TO VALIDATE STAFFING NEEDS ===")
+        pipeline.get('staffing_simulation')
 
-    from shift_simulation import simulate_ideal_pattern
+    with instrumentation.stage('shift_simulation'):
+        # Add after finding the ideal pattern
+        reporter.message("\n=== SIMULATING IDEAL PATTERN PERFORMANCE ===")
+        pipeline.get('pattern_simulation')
 
-    # Add after finding the ideal pattern
-    print("\n=== SIMULATING IDEAL PATTERN PERFORMANCE ===")
-    simulate_ideal_pattern(ideal_pattern)
+    with instrumentation.stage('excel_report'):
+        # Create Excel report
+        pipeline.write_report()
+    reporter.message("\nProcess completed. Excel report generated.")
 
-    # Create Excel report
-    create_excel_report(staffing_needs, ideal_pattern)
-    print("\nProcess completed. Excel report generated.")
+    reporter.message("\n=== STAGE TIMINGS ===")
+    reporter.message(instrumentation.format_report())
+    reporter.emit('stage_timings', SUMMARY, stages=instrumentation.report())
 
 
 if __name__ == "__main__":
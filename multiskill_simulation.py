@@ -0,0 +1,306 @@
+import heapq
+from collections import deque, namedtuple
+import numpy as np
+from erlang_staffing import arrival_rate_urgent, URGENT_TASK_WORK_MINUTES
+from fast_simulation import sample_calls
+from output import SUMMARY, get_reporter, text_format
+from rng_streams import interval_streams
+from wait_metrics import WaitHistogram, merge_wait_histograms
+
+TARGET_SLA = 20  # Target answer time in seconds for service level
+AVG_PATIENCE = 120  # Average caller patience in seconds (2 minutes)
+
+# A stream of calls with its own handling time and patience. arrival_rates holds the
+# number of calls in each hour of the run, like one day of arrival_rate_urgent.
+CallQueue = namedtuple('CallQueue', ['name', 'arrival_rates', 'service_time_seconds',
+                                     'avg_patience_seconds'])
+
+# A group of identical agents. skills maps each queue the group can answer to its
+# priority level for the group: an agent takes waiting calls from its level 0 queues
+# before level 1 and so on, and arriving calls go to the groups that have them at
+# the lowest level first (specialists before generalists).
+AgentGroup = namedtuple('AgentGroup', ['name', 'agents', 'skills'])
+
+
+def run_multiskill_queue(queues, groups, queue_ids, arrival_times, service_times,
+                         patience_times, horizon):
+    """
+    Simulate skill-based routing of several call queues to several agent groups
+
+    Calls are processed in arrival order together with the moments agents finish a
+    call. An arriving call goes to a free agent of the group with the best level for
+    its queue, or waits in its queue's FCFS line. An agent who finishes a call takes
+    the oldest waiting call of its best-level queues, skipping callers whose patience
+    has run out, or becomes free.
+
+    Both decisions are heap lookups, so each event costs O(log n) in the number of
+    groups and queues and does not depend on the number of agents:
+    - each queue keeps a heap of (level, group) for the groups with a free agent
+    - each group keeps a heap of (level, oldest arrival, queue) for its queues with
+      callers waiting
+    Entries are not removed when they go stale (a group's last free agent is taken,
+    a queue's first caller is answered by another group); they are checked and
+    dropped when they reach the top of the heap.
+
+    As in fast_simulation.run_queue, a caller abandons when their wait would exceed
+    their patience, and the clock stops at the horizon.
+
+    Parameters:
+    queues (list): CallQueue for each queue (only their number is used here)
+    groups (list): AgentGroup for each group; skills are keyed by queue name
+    queue_ids (numpy.ndarray): Queue index of each call
+    arrival_times (numpy.ndarray): Sorted arrival times in seconds
+    service_times (numpy.ndarray): Service time of each call in seconds
+    patience_times (numpy.ndarray): Patience of each caller in seconds
+    horizon (float): End of the simulation in seconds
+
+    Returns:
+    dict: Per-queue 'wait_metrics' (WaitHistogram list), 'calls_handled' and
+          'calls_abandoned' lists, per-group 'calls_handled' and 'busy_seconds' lists
+    """
+    queue_index = {queue.name: index for index, queue in enumerate(queues)}
+    for group in groups:
+        unknown = set(group.skills) - set(queue_index)
+        if unknown:
+            raise ValueError(f"Agent group {group.name} has skills for unknown queues: "
+                             f"{', '.join(sorted(unknown))}")
+        if group.agents < 0:
+            raise ValueError("agents can't be negative")
+
+    # Skill graph in both directions: (level, group) per queue, (level, queue) per group
+    queue_groups = [[] for _ in queues]
+    group_queues = [[] for _ in groups]
+    for g, group in enumerate(groups):
+        for name, level in group.skills.items():
+            queue_groups[queue_index[name]].append((level, g))
+            group_queues[g].append((level, queue_index[name]))
+
+    free = [group.agents for group in groups]
+    free_groups = [[(level, g) for level, g in candidates if free[g] > 0]
+                   for candidates in queue_groups]
+    for heap in free_groups:
+        heapq.heapify(heap)
+    in_free_heap = {(q, g) for q, heap in enumerate(free_groups) for _, g in heap}
+
+    waiting = [deque() for _ in queues]  # (arrival, patience, service) per queue, FCFS
+    head_stamp = [0] * len(queues)  # Bumped whenever a queue's first caller changes
+    waiting_heaps = [[] for _ in groups]
+
+    wait_metrics = [WaitHistogram(thresholds=(TARGET_SLA,)) for _ in queues]
+    queue_handled = [0] * len(queues)
+    queue_abandoned = [0] * len(queues)
+    group_handled = [0] * len(groups)
+    busy_seconds = [0.0] * len(groups)
+    completions = []  # (end time, group) of the calls in progress
+
+    def new_head(q):
+        """Tell the groups serving queue q about its (new) first caller"""
+        head_stamp[q] += 1
+        if waiting[q]:
+            arrival = waiting[q][0][0]
+            for level, g in queue_groups[q]:
+                heapq.heappush(waiting_heaps[g], (level, arrival, q, head_stamp[q]))
+
+    def answer(q, g, now, arrival, service):
+        """Start a call of queue q with an agent of group g"""
+        wait_metrics[q].add(now - arrival)
+        queue_handled[q] += 1
+        group_handled[g] += 1
+        busy_seconds[g] += min(now + service, horizon) - now
+        heapq.heappush(completions, (now + service, g))
+
+    def agent_finished(g, now):
+        """An agent of group g is free at `now`: take the best waiting call or go idle"""
+        heap = waiting_heaps[g]
+        while heap:
+            level, arrival, q, stamp = heap[0]
+            if stamp != head_stamp[q]:
+                heapq.heappop(heap)
+                continue
+            first_arrival, patience, service = waiting[q][0]
+            waiting[q].popleft()
+            new_head(q)
+            if now - first_arrival > patience:
+                # Hung up while waiting; counted when their patience ran out
+                if first_arrival + patience < horizon:
+                    queue_abandoned[q] += 1
+                continue
+            answer(q, g, now, first_arrival, service)
+            return
+
+        free[g] += 1
+        if free[g] == 1:
+            for level, q in group_queues[g]:
+                if (q, g) not in in_free_heap:
+                    in_free_heap.add((q, g))
+                    heapq.heappush(free_groups[q], (level, g))
+
+    for q, arrival, service, patience in zip(queue_ids.tolist(), arrival_times.tolist(),
+                                             service_times.tolist(), patience_times.tolist()):
+        while completions and completions[0][0] <= arrival:
+            end, g = heapq.heappop(completions)
+            agent_finished(g, end)
+
+        heap = free_groups[q]
+        while heap and free[heap[0][1]] == 0:
+            _, g = heapq.heappop(heap)
+            in_free_heap.discard((q, g))
+        if heap:
+            g = heap[0][1]
+            free[g] -= 1
+            answer(q, g, arrival, arrival, service)
+        else:
+            waiting[q].append((arrival, patience, service))
+            if len(waiting[q]) == 1:
+                new_head(q)
+
+    # Calls still in progress may free agents for waiting callers before the horizon
+    while completions and completions[0][0] < horizon:
+        end, g = heapq.heappop(completions)
+        agent_finished(g, end)
+
+    # Callers left waiting abandoned if their patience ran out before the horizon
+    for q, line in enumerate(waiting):
+        queue_abandoned[q] += sum(1 for arrival, patience, _ in line if arrival + patience < horizon)
+
+    return {
+        'wait_metrics': wait_metrics,
+        'calls_handled': queue_handled,
+        'calls_abandoned': queue_abandoned,
+        'group_calls_handled': group_handled,
+        'busy_seconds': busy_seconds,
+    }
+
+
+def sample_multiskill_calls(queues, rng=None, seed=None):
+    """
+    Draw the calls of every queue and merge them in arrival order
+
+    Parameters:
+    queues (list): CallQueue for each queue
+    rng (numpy.random.Generator): Random generator shared by every queue
+                                  (default: None, the global numpy random state)
+    seed (int): Root seed for common random numbers; hour h of queue q then draws from
+                rng_streams.interval_streams(seed, q, h), whatever the other queues
+                (default: None, use rng)
+
+    Returns:
+    tuple: (queue_ids, arrival_times, service_times, patience_times) arrays
+    """
+    draws = []
+    for q, queue in enumerate(queues):
+        windows = [(hour * 3600, (hour + 1) * 3600, calls)
+                   for hour, calls in enumerate(queue.arrival_rates)]
+        streams = (rng if seed is None
+                   else [interval_streams(seed, q, hour) for hour in range(len(windows))])
+        arrivals, services, patience = sample_calls(streams, windows, queue.service_time_seconds,
+                                                    queue.avg_patience_seconds)
+        draws.append((np.full(arrivals.size, q, dtype=np.int64), arrivals, services, patience))
+
+    queue_ids, arrivals, services, patience = (np.concatenate(column) for column in zip(*draws))
+    order = np.argsort(arrivals, kind='stable')
+    return queue_ids[order], arrivals[order], services[order], patience[order]
+
+
+def run_multiskill_simulation(queues, groups, rng=None, seed=None):
+    """
+    Simulate several call queues served by agent groups with different skills
+
+    Parameters:
+    queues (list): CallQueue for each queue; every queue covers the same number of hours
+    groups (list): AgentGroup for each group of agents
+    rng (numpy.random.Generator): Random generator (default: None, the global numpy random state)
+    seed (int): Root seed for common random numbers keyed by queue and hour (default: None)
+
+    Returns:
+    dict: 'queues' with the results of each queue (calls, service level, waits and
+          their percentiles), 'groups' with the calls and utilization of each group,
+          and the totals over every queue
+    """
+    hours = {len(queue.arrival_rates) for queue in queues}
+    if len(hours) != 1:
+        raise ValueError("Every queue needs arrival rates for the same number of hours")
+    horizon = hours.pop() * 3600
+
+    queue_ids, arrivals, services, patience = sample_multiskill_calls(queues, rng, seed)
+    routed = run_multiskill_queue(queues, groups, queue_ids, arrivals, services, patience, horizon)
+    calls_arrived = np.bincount(queue_ids, minlength=len(queues))
+
+    queue_results = {}
+    for q, queue in enumerate(queues):
+        metrics = routed['wait_metrics'][q]
+        queue_results[queue.name] = {
+            "calls_arrived": int(calls_arrived[q]),
+            "calls_handled": routed['calls_handled'][q],
+            "calls_abandoned": routed['calls_abandoned'][q],
+            "calls_expected": sum(queue.arrival_rates),
+            "avg_wait": metrics.mean,
+            "max_wait": metrics.max,
+            "service_level": metrics.service_level(TARGET_SLA),
+            "wait_metrics": metrics,
+            **metrics.percentiles(),
+        }
+
+    group_results = {}
+    for g, group in enumerate(groups):
+        capacity = group.agents * horizon
+        group_results[group.name] = {
+            "agents": group.agents,
+            "calls_handled": routed['group_calls_handled'][g],
+            "utilization": routed['busy_seconds'][g] / capacity * 100 if capacity > 0 else 0.0,
+        }
+
+    wait_metrics = merge_wait_histograms(routed['wait_metrics'])
+    return {
+        "queues": queue_results,
+        "groups": group_results,
+        "calls_arrived": int(calls_arrived.sum()),
+        "calls_handled": sum(routed['calls_handled']),
+        "calls_abandoned": sum(routed['calls_abandoned']),
+        "avg_wait": wait_metrics.mean,
+        "max_wait": wait_metrics.max,
+        "service_level": wait_metrics.service_level(TARGET_SLA),
+        "wait_metrics": wait_metrics,
+        **wait_metrics.percentiles(),
+    }
+
+
+def display_multiskill_results(results):
+    """Report the results of run_multiskill_simulation as a 'multiskill_simulation' record"""
+    get_reporter().emit(
+        'multiskill_simulation', SUMMARY,
+        queues={name: {key: value for key, value in result.items() if key != 'wait_metrics'}
+                for name, result in results['queues'].items()},
+        **{key: value for key, value in results.items() if key not in ('queues', 'wait_metrics')})
+
+
+@text_format('multiskill_simulation')
+def _format_results(results):
+    lines = ["\n=== MULTI-SKILL SIMULATION ==="]
+    for name, result in results['queues'].items():
+        lines.append(f"  {name}: {result['calls_arrived']} calls, {result['calls_handled']} handled, "
+                     f"{result['calls_abandoned']} abandoned, {result['avg_wait']:.1f}s avg wait, "
+                     f"{result['service_level']:.1f}% service level, P90 wait {result['wait_p90']:.1f}s")
+    for name, result in results['groups'].items():
+        lines.append(f"  {name}: {result['agents']} agents, {result['calls_handled']} calls, "
+                     f"{result['utilization']:.1f}% utilization")
+    lines.append(f"  Total: {results['calls_arrived']} calls, {results['calls_handled']} handled, "
+                 f"{results['calls_abandoned']} abandoned, {results['service_level']:.1f}% service level")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Monday's urgent calls with a standard queue twice as large and a callback queue
+    # of patient callers, served by specialists and by blended agents
+    urgent = arrival_rate_urgent["Monday"]
+    queues = [
+        CallQueue("urgent", urgent, URGENT_TASK_WORK_MINUTES * 60, AVG_PATIENCE),
+        CallQueue("standard", [2 * calls for calls in urgent], 4 * 60, 3 * AVG_PATIENCE),
+        CallQueue("callback", [calls // 2 for calls in urgent], 8 * 60, 30 * 60),
+    ]
+    groups = [
+        AgentGroup("urgent specialists", 45, {"urgent": 0}),
+        AgentGroup("standard agents", 60, {"standard": 0, "callback": 1}),
+        AgentGroup("blended agents", 40, {"urgent": 0, "standard": 1, "callback": 2}),
+    ]
+    display_multiskill_results(run_multiskill_simulation(queues, groups, seed=0))
@@ -0,0 +1,201 @@
+import json
+import math
+import sys
+from contextlib import contextmanager
+
+# Verbosity levels; every record and message has SUMMARY or DETAIL as its level
+QUIET = 0  # Nothing
+SUMMARY = 1  # Stage headings, day and week summaries, the ideal pattern and saved files
+DETAIL = 2  # Every interval, pattern and shift as well (the default)
+VERBOSITY_LEVELS = {'quiet': QUIET, 'summary': SUMMARY, 'detail': DETAIL}
+
+# Record type -> function returning the record as text, see text_format
+_text_formats = {}
+
+
+def text_format(record_type):
+    """
+    Register how the text renderer shows a record type
+
+    Used as a decorator on a function that takes the record dict and returns the
+    text to print. Records without a registered format only go to NDJSON.
+    """
+    def register(function):
+        _text_formats[record_type] = function
+        return function
+    return register
+
+
+def verbosity_level(verbosity):
+    """The level of a verbosity name ('quiet', 'summary', 'detail') or number"""
+    if isinstance(verbosity, str):
+        if verbosity not in VERBOSITY_LEVELS:
+            raise ValueError(f"Unknown verbosity: {verbosity}")
+        return VERBOSITY_LEVELS[verbosity]
+    return verbosity
+
+
+def _plain(value):
+    """A value as plain JSON types: NumPy scalars unwrapped, NaN and infinity as null"""
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if hasattr(value, 'item') and hasattr(value, 'dtype'):
+        value = value.item() if getattr(value, 'ndim', 0) == 0 else value.tolist()
+        return _plain(value)
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class TextRenderer:
+    """Prints records with their registered text format, and messages as they are"""
+
+    def __init__(self, verbosity=DETAIL, stream=None):
+        """
+        Parameters:
+        verbosity (int): Highest level printed (default: DETAIL)
+        stream (file): Where to print (default: None, sys.stdout at the time of printing,
+                       so contextlib.redirect_stdout applies)
+        """
+        self.verbosity = verbosity
+        self.stream = stream
+
+    def render(self, record, level):
+        if level > self.verbosity:
+            return
+        if record['type'] == 'message':
+            text = record['text']
+        elif record['type'] in _text_formats:
+            text = _text_formats[record['type']](record)
+        else:
+            return
+        print(text, file=self.stream)
+
+    def close(self):
+        pass
+
+
+class NdjsonRenderer:
+    """Writes every record as one line of JSON; messages are left out"""
+
+    def __init__(self, target, verbosity=DETAIL, context=None):
+        """
+        Parameters:
+        target (str or file): File path, '-' for stdout, or an open text file
+        verbosity (int): Highest level written (default: DETAIL)
+        context (dict): Fields added to every record, e.g. {'site': 'north'} (default: None)
+        """
+        self.verbosity = verbosity
+        self.context = context or {}
+        self._owned = isinstance(target, str) and target != '-'
+        if target == '-':
+            self.file = sys.stdout
+        elif self._owned:
+            self.file = open(target, 'w')
+        else:
+            self.file = target
+
+    def render(self, record, level):
+        if level > self.verbosity or record['type'] == 'message':
+            return
+        record = dict(self.context, **record) if self.context else record
+        self.file.write(json.dumps(_plain(record), separators=(',', ':')) + "\n")
+
+    def close(self):
+        if self._owned:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class Reporter:
+    """
+    Progress and results of a run, as records sent to one or more renderers
+
+    Code that used to print reports what it found with emit(record_type, level, **fields)
+    and its headings with message(text, level). The text renderer turns records back
+    into the familiar lines (see text_format); the NDJSON renderer writes one JSON object
+    per record, for schedulers and other programs. Each renderer has its own verbosity,
+    so e.g. the terminal can show summaries only while the NDJSON file gets every interval.
+
+    Loops that would build many DETAIL records check enabled(DETAIL) first, so a quiet
+    run skips the formatting entirely.
+    """
+
+    def __init__(self, verbosity=DETAIL, ndjson=None, ndjson_verbosity=DETAIL, context=None):
+        """
+        Parameters:
+        verbosity (int or str): Level of the printed text, a VERBOSITY_LEVELS name or value
+                                (default: DETAIL)
+        ndjson (str or file): Also write NDJSON records to this path, '-' for stdout (the
+                              text then goes to stderr) or an open file (default: None)
+        ndjson_verbosity (int or str): Level of the NDJSON records (default: DETAIL)
+        context (dict): Fields added to every NDJSON record (default: None)
+        """
+        self.renderers = []
+        verbosity = verbosity_level(verbosity)
+        if verbosity > QUIET:
+            self.renderers.append(TextRenderer(verbosity, sys.stderr if ndjson == '-' else None))
+        if ndjson is not None:
+            self.renderers.append(NdjsonRenderer(ndjson, verbosity_level(ndjson_verbosity), context))
+
+    def enabled(self, level):
+        """Whether any renderer takes records of this level"""
+        return any(level <= renderer.verbosity for renderer in self.renderers)
+
+    def emit(self, record_type, level=DETAIL, **fields):
+        """
+        Report a record
+
+        Parameters:
+        record_type (str): Kind of record, e.g. 'staffing_simulation_interval'
+        level (int): SUMMARY or DETAIL (default: DETAIL)
+        **fields: The record's data
+        """
+        record = {'type': record_type, **fields}
+        for renderer in self.renderers:
+            renderer.render(record, level)
+
+    def message(self, text, level=SUMMARY):
+        """Report a line of text for people, such as a heading; NDJSON leaves it out"""
+        record = {'type': 'message', 'text': text}
+        for renderer in self.renderers:
+            renderer.render(record, level)
+
+    def close(self):
+        for renderer in self.renderers:
+            renderer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# The reporter used by code that is not given one: everything is printed, as before
+_reporter = Reporter()
+
+
+def get_reporter():
+    """The reporter in use, see use_reporter"""
+    return _reporter
+
+
+@contextmanager
+def use_reporter(reporter):
+    """
+    Send all reporting inside the block to a reporter
+
+    Parameters:
+    reporter (Reporter): The reporter main, the simulators and the report writer use
+    """
+    global _reporter
+    previous = _reporter
+    _reporter = reporter
+    try:
+        yield reporter
+    finally:
+        _reporter = previous
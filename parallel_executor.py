@@ -0,0 +1,136 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from rng_streams import interval_streams, root_seed
+
+
+def resolve_workers(workers):
+    """
+    Turn a worker count setting into a number of processes
+
+    Parameters:
+    workers (int): Number of worker processes; 0 or a negative number means one per CPU core
+
+    Returns:
+    int: Number of worker processes to start (at least 1)
+    """
+    if workers is None or workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def spawn_seed_sequences(seed, count):
+    """
+    Create independent seed sequences, one per task
+
+    Parameters:
+    seed (int or numpy.random.SeedSequence): Root seed; None draws fresh entropy from the OS
+    count (int): Number of independent streams
+
+    Returns:
+    list: numpy.random.SeedSequence objects whose generators do not overlap
+    """
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return root.spawn(count)
+
+
+def _run_seeded_task(func, args, kwargs, seed_sequence):
+    """Run one task with its own random generator (module level so it can be pickled)"""
+    return func(*args, rng=np.random.default_rng(seed_sequence), **kwargs)
+
+
+def _run_keyed_task(func, args, kwargs, seed, key):
+    """Run one task with the common random number streams of its key (or list of keys)"""
+    if isinstance(key, list):
+        rng = [interval_streams(seed, *part) for part in key]
+    else:
+        rng = interval_streams(seed, *key)
+    return func(*args, rng=rng, **kwargs)
+
+
+def run_seeded_tasks(func, task_args, workers=None, seed=None, stream_keys=None, **kwargs):
+    """
+    Run independent tasks across a process pool, each with its own seeded random stream
+
+    Every task calls func(*args, rng=generator, **kwargs), where generator is a
+    numpy.random.Generator spawned from the root seed for that task. Results come
+    back in the order of task_args whatever the number of workers, so the same seed
+    always gives the same results.
+
+    With stream_keys, each task instead gets the common random number streams of its
+    key (rng_streams.interval_streams), so a task sees the same draws as any other task,
+    in this run or another, with the same seed and key.
+
+    Parameters:
+    func (callable): Module-level function accepting an rng keyword argument
+    task_args (list): One tuple of positional arguments per task
+    workers (int): Number of worker processes; 1 runs in this process, None uses every core
+    seed (int): Root seed for the task streams (default: None, fresh entropy)
+    stream_keys (list): One key per task, a tuple of ints or a list of such tuples for a
+                        task covering several hours (default: None, spawned streams)
+    **kwargs: Keyword arguments passed to every task
+
+    Returns:
+    list: Results of func, in the same order as task_args
+    """
+    task_args = [tuple(args) for args in task_args]
+    if stream_keys is None:
+        runner = _run_seeded_task
+        task_seeds = [spawn_seed_sequences(seed, len(task_args))]
+    else:
+        if len(stream_keys) != len(task_args):
+            raise ValueError("stream_keys needs one key per task")
+        # The root seed is fixed here so every worker derives the same streams
+        runner = _run_keyed_task
+        task_seeds = [[root_seed(seed)] * len(task_args), list(stream_keys)]
+    workers = min(resolve_workers(workers), max(len(task_args), 1))
+
+    if workers == 1:
+        return [runner(func, args, kwargs, *seeds)
+                for args, *seeds in zip(task_args, *task_seeds)]
+
+    # Send tasks in chunks so short simulations do not pay one round trip each
+    chunksize = max(1, len(task_args) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(runner,
+                                 [func] * len(task_args),
+                                 task_args,
+                                 [kwargs] * len(task_args),
+                                 *task_seeds,
+                                 chunksize=chunksize))
+
+
+def _run_task(func, args, kwargs):
+    """Run one task without a random stream (module level so it can be pickled)"""
+    return func(*args, **kwargs)
+
+
+def run_tasks(func, task_args, workers=None, **kwargs):
+    """
+    Run independent deterministic tasks across a process pool
+
+    Like run_seeded_tasks, but func(*args, **kwargs) is called without an rng, for
+    tasks that seed themselves or draw no random numbers at all.
+
+    Parameters:
+    func (callable): Module-level function
+    task_args (list): One tuple of positional arguments per task
+    workers (int): Number of worker processes; 1 runs in this process, None uses every core
+    **kwargs: Keyword arguments passed to every task
+
+    Returns:
+    list: Results of func, in the same order as task_args
+    """
+    task_args = [tuple(args) for args in task_args]
+    workers = min(resolve_workers(workers), max(len(task_args), 1))
+
+    if workers == 1:
+        return [_run_task(func, args, kwargs) for args in task_args]
+
+    chunksize = max(1, len(task_args) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_run_task,
+                                 [func] * len(task_args),
+                                 task_args,
+                                 [kwargs] * len(task_args),
+                                 chunksize=chunksize))
@@ -0,0 +1,283 @@
+import erlang_staffing
+import shift_optimizer
+from erlang_staffing import INTERVAL_MINUTES, SHIFT_HOURS
+from ideal_shift import find_ideal_shift_pattern
+
+# Inputs of a pipeline and their defaults
+PIPELINE_INPUTS = {
+    'arrival_rates': None,  # Calls per day and hour (or interval); None is arrival_rate_urgent
+    'interval_minutes': INTERVAL_MINUTES,
+    'solver': 'batch',  # Staffing solver, see calculate_hourly_staffing_needs
+    'cache': None,  # StaffingCache for the staffing solver
+    'shift_hours': SHIFT_HOURS,
+    'optimizer_mode': 'patterns',  # 'patterns' or 'ilp', see find_ideal_shift_pattern
+    'simulation_options': None,  # Keyword arguments for both simulators, e.g. {'engine': 'fast', 'seed': 7}
+}
+
+# Stage -> the inputs and stages it is computed from
+PIPELINE_STAGES = {
+    'staffing_needs': ('arrival_rates', 'interval_minutes', 'solver', 'cache'),
+    'staffing_matrix': ('staffing_needs',),
+    'patterns': ('shift_hours', 'interval_minutes'),
+    'pattern_evaluation': ('patterns', 'staffing_matrix'),
+    'ideal_pattern': ('staffing_needs', 'patterns', 'pattern_evaluation', 'optimizer_mode'),
+    'staffing_simulation': ('staffing_needs', 'arrival_rates', 'simulation_options'),
+    'pattern_simulation': ('ideal_pattern', 'arrival_rates', 'simulation_options'),
+}
+
+
+class StaffingPipeline:
+    """
+    The state of one staffing run, with every stage computed once and shared
+
+    Each stage (staffing needs, staffing matrix, shift patterns, their evaluation, the
+    ideal pattern and both simulations) is computed the first time it is read and
+    kept. Changing an input with update() drops only the stages that depend on it,
+    directly or through other stages (PIPELINE_STAGES), so e.g. a new shift length
+    re-evaluates the patterns but keeps the staffing needs.
+
+    main(), the report and the simulators all read from the same pipeline, so no
+    stage runs twice in a run. computations counts how often each stage was computed.
+
+    A re-forecast of part of the week goes through update_arrivals(), which updates the
+    computed stages cell by cell instead of dropping them; updates counts those updates.
+    """
+
+    def __init__(self, **inputs):
+        """
+        Parameters:
+        **inputs: Any of PIPELINE_INPUTS; the others keep their defaults
+        """
+        self._check_inputs(inputs)
+        self.inputs = dict(PIPELINE_INPUTS, **inputs)
+        self._results = {}
+        self.computations = {stage: 0 for stage in PIPELINE_STAGES}
+        self.updates = {stage: 0 for stage in PIPELINE_STAGES}
+
+    @staticmethod
+    def _check_inputs(inputs):
+        unknown = set(inputs) - set(PIPELINE_INPUTS)
+        if unknown:
+            raise ValueError(f"Unknown pipeline inputs: {', '.join(sorted(unknown))}")
+
+    def update(self, **inputs):
+        """
+        Change inputs and drop the stages that depend on them
+
+        An input set to the very same object it already holds is not a change.
+
+        Parameters:
+        **inputs: Any of PIPELINE_INPUTS
+        """
+        self._check_inputs(inputs)
+        changed = [name for name, value in inputs.items() if value is not self.inputs[name]]
+        self.inputs.update(inputs)
+        self.invalidate(*changed)
+
+    def update_arrivals(self, arrival_rates):
+        """
+        Change the forecast and update only what its changed (day, interval) cells affect
+
+        Of the stages already computed:
+        - the staffing needs are re-solved for the changed cells only,
+        - the staffing matrix and pattern evaluation are patched where the staffing
+          changed: only the shifts covering those cells are re-evaluated, and the daily
+          and weekly pattern totals move by the difference,
+        - the ideal pattern is picked again from the updated totals,
+        - the staffing simulation re-runs the intervals whose calls or staffing changed,
+          and the pattern simulation the shifts covering them, as long as the ideal
+          pattern keeps its shifts (otherwise it is dropped).
+        With simulation_options {'crn': True, 'seed': ...} the results are the same as
+        recomputing everything. Stages not computed yet, the 'simulation' staffing solver
+        and the 'ilp' optimizer mode fall back to update(arrival_rates=...).
+
+        Parameters:
+        arrival_rates (dict): The new forecast, calls per day and hour (or interval)
+
+        Returns:
+        numpy.ndarray: Boolean (7, intervals per day) mask of the cells whose calls changed
+        """
+        interval_minutes = self.inputs['interval_minutes']
+        previous = self.inputs['arrival_rates']
+        cells = erlang_staffing.changed_cells(previous, arrival_rates, interval_minutes)
+        calls = erlang_staffing.changed_cells(previous, arrival_rates, interval_minutes, whole_calls=True)
+        self.inputs['arrival_rates'] = arrival_rates
+        if self.inputs['solver'] == 'simulation' or not self.is_computed('staffing_needs'):
+            self.invalidate('arrival_rates')
+            return cells
+
+        old_needs = self._results['staffing_needs']
+        staffing_needs = erlang_staffing.update_staffing_needs(
+            old_needs, arrival_rates, cells, self.inputs['solver'], self.inputs['cache'],
+            interval_minutes)
+        staffing_matrix = shift_optimizer.build_staffing_matrix(staffing_needs)
+        staffed = staffing_matrix != shift_optimizer.build_staffing_matrix(old_needs)
+        self._replace('staffing_needs', staffing_needs)
+        if self.is_computed('staffing_matrix'):
+            self._replace('staffing_matrix', staffing_matrix)
+        if self.is_computed('pattern_evaluation'):
+            self._replace('pattern_evaluation', shift_optimizer.update_pattern_evaluation(
+                self._results['pattern_evaluation'], staffing_matrix, staffed))
+
+        old_pattern = self._results.get('ideal_pattern')
+        if old_pattern is not None:
+            if self.inputs['optimizer_mode'] == 'patterns' and self.is_computed('pattern_evaluation'):
+                self._replace('ideal_pattern', find_ideal_shift_pattern(
+                    staffing_needs, self.patterns, self.pattern_evaluation))
+            else:
+                self.invalidate('ideal_pattern')
+
+        options = self.inputs['simulation_options'] or {}
+        if self.is_computed('staffing_simulation'):
+            from simulation import update_staffing_simulation
+            self._replace('staffing_simulation', update_staffing_simulation(
+                self._results['staffing_simulation'], staffing_needs, calls | staffed,
+                arrival_rates=arrival_rates, **options))
+        if self.is_computed('pattern_simulation'):
+            if (self.is_computed('ideal_pattern') and
+                    self.ideal_pattern['shift_times'] == old_pattern['shift_times']):
+                from shift_simulation import update_pattern_simulation
+                self._replace('pattern_simulation', update_pattern_simulation(
+                    self._results['pattern_simulation'], self.ideal_pattern, calls,
+                    arrival_rates=arrival_rates, **options))
+            else:
+                self.invalidate('pattern_simulation')
+        return cells
+
+    def _replace(self, stage, result):
+        """Hold an updated result for a computed stage"""
+        self._results[stage] = result
+        self.updates[stage] += 1
+
+    def invalidate(self, *names):
+        """
+        Drop the stages computed from the given inputs or stages
+
+        Parameters:
+        *names: Input or stage names; named stages are dropped too
+        """
+        for stage in self.dependents(*names) | (set(names) & set(PIPELINE_STAGES)):
+            self._results.pop(stage, None)
+
+    @staticmethod
+    def dependents(*names):
+        """
+        Every stage computed, directly or through other stages, from the given names
+
+        Returns:
+        set: Stage names
+        """
+        found = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            for stage, sources in PIPELINE_STAGES.items():
+                if name in sources and stage not in found:
+                    found.add(stage)
+                    pending.append(stage)
+        return found
+
+    def is_computed(self, stage):
+        """Whether a stage is held, so reading it costs nothing"""
+        return stage in self._results
+
+    def get(self, stage):
+        """
+        The result of a stage, computed on first use
+
+        Parameters:
+        stage (str): One of PIPELINE_STAGES
+
+        Returns:
+        The stage's result
+        """
+        if stage not in PIPELINE_STAGES:
+            raise ValueError(f"Unknown pipeline stage: {stage}")
+        if stage not in self._results:
+            self._results[stage] = getattr(self, f'_compute_{stage}')()
+            self.computations[stage] += 1
+        return self._results[stage]
+
+    @property
+    def staffing_needs(self):
+        """dict: Required staff for each day and interval"""
+        return self.get('staffing_needs')
+
+    @property
+    def staffing_matrix(self):
+        """numpy.ndarray: The staffing needs as a (day, interval) array"""
+        return self.get('staffing_matrix')
+
+    @property
+    def patterns(self):
+        """list: Shift patterns for the shift length and interval length"""
+        return self.get('patterns')
+
+    @property
+    def pattern_evaluation(self):
+        """dict: evaluate_all_patterns of the patterns on the staffing matrix"""
+        return self.get('pattern_evaluation')
+
+    @property
+    def ideal_pattern(self):
+        """dict: The pattern used on every day of the week"""
+        return self.get('ideal_pattern')
+
+    @property
+    def staffing_simulation(self):
+        """list: simulate_staffing_plan results of the staffing needs"""
+        return self.get('staffing_simulation')
+
+    @property
+    def pattern_simulation(self):
+        """dict: simulate_ideal_pattern results of the ideal pattern"""
+        return self.get('pattern_simulation')
+
+    def _compute_staffing_needs(self):
+        return erlang_staffing.calculate_hourly_staffing_needs(
+            self.inputs['solver'], cache=self.inputs['cache'],
+            arrival_rates=self.inputs['arrival_rates'],
+            interval_minutes=self.inputs['interval_minutes'])
+
+    def _compute_staffing_matrix(self):
+        return shift_optimizer.build_staffing_matrix(self.staffing_needs)
+
+    def _compute_patterns(self):
+        return shift_optimizer.generate_shift_patterns(self.inputs['shift_hours'],
+                                                       self.inputs['interval_minutes'])
+
+    def _compute_pattern_evaluation(self):
+        return shift_optimizer.evaluate_all_patterns(self.patterns, self.staffing_matrix)
+
+    def _compute_ideal_pattern(self):
+        if self.inputs['optimizer_mode'] != 'patterns':
+            return find_ideal_shift_pattern(self.staffing_needs, mode=self.inputs['optimizer_mode'])
+        return find_ideal_shift_pattern(self.staffing_needs, self.patterns, self.pattern_evaluation)
+
+    def _compute_staffing_simulation(self):
+        # The simulators and the report writer are only imported by runs that use them
+        from simulation import simulate_staffing_plan
+        return simulate_staffing_plan(self.staffing_needs, arrival_rates=self.inputs['arrival_rates'],
+                                      **(self.inputs['simulation_options'] or {}))
+
+    def _compute_pattern_simulation(self):
+        from shift_simulation import simulate_ideal_pattern
+        return simulate_ideal_pattern(self.ideal_pattern, arrival_rates=self.inputs['arrival_rates'],
+                                      **(self.inputs['simulation_options'] or {}))
+
+    def write_report(self, excel_path='StaffingReport.xlsx', output_format='xlsx'):
+        """
+        Write the staffing report from the pipeline's results
+
+        Parameters:
+        excel_path (str): Workbook to write (default: 'StaffingReport.xlsx')
+        output_format (str): 'xlsx', 'csv' or 'parquet', see create_excel_report (default: 'xlsx')
+
+        Returns:
+        str: Path of the report
+        """
+        from create_excel_report import create_excel_report
+        return create_excel_report(self.staffing_needs, self.ideal_pattern, excel_path,
+                                   all_patterns=self.patterns,
+                                   pattern_evaluation=self.pattern_evaluation,
+                                   output_format=output_format)
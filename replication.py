@@ -0,0 +1,184 @@
+import math
+from functools import partial
+from statistics import NormalDist
+import numpy as np
+from rng_streams import is_common_streams, replication_streams
+from wait_metrics import WaitHistogram, merge_wait_histograms
+
+DEFAULT_CONFIDENCE = 0.95  # Confidence level of the reported intervals
+MIN_REPLICATIONS = 5  # Replications run before the stopping rule is checked
+MAX_REPLICATIONS = 200  # Upper limit on replications in sequential mode
+REPLICATED_METRICS = ('service_level', 'avg_wait', 'abandonment_rate')
+
+
+def t_critical(confidence, degrees_of_freedom):
+    """
+    Two-sided critical value of Student's t distribution
+
+    Exact for 1 to 4 degrees of freedom (closed forms, and for 3 a few Newton steps on
+    the closed-form distribution function) and the Cornish-Fisher expansion around the
+    normal quantile otherwise, which is within 0.0003 of the true value at 95% confidence
+    from 5 degrees of freedom (0.003 at 99%, under 0.001 from 7).
+
+    Parameters:
+    confidence (float): Confidence level, e.g. 0.95
+    degrees_of_freedom (int): Degrees of freedom (number of replications - 1)
+
+    Returns:
+    float: The critical value t such that P(|T| <= t) = confidence
+    """
+    p = 0.5 + confidence / 2
+    if degrees_of_freedom == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if degrees_of_freedom == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    if degrees_of_freedom == 4:
+        alpha = 4 * p * (1 - p)
+        q = math.cos(math.acos(math.sqrt(alpha)) / 3) / math.sqrt(alpha)
+        return math.copysign(2 * math.sqrt(q - 1), p - 0.5)
+
+    z = NormalDist().inv_cdf(p)
+    v = degrees_of_freedom
+    t = (z
+            + (z**3 + z) / (4 * v)
+            + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * v**2)
+            + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * v**3)
+            + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / (92160 * v**4))
+    if degrees_of_freedom == 3:
+        # Newton's method from the expansion, on F(t) = 1/2 + (x / (1 + x^2) + atan(x)) / pi, x = t / sqrt(3)
+        for _ in range(4):
+            x = t / math.sqrt(3)
+            cdf = 0.5 + (x / (1 + x * x) + math.atan(x)) / math.pi
+            density = 2 / (math.pi * math.sqrt(3) * (1 + x * x) ** 2)
+            t -= (cdf - p) / density
+    return t
+
+
+def confidence_interval(values, confidence=DEFAULT_CONFIDENCE):
+    """
+    Mean and confidence interval half-width of a sample
+
+    Parameters:
+    values (list): One observation per replication
+    confidence (float): Confidence level (default: 0.95)
+
+    Returns:
+    tuple: (mean, half_width); the half-width is infinite with fewer than 2 values
+    """
+    values = np.asarray(values, dtype=float)
+    mean = float(np.mean(values)) if values.size > 0 else 0.0
+    if values.size < 2:
+        return mean, math.inf
+
+    standard_error = float(np.std(values, ddof=1)) / math.sqrt(values.size)
+    return mean, t_critical(confidence, values.size - 1) * standard_error
+
+
+def seed_from_rng(rng):
+    """
+    Draw a root seed for replications from a generator
+
+    Parameters:
+    rng (numpy.random.Generator): Generator to draw from; None uses the global numpy random state
+
+    Returns:
+    int: Seed for numpy.random.SeedSequence
+    """
+    if rng is None or rng is np.random:
+        return int(np.random.randint(0, 2**31 - 1))
+    return int(rng.integers(0, 2**63 - 1))
+
+
+def run_replications(run_once, replications=MIN_REPLICATIONS, seed=None,
+                     confidence=DEFAULT_CONFIDENCE, target_half_width=None,
+                     max_replications=MAX_REPLICATIONS, stopping_metric='service_level'):
+    """
+    Run a simulation several times and summarize it with confidence intervals
+
+    With target_half_width set, replications continue one at a time after the first
+    ones until the confidence interval of stopping_metric is narrower than the target
+    (or max_replications is reached), so quiet intervals stop early and borderline
+    ones get more runs.
+
+    Parameters:
+    run_once (callable): Function taking an rng keyword and returning a result dict
+    replications (int): Number of replications, or the minimum in sequential mode (default: 5)
+    seed (int or numpy.random.SeedSequence): Root seed; every replication gets its own
+                                             spawned stream (default: None, fresh entropy).
+                                             Common random number streams (CallStreams or a
+                                             list of them) give replication r the same
+                                             draws in every configuration
+    confidence (float): Confidence level of the intervals (default: 0.95)
+    target_half_width (float): Stop once the half-width of stopping_metric is at most
+                               this value (default: None, run exactly `replications`)
+    max_replications (int): Upper limit in sequential mode (default: 200)
+    stopping_metric (str): Metric checked by the stopping rule (default: 'service_level')
+
+    Returns:
+    dict: The mean of every numeric result field, 'wait_metrics' merged over all
+          replications with the wait percentiles taken from it, 'wait_times' of all
+          replications (when the runs return them), 'replications', and for service level, average
+          wait and abandonment rate (% of arrived calls) the '<metric>_ci' interval and
+          '<metric>_half_width'
+    """
+    if is_common_streams(seed):
+        streams_for = partial(replication_streams, seed)
+    else:
+        root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        streams_for = lambda _: np.random.default_rng(root.spawn(1)[0])
+    minimum = max(1, replications) if target_half_width is None else max(2, replications)
+
+    results = []
+    while True:
+        result = dict(run_once(rng=streams_for(len(results))))
+        arrived = result.get('calls_arrived', 0)
+        result['abandonment_rate'] = result.get('calls_abandoned', 0) / arrived * 100 if arrived > 0 else 0
+        results.append(result)
+
+        if len(results) < minimum:
+            continue
+        if target_half_width is None or len(results) >= max_replications:
+            break
+        _, half_width = confidence_interval([r[stopping_metric] for r in results], confidence)
+        if half_width <= target_half_width:
+            break
+
+    summary = {}
+    for key, value in results[0].items():
+        if key == 'wait_times':
+            summary[key] = [wait for r in results for wait in r[key]]
+        elif isinstance(value, WaitHistogram):
+            summary[key] = merge_wait_histograms(r[key] for r in results)
+        elif isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            summary[key] = float(np.mean([r[key] for r in results]))
+        else:
+            summary[key] = value
+
+    if 'wait_metrics' in summary:
+        # Percentiles of the pooled waits rather than averages of per-run percentiles
+        summary.update(summary['wait_metrics'].percentiles())
+
+    for metric in REPLICATED_METRICS:
+        mean, half_width = confidence_interval([r[metric] for r in results], confidence)
+        summary[metric] = mean
+        summary[f'{metric}_half_width'] = half_width
+        summary[f'{metric}_ci'] = (mean - half_width, mean + half_width)
+
+    summary['replications'] = len(results)
+    summary['confidence'] = confidence
+    return summary
+
+
+def format_replications(result):
+    """
+    Describe the service level confidence interval of a replicated result for progress lines
+
+    Parameters:
+    result (dict): A simulation result, replicated or not
+
+    Returns:
+    str: e.g. " (+/- 1.2 over 12 runs)", or an empty string for a single run
+    """
+    if 'replications' not in result:
+        return ""
+    return f" (+/- {result['service_level_half_width']:.1f} over {result['replications']} runs)"
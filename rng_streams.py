@@ -0,0 +1,141 @@
+from collections import namedtuple
+import numpy as np
+
+# Separate random generators for the three kinds of draws a call needs. Keeping them
+# apart means a change in the number of calls does not shift the service or patience
+# draws of the other calls.
+CallStreams = namedtuple('CallStreams', ['arrivals', 'services', 'patience', 'seed_sequence'])
+
+
+def child_seed_sequence(seed_sequence, index):
+    """
+    The index-th child of a seed sequence, whatever has already been spawned from it
+
+    Parameters:
+    seed_sequence (numpy.random.SeedSequence): Parent seed sequence
+    index (int): Child number
+
+    Returns:
+    numpy.random.SeedSequence: The same child SeedSequence.spawn would give as its index-th
+    """
+    return np.random.SeedSequence(seed_sequence.entropy,
+                                  spawn_key=tuple(seed_sequence.spawn_key) + (index,),
+                                  pool_size=seed_sequence.pool_size)
+
+
+def call_streams(seed_sequence):
+    """
+    Build the arrival, service and patience generators for a seed sequence
+
+    Parameters:
+    seed_sequence (numpy.random.SeedSequence): Seed sequence of the run
+
+    Returns:
+    CallStreams: One generator per kind of draw, plus the seed sequence itself
+    """
+    arrivals, services, patience = (np.random.default_rng(child_seed_sequence(seed_sequence, index))
+                                    for index in range(3))
+    return CallStreams(arrivals, services, patience, seed_sequence)
+
+
+def interval_streams(seed, *key):
+    """
+    Common random numbers for one part of an experiment, identified by a key
+
+    The same seed and key always give the same draws, and different keys give
+    independent ones, whatever else is run and in whatever order. Keying by
+    (day index, hour) means every configuration simulated with the same seed sees
+    the same callers in each hour, so differences between staffing levels or shift
+    patterns are not hidden by random noise.
+
+    Parameters:
+    seed (int): Root seed of the experiment
+    *key (int): Identifies the streams, e.g. day index and hour
+
+    Returns:
+    CallStreams: Generators for this key
+    """
+    return call_streams(np.random.SeedSequence(seed, spawn_key=tuple(int(part) for part in key)))
+
+
+def is_common_streams(rng):
+    """
+    Whether an rng argument holds keyed common random number streams
+
+    Parameters:
+    rng: An rng argument of the simulators
+
+    Returns:
+    bool: True for CallStreams with a seed sequence, or a list of them (one per hour)
+    """
+    if isinstance(rng, list):
+        return len(rng) > 0 and all(is_common_streams(streams) for streams in rng)
+    return isinstance(rng, CallStreams) and rng.seed_sequence is not None
+
+
+def replication_streams(rng, replication):
+    """
+    The common random number streams of one replication
+
+    Replication r of every configuration gets the same draws, and each replication
+    gets different draws from the others.
+
+    Parameters:
+    rng (CallStreams or list): Common streams of the run (see is_common_streams)
+    replication (int): Replication number
+
+    Returns:
+    CallStreams or list: Streams of the same shape as rng for this replication
+    """
+    if isinstance(rng, list):
+        return [replication_streams(streams, replication) for streams in rng]
+    return call_streams(child_seed_sequence(rng.seed_sequence, replication))
+
+
+def as_call_streams(rng):
+    """
+    Accept any of the rng arguments the simulators take and return CallStreams
+
+    Parameters:
+    rng: None (the global numpy random state), a numpy.random.Generator (used for every
+         draw, in call order) or CallStreams
+
+    Returns:
+    CallStreams: Generators to draw arrivals, service times and patience from
+    """
+    if isinstance(rng, CallStreams):
+        return rng
+    if rng is None:
+        rng = np.random
+    return CallStreams(rng, rng, rng, None)
+
+
+def hourly_streams(rng, hours):
+    """
+    One CallStreams per hour of a multi-hour run
+
+    Parameters:
+    rng: Any rng argument accepted by as_call_streams, or a list of one per hour
+    hours (int): Number of hours in the run
+
+    Returns:
+    list: CallStreams for each hour; a single rng is shared by every hour
+    """
+    if isinstance(rng, list):
+        if len(rng) != hours:
+            raise ValueError(f"Expected random streams for {hours} hours, got {len(rng)}")
+        return [as_call_streams(streams) for streams in rng]
+    return [as_call_streams(rng)] * hours
+
+
+def root_seed(seed):
+    """
+    Turn a seed argument into an integer root seed for keyed streams
+
+    Parameters:
+    seed (int): Root seed, or None to draw fresh entropy from the OS
+
+    Returns:
+    int: The root seed to use
+    """
+    return np.random.SeedSequence(seed).entropy
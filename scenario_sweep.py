@@ -0,0 +1,262 @@
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import erlang_staffing
+import shift_optimizer
+from erlang_staffing import (arrival_rate_urgent, DAYS_OF_WEEK, URGENT_TASK_WORK_MINUTES, SLA,
+                             SHIFT_HOURS, INTERVAL_MINUTES, MINUTES_PER_HOUR,
+                             calculate_required_staff_batch, interval_arrival_rates)
+from ideal_shift import find_ideal_shift_pattern
+from output import QUIET, Reporter, use_reporter
+from parallel_executor import run_tasks
+from rng_streams import interval_streams
+from shift_simulation import AVG_PATIENCE, TARGET_SLA, run_shift_simulation
+from wait_metrics import merge_wait_histograms
+
+# Parameters a sweep can vary, with the values used when a grid leaves them out
+SWEEP_DEFAULTS = {
+    'URGENT_TASK_WORK_MINUTES': URGENT_TASK_WORK_MINUTES,
+    'SLA': SLA,
+    'SHIFT_HOURS': SHIFT_HOURS,
+    'AVG_PATIENCE': AVG_PATIENCE,
+    'INTERVAL_MINUTES': INTERVAL_MINUTES,
+    'solver': 'batch',  # 'batch' (Erlang C) or 'erlang_a', which also uses AVG_PATIENCE
+}
+SWEEP_SOLVERS = ('batch', 'erlang_a')
+SWEEP_CACHE_DIR = '.sweep_cache'  # Default on-disk cache of evaluated scenarios
+SWEEP_CACHE_VERSION = 2  # Bump when evaluate_scenario changes, so old cache entries are ignored
+
+
+def expand_grid(grid):
+    """
+    Turn a parameter grid into the list of scenarios it describes
+
+    Parameters:
+    grid (dict): Parameter name -> value or list of values, e.g.
+                 {'SLA': [0.8, 0.9], 'SHIFT_HOURS': [8, 12]}; parameters left out
+                 keep their SWEEP_DEFAULTS value
+
+    Returns:
+    list: One dict of every parameter per combination, in grid order
+    """
+    unknown = set(grid) - set(SWEEP_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(sorted(unknown))}")
+
+    values = {name: grid.get(name, default) for name, default in SWEEP_DEFAULTS.items()}
+    values = {name: np.asarray(value).tolist() if isinstance(value, np.ndarray)
+              else list(value) if isinstance(value, (list, tuple)) else [value]
+              for name, value in values.items()}
+    for solver in values['solver']:
+        if solver not in SWEEP_SOLVERS:
+            raise ValueError(f"Unknown sweep solver: {solver}")
+    for shift_hours in values['SHIFT_HOURS']:
+        if not 0 < shift_hours <= erlang_staffing.HOURS_PER_DAY:
+            raise ValueError("SHIFT_HOURS must be between 1 and 24")
+    for interval_minutes in values['INTERVAL_MINUTES']:
+        erlang_staffing.intervals_per_day(interval_minutes)
+
+    return [dict(zip(values, combination)) for combination in itertools.product(*values.values())]
+
+
+def forecast_fingerprint(arrival_rates=None):
+    """SHA-256 of the weekly forecast, so cached scenarios are tied to the data they used"""
+    if arrival_rates is None:
+        arrival_rates = arrival_rate_urgent
+    forecast = {day: [float(rate) for rate in arrival_rates[day]] for day in DAYS_OF_WEEK}
+    return hashlib.sha256(json.dumps(forecast, sort_keys=True).encode()).hexdigest()
+
+
+def scenario_key(params, simulate=False, seed=0, engine='fast', fingerprint=None):
+    """
+    Content address of a scenario: a hash of everything its result depends on
+
+    Parameters:
+    params (dict): Scenario parameters as returned by expand_grid
+    simulate (bool): Whether the scenario is simulated
+    seed (int): Root seed of the simulation
+    engine (str): Simulation engine
+    fingerprint (str): forecast_fingerprint of the arrival rates (default: the built-in forecast)
+
+    Returns:
+    str: Hex SHA-256 digest
+    """
+    content = {
+        'version': SWEEP_CACHE_VERSION,
+        'params': {name: params[name] for name in sorted(params)},
+        'simulate': bool(simulate),
+        'seed': seed if simulate else None,
+        'engine': engine if simulate else None,
+        'forecast': fingerprint if fingerprint is not None else forecast_fingerprint(),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=float).encode()).hexdigest()
+
+
+def _cache_path(cache_dir, key):
+    """Cache entries are spread over subdirectories by the first two characters of their key"""
+    return os.path.join(cache_dir, key[:2], f"{key}.json")
+
+
+def load_cached_scenario(cache_dir, key):
+    """Return the cached result row for a key, or None if it has not been evaluated"""
+    try:
+        with open(_cache_path(cache_dir, key)) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def store_cached_scenario(cache_dir, key, row):
+    """Write a result row to the cache; the file is replaced atomically so readers never see half of it"""
+    path = _cache_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(row, file)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def evaluate_scenario(params, simulate=False, seed=0, engine='fast', arrival_rates=None):
+    """
+    Evaluate one scenario: staffing, ideal shift pattern and optionally a simulation
+
+    The simulation runs every shift of the ideal pattern with common random numbers
+    keyed by day and interval (the keys simulate_ideal_pattern uses with crn=True), so
+    scenarios with the same seed see the same callers and differ only by their
+    parameters.
+
+    Parameters:
+    params (dict): Scenario parameters as returned by expand_grid
+    simulate (bool): Also simulate the ideal pattern (default: False)
+    seed (int): Root seed of the simulation (default: 0)
+    engine (str): Simulation engine passed to run_shift_simulation (default: 'fast')
+    arrival_rates (dict): Hourly arrival rates by day (default: arrival_rate_urgent)
+
+    Returns:
+    dict: A flat result row: the parameters followed by the scenario's metrics
+    """
+    if arrival_rates is None:
+        arrival_rates = arrival_rate_urgent
+    work_minutes = params['URGENT_TASK_WORK_MINUTES']
+    patience_seconds = params['AVG_PATIENCE']
+    interval_minutes = params['INTERVAL_MINUTES']
+    rates = interval_arrival_rates(arrival_rates, interval_minutes)
+
+    if params['solver'] == 'erlang_a':
+        from erlang_a import calculate_required_staff_erlang_a
+        staffing = calculate_required_staff_erlang_a(rates, work_minutes, patience_seconds / 60,
+                                                     params['SLA'], interval=interval_minutes)
+    else:
+        staffing = calculate_required_staff_batch(rates, work_minutes, params['SLA'],
+                                                  interval=interval_minutes)
+    staffing_needs = {day: staffing[day_index].tolist() for day_index, day in enumerate(DAYS_OF_WEEK)}
+
+    patterns = shift_optimizer.generate_shift_patterns(params['SHIFT_HOURS'], interval_minutes)
+    evaluation = shift_optimizer.evaluate_all_patterns(patterns, staffing)
+    # The pattern search reports its progress, which would interleave across scenarios
+    with use_reporter(Reporter(QUIET)):
+        ideal_pattern = find_ideal_shift_pattern(staffing_needs, patterns, evaluation)
+
+    row = dict(params)
+    row.update({
+        'weekly_staff_hours': float(staffing.sum() * interval_minutes / MINUTES_PER_HOUR),
+        'peak_staff': int(staffing.max()),
+        'pattern_number': ideal_pattern['pattern_number'],
+        'shift_times': ", ".join(ideal_pattern['shift_times']),
+        'total_weekly_agents': ideal_pattern['total_weekly_agents'],
+        'total_weekly_hours': ideal_pattern['total_weekly_hours'],
+        'avg_utilization': ideal_pattern['avg_utilization'],
+    })
+    if not simulate:
+        return row
+
+    calls = interval_arrival_rates(arrival_rates, interval_minutes, whole_calls=True)
+    shift_results = []
+    for day_stat in ideal_pattern['daily_stats']:
+        day_index = DAYS_OF_WEEK.index(day_stat['day'])
+        for shift in day_stat['shifts']:
+            periods = shift_optimizer.shift_periods(shift)
+            streams = [interval_streams(seed, day_index, period) for period in periods]
+            shift_results.append(run_shift_simulation(
+                shift['agents_needed'], [calls[day_index][period] for period in periods],
+                len(periods) * interval_minutes / MINUTES_PER_HOUR, work_minutes * 60,
+                patience_seconds, rng=streams, engine=engine,
+                interval_seconds=interval_minutes * 60))
+
+    wait_metrics = merge_wait_histograms(result['wait_metrics'] for result in shift_results)
+    calls_arrived = sum(result['calls_arrived'] for result in shift_results)
+    calls_abandoned = sum(result['calls_abandoned'] for result in shift_results)
+    row.update({
+        'calls_arrived': int(calls_arrived),
+        'calls_handled': int(sum(result['calls_handled'] for result in shift_results)),
+        'calls_abandoned': int(calls_abandoned),
+        'abandonment_rate': calls_abandoned / calls_arrived * 100 if calls_arrived > 0 else 0.0,
+        'service_level': float(wait_metrics.service_level(TARGET_SLA)),
+        'avg_wait': float(wait_metrics.mean),
+        'max_wait': float(wait_metrics.max),
+        **{name: float(value) for name, value in wait_metrics.percentiles().items()},
+    })
+    return row
+
+
+def run_sweep(grid, simulate=False, workers=None, cache_dir=SWEEP_CACHE_DIR, seed=0,
+              engine='fast', arrival_rates=None):
+    """
+    Evaluate every combination of a parameter grid and collect the results in one table
+
+    Scenarios are independent, so the ones not found in the cache are spread over a
+    process pool. Each result is stored under the hash of its parameters, settings
+    and forecast (scenario_key), so rerunning a sweep, or a larger grid that contains
+    it, only evaluates the new combinations.
+
+    Parameters:
+    grid (dict): Parameter name -> value or list of values, see expand_grid
+    simulate (bool): Also simulate each scenario's ideal pattern (default: False)
+    workers (int): Number of worker processes; 1 runs in this process, None uses every core
+    cache_dir (str): Directory of the content-addressed cache; None disables it
+                     (default: '.sweep_cache')
+    seed (int): Root seed of the simulations, shared by every scenario (default: 0)
+    engine (str): Simulation engine passed to run_shift_simulation (default: 'fast')
+    arrival_rates (dict): Hourly arrival rates by day (default: arrival_rate_urgent)
+
+    Returns:
+    pandas.DataFrame: One row per scenario, in grid order, with the parameters, the
+                      metrics of evaluate_scenario and whether the row came from the cache
+    """
+    scenarios = expand_grid(grid)
+    fingerprint = forecast_fingerprint(arrival_rates)
+    keys = [scenario_key(params, simulate, seed, engine, fingerprint) for params in scenarios]
+
+    rows = [None] * len(scenarios)
+    cached = [False] * len(scenarios)
+    if cache_dir is not None:
+        for index, key in enumerate(keys):
+            rows[index] = load_cached_scenario(cache_dir, key)
+            cached[index] = rows[index] is not None
+
+    missing = [index for index, row in enumerate(rows) if row is None]
+    results = run_tasks(evaluate_scenario, [(scenarios[index],) for index in missing],
+                        workers=workers, simulate=simulate, seed=seed, engine=engine,
+                        arrival_rates=arrival_rates)
+    for index, row in zip(missing, results):
+        rows[index] = row
+        if cache_dir is not None:
+            store_cached_scenario(cache_dir, keys[index], row)
+
+    table = pd.DataFrame(rows)
+    table['cached'] = cached
+    return table
+
+
+if __name__ == "__main__":
+    table = run_sweep({'URGENT_TASK_WORK_MINUTES': [5.5, 6.3, 7.0], 'SLA': [0.8, 0.9],
+                       'SHIFT_HOURS': [8, 12]})
+    print(table.to_string(index=False))
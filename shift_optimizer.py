@@ -1,56 +1,47 @@
-import matplotlib.pyplot as plt
+import math
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import erlang_staffing
-import copy
-from erlang_staffing import SHIFT_HOURS, SHIFT_PATTERN
+from erlang_staffing import SHIFT_HOURS, INTERVAL_MINUTES
 
 
-def generate_shift_patterns(shift_hours=SHIFT_HOURS):
+def generate_shift_patterns(shift_hours=SHIFT_HOURS, interval_minutes=INTERVAL_MINUTES):
     """
     Generate 8 distinct shift patterns, each consisting of three 8-hour shifts that cover a full day
 
     Parameters:
     shift_hours (int): Length of each shift in hours (default: 8)
+    interval_minutes (int): Length of a staffing interval in minutes; shifts may start at
+                            any interval (default: INTERVAL_MINUTES)
 
     Returns:
     list: List of shift patterns, where each pattern is a list of three shifts
 
     Each pattern starts at a different hour (0-7), and consists of three consecutive 8-hour shifts.
     For example, pattern 0 has shifts at 0:00-8:00, 8:00-16:00, and 16:00-0:00.
+    Other shift lengths work the same way: 12-hour shifts give 12 patterns of two shifts,
+    6-hour shifts 6 patterns of four, and so on. With shorter intervals the patterns
+    start at every interval instead of every hour: 15-minute intervals give 32
+    patterns of 8-hour shifts (0:00, 0:15, ... 7:45).
     """
     patterns = []
+    periods = erlang_staffing.intervals_per_day(interval_minutes)
+    shift_periods = shift_hours * erlang_staffing.MINUTES_PER_HOUR // interval_minutes
+    # Enough consecutive shifts to cover the whole day
+    shifts_per_pattern = math.ceil(erlang_staffing.HOURS_PER_DAY / shift_hours)
 
-    # We will consider 8 distinct patterns (starting at hours 0-7)
-    for pattern_start in range(SHIFT_HOURS):
+    # One pattern per start interval within the first shift (hours 0-7 for 8-hour shifts)
+    for pattern_start in range(shift_periods):
         pattern = []
 
-        # Each pattern has exactly 3 shifts of 8 hours each
-        for shift_index in range(SHIFT_PATTERN):
-            # Calculate the start hour for this shift
-            start_hour = (pattern_start + shift_index *
-                          shift_hours) % erlang_staffing.HOURS_PER_DAY
-
-            # Calculate the end hour, handling wrap-around to next day
-            end_hour = (
-                start_hour + shift_hours) % erlang_staffing.HOURS_PER_DAY
-
-            # Create a list of hours covered by this shift
-            hours_covered = []
-            current_hour = start_hour
-
-            # Add each hour in the shift to the hours_covered list
-            for _ in range(shift_hours):
-                hours_covered.append(current_hour)
-                current_hour = (
-                    current_hour + 1) % erlang_staffing.HOURS_PER_DAY
+        # Each pattern has consecutive shifts of shift_hours each
+        for shift_index in range(shifts_per_pattern):
+            # Calculate the start interval for this shift
+            start = (pattern_start + shift_index * shift_periods) % periods
 
             # Create a shift dictionary with all needed information
-            shift = {
-                'start_hour': start_hour,
-                'end_hour': end_hour,
-                'hours': hours_covered,
-                'shift_number': shift_index + 1  # 1, 2, or 3
-            }
+            shift = build_shift(start, shift_periods, periods)
+            shift['shift_number'] = shift_index + 1  # 1, 2, or 3
 
             # Add this shift to the pattern
             pattern.append(shift)
@@ -64,13 +55,70 @@ def generate_shift_patterns(shift_hours=SHIFT_HOURS):
     return patterns
 
 
+def build_shift(start, length, periods=erlang_staffing.HOURS_PER_DAY):
+    """
+    Build the dict of a shift covering consecutive intervals, wrapping past midnight
+
+    Parameters:
+    start (int): First interval of the shift
+    length (int): Number of intervals the shift covers
+    periods (int): Number of intervals in a day (default: 24, hourly)
+
+    Returns:
+    dict: 'start_hour' and 'end_hour' (clock hours), 'hours' covered, 'periods' (the
+          intervals covered, the same as 'hours' on hourly intervals) and the
+          'start_time' and 'end_time' labels ('08:15')
+    """
+    interval_minutes = erlang_staffing.interval_length(periods)
+    covered = [(start + offset) % periods for offset in range(length)]
+    # Clock hours the shift works in, in shift order
+    hours = list(dict.fromkeys(period * interval_minutes // erlang_staffing.MINUTES_PER_HOUR
+                               for period in covered))
+    end = (start + length) % periods
+    return {
+        'start_hour': start * interval_minutes // erlang_staffing.MINUTES_PER_HOUR,
+        'end_hour': end * interval_minutes // erlang_staffing.MINUTES_PER_HOUR,
+        'hours': hours,
+        'periods': covered,
+        'start_time': erlang_staffing.period_label(start, interval_minutes),
+        'end_time': erlang_staffing.period_label(end, interval_minutes),
+    }
+
+
+def shift_periods(shift):
+    """Intervals covered by a shift; shifts built by hand may only list their 'hours'"""
+    return shift.get('periods', shift['hours'])
+
+
+def generate_candidate_shifts(shift_lengths=erlang_staffing.SHIFT_LENGTH_OPTIONS,
+                              periods=erlang_staffing.HOURS_PER_DAY):
+    """
+    Generate every possible shift: each start interval combined with each shift length
+
+    Parameters:
+    shift_lengths (iterable): Allowed shift lengths in hours (default: SHIFT_LENGTH_OPTIONS)
+    periods (int): Number of periods in a day (default: 24)
+
+    Returns:
+    list: Shift dicts as built by build_shift, ordered by start interval and then by
+          length. Shifts may wrap past midnight, like the pattern shifts.
+    """
+    per_hour = erlang_staffing.MINUTES_PER_HOUR // erlang_staffing.interval_length(periods)
+    shifts = []
+    for start in range(periods):
+        for shift_length in sorted(shift_lengths):
+            shifts.append(build_shift(start, shift_length * per_hour, periods))
+
+    return shifts
+
+
 def calculate_agents_needed(shift, staffing_needs_day):
     """
     Calculate how many agents are needed for a specific shift based on staffing needs
 
     Parameters:
-    shift (dict): A shift dictionary with 'hours' key containing list of hours covered
-    staffing_needs_day (list): List of staffing needs for each hour of the day
+    shift (dict): A shift dictionary with the 'periods' (or 'hours') it covers
+    staffing_needs_day (list): List of staffing needs for each hour (or interval) of the day
 
     Returns:
     int: The maximum number of agents needed during any hour of the shift
@@ -79,7 +127,7 @@ def calculate_agents_needed(shift, staffing_needs_day):
     We need to staff according to the peak hour to ensure adequate coverage.
     """
     # Find the maximum staffing need for any hour in this shift
-    agents_needed = max([staffing_needs_day[hour] for hour in shift['hours']])
+    agents_needed = max(staffing_needs_day[period] for period in shift_periods(shift))
 
     return agents_needed
 
@@ -91,33 +139,256 @@ def evaluate_shift_pattern(pattern, staffing_needs_day):
 
     Parameters:
     pattern (dict): A pattern dictionary with 'shifts' list containing three shifts
-    staffing_needs_day (list): List of staffing needs for each hour of the day
+    staffing_needs_day (list): List of staffing needs for each hour (or interval) of the day
 
     Returns:
     dict: The pattern with agents_needed, agent_hours added to each shift and total_agents, total_agent_hours fields
     """
     total_agents = 0
     total_agent_hours = 0
-    pattern_copy = copy.deepcopy(pattern)
+    evaluated_shifts = []
+    interval_minutes = erlang_staffing.interval_length(len(staffing_needs_day))
 
     # Calculate agents needed for each shift in the pattern
-    for i, shift in enumerate(pattern_copy['shifts']):
+    for shift in pattern['shifts']:
         agents = calculate_agents_needed(shift, staffing_needs_day)
-        pattern_copy['shifts'][i]['agents_needed'] = agents
         total_agents += agents
 
         # Calculate agent hours for this shift
-        # Get actual shift length from hours covered
-        shift_length = len(shift['hours'])
-        agent_hours = agents * shift_length
-        pattern_copy['shifts'][i]['agent_hours'] = agent_hours
+        # Get actual shift length from the intervals covered
+        shift_length = len(shift_periods(shift))
+        agent_hours = agents * shift_length * interval_minutes // erlang_staffing.MINUTES_PER_HOUR
         total_agent_hours += agent_hours
 
+        # Build a new shift dict so the input pattern is left untouched
+        evaluated_shifts.append(
+            dict(shift, agents_needed=agents, agent_hours=agent_hours))
+
     # Add total agents and agent hours to the pattern
-    pattern_copy['total_agents'] = total_agents
-    pattern_copy['total_agent_hours'] = total_agent_hours
+    return dict(pattern, shifts=evaluated_shifts,
+                total_agents=total_agents, total_agent_hours=total_agent_hours)
+
+
+def build_staffing_matrix(staffing_needs):
+    """
+    Convert the staffing needs dict into a days x intervals matrix
+
+    Parameters:
+    staffing_needs (dict): Dictionary with staffing needs for each day and hour (or interval)
 
-    return pattern_copy
+    Returns:
+    numpy.ndarray: Integer matrix of shape (7, 24) for hourly needs, rows ordered as DAYS_OF_WEEK
+    """
+    return np.array([staffing_needs[day] for day in erlang_staffing.DAYS_OF_WEEK],
+                    dtype=np.int64)
+
+
+def build_pattern_arrays(patterns, periods=erlang_staffing.HOURS_PER_DAY):
+    """
+    Convert shift patterns into arrays for vectorized evaluation
+
+    Patterns with fewer shifts than the largest pattern are padded with empty shifts,
+    which have a length of 0 and never contribute agents.
+
+    Parameters:
+    patterns (list): List of pattern dicts as returned by generate_shift_patterns
+    periods (int): Number of periods in a day (default: 24)
+
+    Returns:
+    dict: 'pattern_numbers' (P,), 'starts' and 'lengths' (P, S) and the coverage
+          'mask' (P, S, periods), True where a shift covers a period
+    """
+    max_shifts = max((len(pattern['shifts']) for pattern in patterns), default=0)
+    starts = np.zeros((len(patterns), max_shifts), dtype=np.int64)
+    lengths = np.zeros((len(patterns), max_shifts), dtype=np.int64)
+    mask = np.zeros((len(patterns), max_shifts, periods), dtype=bool)
+
+    for p, pattern in enumerate(patterns):
+        for s, shift in enumerate(pattern['shifts']):
+            covered = shift_periods(shift)
+            if not covered:
+                continue
+            # Shifts are one contiguous block of periods, possibly wrapping past midnight
+            expected = [(covered[0] + offset) % periods for offset in range(len(covered))]
+            if list(covered) != expected:
+                raise ValueError(
+                    f"Shift hours must be a contiguous block, got {covered}")
+            starts[p, s] = covered[0]
+            lengths[p, s] = len(covered)
+            mask[p, s, covered] = True
+
+    return {
+        'pattern_numbers': np.array([pattern['pattern_number'] for pattern in patterns]),
+        'starts': starts,
+        'lengths': lengths,
+        'mask': mask,
+    }
+
+
+def window_peaks(staffing_matrix, length):
+    """
+    Peak staffing need over every window of a given length, wrapping past midnight
+
+    Parameters:
+    staffing_matrix (numpy.ndarray): Matrix of shape (days, periods)
+    length (int): Window length in periods
+
+    Returns:
+    numpy.ndarray: Matrix of shape (days, periods) where [d, h] is the peak of the
+                   window of the given length starting at period h on day d
+    """
+    periods = staffing_matrix.shape[1]
+    wrapped = np.concatenate(
+        [staffing_matrix] + [staffing_matrix] * ((length - 1) // periods + 1), axis=1)
+    windows = sliding_window_view(wrapped, length, axis=1)[:, :periods]
+    return windows.max(axis=-1)
+
+
+def evaluate_all_patterns(patterns, staffing_needs):
+    """
+    Evaluate every shift pattern for every day in one vectorized pass
+
+    Gives the same numbers as calling evaluate_shift_pattern for each pattern and day,
+    but as arrays. Use evaluated_pattern_for_day to build the dict for one pattern and
+    day when it is needed for display.
+
+    Parameters:
+    patterns (list): List of pattern dicts as returned by generate_shift_patterns
+    staffing_needs (dict or numpy.ndarray): Staffing needs dict or a (7, intervals) staffing matrix
+
+    Returns:
+    dict: Evaluation arrays, with P patterns, D days and S shifts per pattern:
+          'agents' and 'agent_hours' (P, D, S), 'total_agents', 'total_agent_hours'
+          and 'utilization' in percent (P, D), 'staff_hours' (D,), plus the
+          pattern arrays from build_pattern_arrays under 'pattern_arrays'
+    """
+    if isinstance(staffing_needs, dict):
+        staffing_matrix = build_staffing_matrix(staffing_needs)
+    else:
+        staffing_matrix = np.asarray(staffing_needs)
+
+    num_days, periods = staffing_matrix.shape
+    pattern_arrays = build_pattern_arrays(patterns, periods)
+    starts = pattern_arrays['starts']
+    lengths = pattern_arrays['lengths']
+
+    agents = np.zeros((len(patterns), num_days, starts.shape[1]), dtype=np.int64)
+    # One sliding-window max per distinct shift length, then pick each shift's window
+    for length in np.unique(lengths[lengths > 0]):
+        peaks = window_peaks(staffing_matrix, int(length))
+        pattern_index, shift_index = np.nonzero(lengths == length)
+        agents[pattern_index, :, shift_index] = peaks[:, starts[pattern_index, shift_index]].T
+
+    # Shifts last whole hours, so agent hours stay integers at any interval length
+    interval_minutes = erlang_staffing.interval_length(periods)
+    agent_hours = agents * lengths[:, None, :] * interval_minutes // erlang_staffing.MINUTES_PER_HOUR
+    total_agents = agents.sum(axis=2)
+    total_agent_hours = agent_hours.sum(axis=2)
+    staff_hours = staffing_matrix.sum(axis=1) * interval_minutes / erlang_staffing.MINUTES_PER_HOUR
+
+    utilization = np.zeros(total_agent_hours.shape)
+    np.divide(np.broadcast_to(staff_hours, total_agent_hours.shape), total_agent_hours,
+              out=utilization, where=total_agent_hours > 0)
+    utilization *= 100
+
+    return {
+        'pattern_arrays': pattern_arrays,
+        'agents': agents,
+        'agent_hours': agent_hours,
+        'total_agents': total_agents,
+        'total_agent_hours': total_agent_hours,
+        'staff_hours': staff_hours,
+        'utilization': utilization,
+    }
+
+
+def update_pattern_evaluation(evaluation, staffing_matrix, cells):
+    """
+    Update an evaluate_all_patterns result after some staffing cells changed
+
+    Only the shifts that cover a changed cell on its day get their peak recomputed.
+    The daily totals change by the difference in those shifts' agents and agent
+    hours, and the utilization is recomputed for the changed days only. The result is
+    the same as evaluating every pattern again on the new staffing matrix.
+
+    Parameters:
+    evaluation (dict): Result of evaluate_all_patterns for the old staffing, left unchanged
+    staffing_matrix (numpy.ndarray): The new (days, periods) staffing matrix
+    cells (numpy.ndarray): Boolean (days, periods) mask of the cells that changed
+
+    Returns:
+    dict: The evaluation of the same patterns on the new staffing matrix
+    """
+    staffing_matrix = np.asarray(staffing_matrix)
+    cells = np.asarray(cells, dtype=bool)
+    pattern_arrays = evaluation['pattern_arrays']
+    mask = pattern_arrays['mask']
+
+    # (P, S, D) -> (P, D, S): shifts covering at least one changed cell of that day
+    covered = (mask.astype(np.int64) @ cells.T.astype(np.int64)) > 0
+    pattern_index, day_index, shift_index = np.nonzero(covered.transpose(0, 2, 1))
+    peaks = np.where(mask[pattern_index, shift_index], staffing_matrix[day_index], 0).max(axis=1)
+
+    interval_minutes = erlang_staffing.interval_length(staffing_matrix.shape[1])
+    hours = (peaks * pattern_arrays['lengths'][pattern_index, shift_index] * interval_minutes
+             // erlang_staffing.MINUTES_PER_HOUR)
+    agents = evaluation['agents'].copy()
+    agent_hours = evaluation['agent_hours'].copy()
+    total_agents = evaluation['total_agents'].copy()
+    total_agent_hours = evaluation['total_agent_hours'].copy()
+    np.add.at(total_agents, (pattern_index, day_index), peaks - agents[pattern_index, day_index, shift_index])
+    np.add.at(total_agent_hours, (pattern_index, day_index),
+              hours - agent_hours[pattern_index, day_index, shift_index])
+    agents[pattern_index, day_index, shift_index] = peaks
+    agent_hours[pattern_index, day_index, shift_index] = hours
+
+    days = np.flatnonzero(cells.any(axis=1))
+    staff_hours = evaluation['staff_hours'].copy()
+    staff_hours[days] = (staffing_matrix[days].sum(axis=1) * interval_minutes
+                         / erlang_staffing.MINUTES_PER_HOUR)
+    utilization = evaluation['utilization'].copy()
+    day_hours = total_agent_hours[:, days]
+    day_utilization = np.zeros(day_hours.shape)
+    np.divide(np.broadcast_to(staff_hours[days], day_hours.shape), day_hours,
+              out=day_utilization, where=day_hours > 0)
+    utilization[:, days] = day_utilization * 100
+
+    return {
+        'pattern_arrays': pattern_arrays,
+        'agents': agents,
+        'agent_hours': agent_hours,
+        'total_agents': total_agents,
+        'total_agent_hours': total_agent_hours,
+        'staff_hours': staff_hours,
+        'utilization': utilization,
+    }
+
+
+def evaluated_pattern_for_day(patterns, evaluation, pattern_index, day_index):
+    """
+    Build the evaluate_shift_pattern dict for one pattern and day from an evaluation
+
+    Parameters:
+    patterns (list): The patterns passed to evaluate_all_patterns
+    evaluation (dict): Result of evaluate_all_patterns
+    pattern_index (int): Position of the pattern in patterns
+    day_index (int): Position of the day in DAYS_OF_WEEK
+
+    Returns:
+    dict: The pattern with agents_needed and agent_hours added to each shift and
+          total_agents, total_agent_hours fields
+    """
+    pattern = patterns[pattern_index]
+    evaluated_shifts = []
+    for s, shift in enumerate(pattern['shifts']):
+        evaluated_shifts.append(dict(
+            shift,
+            agents_needed=int(evaluation['agents'][pattern_index, day_index, s]),
+            agent_hours=int(evaluation['agent_hours'][pattern_index, day_index, s])))
+
+    return dict(pattern, shifts=evaluated_shifts,
+                total_agents=int(evaluation['total_agents'][pattern_index, day_index]),
+                total_agent_hours=int(evaluation['total_agent_hours'][pattern_index, day_index]))
 
 
 # def create_shift_plan(staffing_needs):
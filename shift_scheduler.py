@@ -0,0 +1,139 @@
+import numpy as np
+from pyworkforce.scheduling import MinRequiredResources
+import erlang_staffing
+import shift_optimizer
+from erlang_staffing import SHIFT_LENGTH_OPTIONS
+
+SCHEDULER_MAX_SEARCH_TIME = 60.0  # Maximum solver time in seconds
+SCHEDULER_SEARCH_WORKERS = 1  # Number of solver search workers
+ILP_PATTERN_NUMBER = 'ILP'  # Pattern number reported for integer-programming schedules
+
+
+def solve_shift_schedule(staffing_needs, shift_lengths=SHIFT_LENGTH_OPTIONS,
+                         max_search_time=SCHEDULER_MAX_SEARCH_TIME,
+                         num_search_workers=SCHEDULER_SEARCH_WORKERS):
+    """
+    Find the number of agents to put on every possible shift, for each day
+
+    This solves the set-covering problem: shifts may start at any hour (or interval), have
+    any of the given lengths and overlap, every hour must have at least as many agents on
+    shift as its Erlang requirement, and the total agent hours are minimized.
+    It uses pyworkforce's MinRequiredResources model with shift length as the cost,
+    which runs offline on the CP-SAT solver bundled with OR-Tools.
+
+    Parameters:
+    staffing_needs (dict): Dictionary with staffing needs for each day and hour
+    shift_lengths (iterable): Allowed shift lengths in hours (default: SHIFT_LENGTH_OPTIONS)
+    max_search_time (float): Maximum solver time in seconds (default: 60)
+    num_search_workers (int): Number of solver search workers (default: 1)
+
+    Returns:
+    dict: 'status' of the solver, 'shifts' (the candidate shift dicts) and 'agents',
+          an integer array of shape (7, number of shifts) with the agents per day and shift
+    """
+    staffing_matrix = shift_optimizer.build_staffing_matrix(staffing_needs)
+    num_days, periods = staffing_matrix.shape
+    shifts = shift_optimizer.generate_candidate_shifts(shift_lengths, periods)
+
+    shift_names = [f"{shift['periods'][0]}_{len(shift['periods'])}" for shift in shifts]
+    coverage = shift_optimizer.build_pattern_arrays(
+        [{'pattern_number': 0, 'shifts': shifts}], periods)['mask'][0]
+    shifts_coverage = {name: coverage[s].astype(int).tolist()
+                       for s, name in enumerate(shift_names)}
+    cost_dict = {name: len(shift['periods']) for name, shift in zip(shift_names, shifts)}
+
+    # One shift never needs more agents than the peak hour; the period bound is loose
+    peak = int(staffing_matrix.max()) if staffing_matrix.size else 0
+    scheduler = MinRequiredResources(
+        num_days=num_days,
+        periods=periods,
+        shifts_coverage=shifts_coverage,
+        required_resources=staffing_matrix.tolist(),
+        max_period_concurrency=max(1, int(staffing_matrix.sum(axis=1).max())),
+        max_shift_concurrency=max(1, peak),
+        cost_dict=cost_dict,
+        max_search_time=float(max_search_time),
+        num_search_workers=int(num_search_workers))
+    solution = scheduler.solve()
+
+    if solution['status'] not in ('OPTIMAL', 'FEASIBLE'):
+        raise RuntimeError(
+            f"Shift scheduler found no solution (status: {solution['status']})")
+
+    agents = np.zeros((num_days, len(shifts)), dtype=np.int64)
+    shift_index = {name: s for s, name in enumerate(shift_names)}
+    for entry in solution['resources_shifts']:
+        agents[entry['day'], shift_index[entry['shift']]] = entry['resources']
+
+    return {
+        'status': solution['status'],
+        'shifts': shifts,
+        'agents': agents,
+    }
+
+
+def find_ilp_shift_pattern(staffing_needs, shift_lengths=SHIFT_LENGTH_OPTIONS,
+                           max_search_time=SCHEDULER_MAX_SEARCH_TIME,
+                           num_search_workers=SCHEDULER_SEARCH_WORKERS):
+    """
+    Build a weekly schedule with solve_shift_schedule
+
+    The result has the same structure as ideal_shift.find_ideal_shift_pattern, so it can
+    be passed to display_ideal_shift_pattern, the Excel report and the shift simulation.
+    'shift_times' lists every shift used on at least one day, and each day's 'shifts'
+    lists the shifts worked that day.
+
+    Parameters:
+    staffing_needs (dict): Dictionary with staffing needs for each day and hour
+    shift_lengths (iterable): Allowed shift lengths in hours (default: SHIFT_LENGTH_OPTIONS)
+    max_search_time (float): Maximum solver time in seconds (default: 60)
+    num_search_workers (int): Number of solver search workers (default: 1)
+
+    Returns:
+    dict: Information about the schedule and its weekly resource requirements
+    """
+    schedule = solve_shift_schedule(staffing_needs, shift_lengths,
+                                    max_search_time, num_search_workers)
+    shifts = schedule['shifts']
+    interval_minutes = erlang_staffing.interval_length(len(staffing_needs[erlang_staffing.DAYS_OF_WEEK[0]]))
+    per_hour = erlang_staffing.MINUTES_PER_HOUR // interval_minutes
+    agents = schedule['agents']
+    used_shifts = np.flatnonzero(agents.sum(axis=0) > 0)
+
+    daily_stats = []
+    for day_index, day in enumerate(erlang_staffing.DAYS_OF_WEEK):
+        day_shifts = []
+        for s in used_shifts:
+            if agents[day_index, s] == 0:
+                continue
+            shift_length = len(shifts[s]['periods']) // per_hour
+            day_shifts.append(dict(
+                shifts[s],
+                shift_number=len(day_shifts) + 1,
+                agents_needed=int(agents[day_index, s]),
+                agent_hours=int(agents[day_index, s]) * shift_length))
+
+        total_agents = sum(shift['agents_needed'] for shift in day_shifts)
+        total_agent_hours = sum(shift['agent_hours'] for shift in day_shifts)
+        total_staff_hours = sum(staffing_needs[day]) / per_hour
+        utilization = (total_staff_hours / total_agent_hours) * \
+            100 if total_agent_hours > 0 else 0
+
+        daily_stats.append({
+            'day': day,
+            'agents': total_agents,
+            'hours': total_agent_hours,
+            'utilization': round(utilization, 1),
+            'shifts': day_shifts
+        })
+
+    return {
+        'pattern_number': ILP_PATTERN_NUMBER,
+        'solver_status': schedule['status'],
+        'total_weekly_agents': sum(day['agents'] for day in daily_stats),
+        'total_weekly_hours': sum(day['hours'] for day in daily_stats),
+        'avg_utilization': round(sum(day['utilization'] for day in daily_stats) / len(daily_stats), 1),
+        'daily_stats': daily_stats,
+        'shift_times': [f"{shifts[s]['start_time']}-{shifts[s]['end_time']}" for s in used_shifts],
+        'interval_minutes': interval_minutes
+    }
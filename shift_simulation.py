@@ -1,30 +1,108 @@
-import simpy
+from functools import partial
 import numpy as np
-from erlang_staffing import arrival_rate_urgent, DAYS_OF_WEEK, URGENT_TASK_WORK_MINUTES
+from erlang_staffing import (DAYS_OF_WEEK, URGENT_TASK_WORK_MINUTES, MINUTES_PER_HOUR,
+                             interval_arrival_rates, intervals_per_day)
+from parallel_executor import run_seeded_tasks
+from fast_simulation import SIMULATION_ENGINES, run_queue, sample_calls
+from output import DETAIL, SUMMARY, get_reporter, text_format
+from replication import (DEFAULT_CONFIDENCE, MAX_REPLICATIONS, format_replications,
+                         run_replications, seed_from_rng)
+from rng_streams import hourly_streams, is_common_streams
+from shift_optimizer import build_shift, shift_periods
+from wait_metrics import WaitHistogram
 
 # Convert minutes to seconds for simulation
 AHT = URGENT_TASK_WORK_MINUTES * 60  # Average handling time in seconds
 SHIFT_DURATION = 8 * 3600  # 8 hours in seconds
 TARGET_SLA = 20  # Target answer time in seconds for service level
 AVG_PATIENCE = 120  # Average caller patience in seconds (2 minutes)
+RAW_RESULT_FIELDS = ('wait_metrics', 'wait_times')  # Result fields left out of output records
+ON_DUTY = 'On duty'  # shift_type of the runs of overlapping shifts simulated as one queue
+
+
+@text_format('pattern_simulation_shift')
+def _format_shift(record):
+    name = ON_DUTY if record['shift_type'] == ON_DUTY else f"{record['shift_type']} Shift"
+    return (f"  {name} ({record['start_time']}-{record['end_time']}): "
+            f"{record['calls_arrived']:.0f} calls, "
+            f"{record['calls_handled']:.0f} handled, "
+            f"{record['calls_abandoned']:.0f} abandoned, "
+            f"{record['avg_wait']:.1f}s avg wait, "
+            f"{record['service_level']:.1f}% service level with {record['agents']} agents"
+            + format_replications(record))
+
+
+@text_format('pattern_simulation_day')
+def _format_day(record):
+    return (f"\n{record['day']} Summary: {record['calls_arrived']:.0f} calls, "
+            f"{record['calls_handled']:.0f} handled, "
+            f"{record['calls_abandoned']:.0f} abandoned, "
+            f"{record['service_level']:.1f}% service level")
+
+
+@text_format('pattern_simulation_week')
+def _format_week(record):
+    return (f"\nWeekly Summary: {record['calls_arrived']:.0f} calls, "
+            f"{record['calls_handled']:.0f} handled, "
+            f"{record['calls_abandoned']:.0f} abandoned, "
+            f"{record['service_level']:.1f}% service level")
+
 
 def run_shift_simulation(num_agents, hourly_arrival_rates, shift_hours=8, 
-                       service_time_seconds=AHT, avg_patience_seconds=AVG_PATIENCE):
+                       service_time_seconds=AHT, avg_patience_seconds=AVG_PATIENCE, rng=None,
+                       engine='simpy', replications=1, target_half_width=None,
+                       confidence=DEFAULT_CONFIDENCE, max_replications=MAX_REPLICATIONS,
+                       capture_waits=False, interval_seconds=3600):
     """
     Run a simulation for an entire shift (multiple hours)
     
     Parameters:
     num_agents (int): Number of agents staffed for this shift
-    hourly_arrival_rates (list): List of arrival rates for each hour in the shift
+    hourly_arrival_rates (list): List of arrival rates for each hour (or interval) in the shift
     shift_hours (int): Duration of the shift in hours
     service_time_seconds (float): Average service time in seconds
     avg_patience_seconds (float): Average patience time in seconds
+    rng (numpy.random.Generator, CallStreams or list): Random generator for this run, or
+        common random number streams: a list with CallStreams for each hour of the shift
+        draws every hour's calls from that hour's streams (default: None, the global numpy
+        random state)
+    engine (str): 'simpy' for the SimPy reference model or 'fast' for the heap-based
+                  engine in fast_simulation (default: 'simpy')
+    replications (int): Number of independent replications; above 1 the result holds
+                        the means and confidence intervals (default: 1)
+    target_half_width (float): Keep adding replications until the service level
+                               confidence interval half-width is at most this many
+                               percentage points (default: None, fixed replications)
+    confidence (float): Confidence level of the intervals (default: 0.95)
+    max_replications (int): Upper limit on replications in sequential mode (default: 200)
+    capture_waits (bool): Also return every individual wait as 'wait_times' (default: False)
+    interval_seconds (float): Length of each arrival rate's interval, e.g. 900 for
+                              15-minute intervals (default: 3600)
     
     Returns:
-    dict: Simulation results
+    dict: Simulation results, with the waits summarized in 'wait_metrics' (a WaitHistogram)
+          and the 'wait_p50', 'wait_p90' and 'wait_p99' percentiles
     """
+    if engine not in SIMULATION_ENGINES:
+        raise ValueError(f"Unknown simulation engine: {engine}")
+
+    if replications > 1 or target_half_width is not None:
+        # Every replication is a single run with its own random stream; common
+        # streams are passed on so replication r sees the same calls in every configuration
+        return run_replications(
+            partial(run_shift_simulation, num_agents, hourly_arrival_rates, shift_hours,
+                    service_time_seconds, avg_patience_seconds, engine=engine,
+                    capture_waits=capture_waits, interval_seconds=interval_seconds),
+            replications, rng if is_common_streams(rng) else seed_from_rng(rng),
+            confidence, target_half_width, max_replications)
+
+    # Arrival, service and patience draws for each hour; a single generator (or the
+    # global numpy random state when none is given) is shared by every hour
+    streams = hourly_streams(rng, len(hourly_arrival_rates))
+    wait_metrics = WaitHistogram(thresholds=(TARGET_SLA,))
+
     if sum(hourly_arrival_rates) == 0:
-        return {
+        result = {
             "calls_arrived": 0,
             "calls_handled": 0,
             "calls_abandoned": 0,
@@ -32,8 +110,59 @@ def run_shift_simulation(num_agents, hourly_arrival_rates, shift_hours=8,
             "avg_wait": 0,
             "max_wait": 0,
             "service_level": 100,
+            "wait_metrics": wait_metrics,
+            **wait_metrics.percentiles(),
         }
+        if capture_waits:
+            result["wait_times"] = []
+        return result
     
+    # Calculate total simulation duration
+    sim_duration = shift_hours * 3600  # in seconds
+    
+    if engine == 'fast':
+        busy_hours = [hour for hour, rate in enumerate(hourly_arrival_rates) if rate > 0]
+        arrival_windows = [(hour * interval_seconds, (hour + 1) * interval_seconds,
+                            hourly_arrival_rates[hour])
+                           for hour in busy_hours]
+        arrival_times, service_times, patience_times = sample_calls(
+            [streams[hour] for hour in busy_hours], arrival_windows,
+            service_time_seconds, avg_patience_seconds)
+        # Only arrivals before the end of the shift are part of the run
+        in_shift = arrival_times < sim_duration
+        wait_times, calls_handled, calls_abandoned = run_queue(
+            num_agents, arrival_times[in_shift], service_times[in_shift],
+            patience_times[in_shift], sim_duration)
+        calls_arrived = int(np.count_nonzero(in_shift))
+    else:
+        wait_times, calls_arrived, calls_handled, calls_abandoned = _run_simpy_shift(
+            num_agents, hourly_arrival_rates, sim_duration,
+            service_time_seconds, avg_patience_seconds, streams, interval_seconds)
+    
+    # Analyze results
+    wait_metrics.add_many(wait_times)
+    
+    result = {
+        "calls_arrived": calls_arrived,
+        "calls_handled": calls_handled,
+        "calls_abandoned": calls_abandoned,
+        "calls_expected": sum(hourly_arrival_rates),
+        "avg_wait": wait_metrics.mean,
+        "max_wait": wait_metrics.max,
+        "service_level": wait_metrics.service_level(TARGET_SLA),
+        "wait_metrics": wait_metrics,
+        **wait_metrics.percentiles(),
+    }
+    if capture_waits:
+        result["wait_times"] = wait_times
+    return result
+
+def _run_simpy_shift(num_agents, hourly_arrival_rates, sim_duration,
+                     service_time_seconds, avg_patience_seconds, streams, interval_seconds=3600):
+    """Run the SimPy model for one shift and return (wait_times, arrived, handled, abandoned)"""
+    # Only the reference engine needs SimPy
+    import simpy
+
     # Setup simulation environment
     env = simpy.Environment()
     agents = simpy.Resource(env, capacity=num_agents)
@@ -44,9 +173,6 @@ def run_shift_simulation(num_agents, hourly_arrival_rates, shift_hours=8,
     calls_arrived = 0
     calls_abandoned = 0
     
-    # Calculate total simulation duration
-    sim_duration = shift_hours * 3600  # in seconds
-    
     def call_generator(env, agents):
         """Generate calls based on arrival rates that vary by hour"""
         nonlocal calls_arrived
@@ -56,23 +182,23 @@ def run_shift_simulation(num_agents, hourly_arrival_rates, shift_hours=8,
             # Generate arrivals for this hour
             if rate > 0:
                 # Generate random arrival times within this hour
-                hour_arrivals = np.random.uniform(hour*3600, (hour+1)*3600, int(rate))
+                hour_arrivals = streams[hour].arrivals.uniform(hour*interval_seconds, (hour+1)*interval_seconds, int(rate))
                 for arrival_time in sorted(hour_arrivals):
                     # Wait until arrival time
                     yield env.timeout(arrival_time - env.now)
                     
                     # Generate a new call
                     calls_arrived += 1
-                    env.process(handle_call(env, agents))
+                    env.process(handle_call(env, agents, streams[hour]))
 
-    def handle_call(env, agents):
+    def handle_call(env, agents, call_streams):
         """Handle an incoming call with potential abandonment"""
         nonlocal calls_handled, calls_abandoned
         arrival_time = env.now
         
         # Generate variable service and patience times
-        service_time = np.random.exponential(service_time_seconds)
-        patience = np.random.exponential(avg_patience_seconds)
+        service_time = call_streams.services.exponential(service_time_seconds)
+        patience = call_streams.patience.exponential(avg_patience_seconds)
         
         # Try to get an agent
         with agents.request() as req:
@@ -97,84 +223,226 @@ def run_shift_simulation(num_agents, hourly_arrival_rates, shift_hours=8,
     # Run the simulation
     env.run(until=sim_duration)
     
-    # Analyze results
-    if len(wait_times) > 0:
-        wait_array = np.array(wait_times)
-        avg_wait = np.mean(wait_array)
-        max_wait = np.max(wait_array)
-        service_level = np.mean(wait_array <= TARGET_SLA) * 100
-    else:
-        avg_wait = 0
-        max_wait = 0
-        service_level = 100
-    
-    return {
-        "calls_arrived": calls_arrived,
-        "calls_handled": calls_handled,
-        "calls_abandoned": calls_abandoned,
-        "calls_expected": sum(hourly_arrival_rates),
-        "avg_wait": avg_wait,
-        "max_wait": max_wait,
-        "service_level": service_level,
-    }
+    return wait_times, calls_arrived, calls_handled, calls_abandoned
 
-def simulate_ideal_pattern(ideal_pattern):
+def simulate_ideal_pattern(ideal_pattern, workers=1, seed=None, engine='simpy',
+                           replications=1, target_half_width=None, crn=False,
+                           arrival_rates=None):
     """
     Simulate the performance of the ideal shift pattern
     
+    The shifts are independent, so they can be spread over a process pool. With more than
+    one worker, or a seed, every shift gets its own random stream spawned from the seed
+    and the results are identical whatever the number of workers.
+    
+    With crn=True every hour of a shift draws from streams keyed by day and hour
+    (common random numbers), the same keys simulate_staffing_plan uses: with the
+    same seed, any two shift patterns, and the hourly plan, see exactly the same
+    callers in each hour of the week.
+    
+    Patterns found on sub-hourly staffing intervals are simulated interval by interval,
+    with the arrival rates spread over the same intervals as the staffing.
+    
+    Shifts that overlap, as in the integer-programming schedules (mode='ilp'), share
+    their callers: each day is then simulated as runs of intervals with the same number
+    of agents on duty, every run with the agents of all the shifts covering it, and
+    the results list these runs instead of the shifts (see queue_shifts).
+    
     Parameters:
     ideal_pattern (dict): The ideal pattern structure from find_ideal_shift_pattern()
+    workers (int): Number of worker processes; 0 uses every core (default: 1, in this process)
+    seed (int): Root seed for the per-shift random streams (default: None)
+    engine (str): Simulation engine passed to run_shift_simulation (default: 'simpy')
+    replications (int): Replications per run, see run_simulation (default: 1)
+    target_half_width (float): Sequential stopping target for the service level
+                               confidence interval, see run_simulation (default: None)
+    crn (bool): Use common random numbers keyed by day and hour (default: False)
+    arrival_rates (dict): Calls per day and hour (default: arrival_rate_urgent)
     
+    Progress is reported to output.get_reporter(): a 'pattern_simulation_shift' record
+    per shift (DETAIL), then 'pattern_simulation_day' and 'pattern_simulation_week'
+    summaries (SUMMARY).
+
     Returns:
-    dict: Simulation results by day and shift
+    dict: Simulation results by day and shift (or run of overlapping shifts)
     """
-    results = {}
+    interval_minutes = ideal_pattern.get('interval_minutes', MINUTES_PER_HOUR)
+    arrivals = interval_arrival_rates(arrival_rates, interval_minutes, whole_calls=True).tolist()
+    
+    get_reporter().message("\n=== SIMULATING IDEAL SHIFT PATTERN PERFORMANCE ===")
     
-    print("\n=== SIMULATING IDEAL SHIFT PATTERN PERFORMANCE ===")
+    day_shifts = queue_shifts(ideal_pattern)
+    shifts = [(DAYS_OF_WEEK.index(day), i, shift)
+              for day, queues in day_shifts.items() for i, shift in enumerate(queues)]
+    shift_results = iter(_simulate_shifts(shifts, arrivals, interval_minutes, workers, seed, engine,
+                                          replications, target_half_width, crn))
+    results = {day: [next(shift_results) for _ in queues] for day, queues in day_shifts.items()}
     
+    # Progress is reported once all the results have been gathered
+    _report_pattern(results, ideal_pattern['pattern_number'], list(results))
+    return results
+
+
+def update_pattern_simulation(results, ideal_pattern, cells, workers=1, seed=None, engine='simpy',
+                              replications=1, target_half_width=None, crn=False, arrival_rates=None):
+    """
+    Re-simulate only the shifts of a simulate_ideal_pattern result that changed
+    
+    A shift is simulated again when it covers one of the cells (its calls changed) or
+    its number of agents changed; the other shifts keep their results. The pattern
+    must have the same shifts as the one simulated, only its agents may differ. For
+    overlapping shifts, a day whose runs of agents on duty changed is simulated again
+    as a whole. With
+    crn=True and a seed, every shift draws from the streams of its day and intervals,
+    so the result is the same as simulating the whole pattern again.
+    
+    The days with a re-simulated shift and the week are reported as in simulate_ideal_pattern.
+    
+    Parameters:
+    results (dict): simulate_ideal_pattern result to update, left unchanged
+    ideal_pattern (dict): The pattern with its new agents per shift
+    cells (numpy.ndarray): Boolean (7, intervals per day) mask of the intervals whose calls changed
+    workers, seed, engine, replications, target_half_width, crn, arrival_rates:
+        As for simulate_ideal_pattern, with arrival_rates the new forecast
+    
+    Returns:
+    dict: Simulation results by day and shift, as simulate_ideal_pattern returns
+    """
+    interval_minutes = ideal_pattern.get('interval_minutes', MINUTES_PER_HOUR)
+    arrivals = interval_arrival_rates(arrival_rates, interval_minutes, whole_calls=True).tolist()
+    
+    overlapping = _overlaps(ideal_pattern)
+    day_shifts = queue_shifts(ideal_pattern)
+    shifts = []
+    updated = {day: list(day_results) for day, day_results in results.items()}
+    for day, queues in day_shifts.items():
+        day_index = DAYS_OF_WEEK.index(day)
+        previous = results[day]
+        if [(r['start_time'], r['end_time']) for r in previous] != [_shift_times(shift) for shift in queues]:
+            if not overlapping:
+                raise ValueError("The pattern has other shifts than the simulated one; use simulate_ideal_pattern")
+            # Other runs of agents on duty: the whole day is simulated again
+            updated[day] = [None] * len(queues)
+            shifts.extend((day_index, i, shift) for i, shift in enumerate(queues))
+            continue
+        for i, shift in enumerate(queues):
+            if shift['agents_needed'] != previous[i]['agents'] or cells[day_index, shift_periods(shift)].any():
+                shifts.append((day_index, i, shift))
+    
+    for (day_index, i, _), shift_result in zip(shifts, _simulate_shifts(
+            shifts, arrivals, interval_minutes, workers, seed, engine, replications,
+            target_half_width, crn)):
+        updated[DAYS_OF_WEEK[day_index]][i] = shift_result
+    
+    changed_days = {DAYS_OF_WEEK[day_index] for day_index, _, _ in shifts}
+    _report_pattern(updated, ideal_pattern['pattern_number'], [day for day in updated if day in changed_days])
+    return updated
+
+
+def queue_shifts(ideal_pattern):
+    """
+    The queues simulate_ideal_pattern simulates for each day of a pattern
+
+    Shifts that do not overlap each serve their own callers and are simulated as they
+    are. When shifts overlap on some day, every agent on duty serves the same callers,
+    so each day becomes runs of consecutive intervals with the same number of agents on
+    duty, shift dicts of their own (shift_type ON_DUTY, with the agents of all the shifts
+    covering them). Intervals nobody works are left out, as with any pattern.
+
+    Parameters:
+    ideal_pattern (dict): Pattern from find_ideal_shift_pattern or find_ilp_shift_pattern
+
+    Returns:
+    dict: List of shift dicts to simulate, by day
+    """
+    if not _overlaps(ideal_pattern):
+        return {day_stat['day']: day_stat['shifts'] for day_stat in ideal_pattern['daily_stats']}
+    periods = intervals_per_day(ideal_pattern.get('interval_minutes', MINUTES_PER_HOUR))
+    day_shifts = {}
+    for day_stat in ideal_pattern['daily_stats']:
+        on_duty = np.zeros(periods, dtype=np.int64)
+        for shift in day_stat['shifts']:
+            on_duty[shift_periods(shift)] += shift['agents_needed']
+        # Runs of equal agents on duty start where the count changes
+        starts = np.flatnonzero(np.diff(on_duty, prepend=-1))
+        ends = np.append(starts[1:], periods)
+        day_shifts[day_stat['day']] = [
+            dict(build_shift(int(start), int(end - start), periods), shift_type=ON_DUTY,
+                 agents_needed=int(on_duty[start]))
+            for start, end in zip(starts, ends) if on_duty[start] > 0]
+    return day_shifts
+
+
+def _overlaps(ideal_pattern):
+    """Whether two shifts of the pattern cover the same interval on some day"""
     for day_stat in ideal_pattern['daily_stats']:
-        day = day_stat['day']
-        day_results = []
+        covered = [period for shift in day_stat['shifts'] for period in shift_periods(shift)]
+        if len(covered) != len(set(covered)):
+            return True
+    return False
+
+
+def _shift_times(shift):
+    """Start and end time of a shift, also for shifts described by their hours only"""
+    return (shift.get('start_time', f"{shift['start_hour']:02d}:00"),
+            shift.get('end_time', f"{shift['end_hour']:02d}:00"))
+
+
+def _simulate_shifts(shifts, arrivals, interval_minutes, workers, seed, engine, replications,
+                     target_half_width, crn):
+    """Simulate the (day index, position in the day, shift) shifts and return one result dict for each"""
+    tasks = [(shift['agents_needed'],
+              [arrivals[day_index][period] for period in shift_periods(shift)],
+              len(shift_periods(shift)) * interval_minutes / MINUTES_PER_HOUR)
+             for day_index, _, shift in shifts]
+    stream_keys = ([[(day_index, period) for period in shift_periods(shift)]
+                    for day_index, _, shift in shifts]
+                   if crn else None)
+    if workers == 1 and seed is None and not crn:
+        shift_results = [run_shift_simulation(*task, engine=engine, replications=replications,
+                                              target_half_width=target_half_width,
+                                              interval_seconds=interval_minutes * 60)
+                         for task in tasks]
+    else:
+        shift_results = run_seeded_tasks(run_shift_simulation, tasks, workers=workers, seed=seed,
+                                         stream_keys=stream_keys, engine=engine,
+                                         replications=replications,
+                                         target_half_width=target_half_width,
+                                         interval_seconds=interval_minutes * 60)
+    
+    results = []
+    for (_, i, shift), result in zip(shifts, shift_results):
+        shift_names = ["First", "Second", "Third", "Fourth", "Fifth"]
+        shift_type = shift.get('shift_type') or (shift_names[i] if i < len(shift_names) else f"Shift {i+1}")
+        start_time, end_time = _shift_times(shift)
         
-        print(f"\nSimulating {day} with Pattern {ideal_pattern['pattern_number']}:")
+        # Store the results, with the hours covered by the shift and its number of agents
+        results.append({
+            "shift_type": shift_type,
+            "hours": shift['hours'],
+            "start_time": start_time,
+            "end_time": end_time,
+            "agents": shift['agents_needed'],
+            **result
+        })
+    return results
+
+
+def _report_pattern(results, pattern_number, days):
+    """Report the shifts and summary of the given days, then the weekly summary"""
+    reporter = get_reporter()
+    detail = reporter.enabled(DETAIL)
+    for day in days:
+        day_results = results[day]
         
-        for i, shift in enumerate(day_stat['shifts']):
-            shift_names = ["First", "Second", "Third", "Fourth", "Fifth"]
-            shift_type = shift_names[i] if i < len(shift_names) else f"Shift {i+1}"
-            
-            # Get the hours covered by this shift
-            hours = shift['hours']
-            
-            # Get the arrival rates for these hours
-            arrival_rates = [arrival_rate_urgent[day][hour] for hour in hours]
-            
-            # Get the number of agents for this shift
-            num_agents = shift['agents_needed']
-            
-            # Run the simulation for this shift
-            result = run_shift_simulation(num_agents, arrival_rates)
-            
-            # Store the results
-            shift_result = {
-                "shift_type": shift_type,
-                "hours": hours,
-                "start_time": f"{shift['start_hour']:02d}:00",
-                "end_time": f"{shift['end_hour']:02d}:00",
-                "agents": num_agents,
-                **result
-            }
-            day_results.append(shift_result)
-            
-            # Print the results
-            print(f"  {shift_type} Shift ({shift_result['start_time']}-{shift_result['end_time']}): "
-                  f"{result['calls_arrived']} calls, "
-                  f"{result['calls_handled']} handled, "
-                  f"{result['calls_abandoned']} abandoned, "
-                  f"{result['avg_wait']:.1f}s avg wait, "
-                  f"{result['service_level']:.1f}% service level with {num_agents} agents")
+        reporter.message(f"\nSimulating {day} with Pattern {pattern_number}:", DETAIL)
         
-        # Store the results for this day
-        results[day] = day_results
+        # Report the results
+        if detail:
+            for shift_result in day_results:
+                reporter.emit('pattern_simulation_shift', DETAIL, day=day, pattern_number=pattern_number,
+                              **{key: value for key, value in shift_result.items()
+                                 if key not in RAW_RESULT_FIELDS})
         
         # Calculate day summary
         day_calls = sum(r["calls_arrived"] for r in day_results)
@@ -182,10 +450,8 @@ def simulate_ideal_pattern(ideal_pattern):
         day_abandoned = sum(r["calls_abandoned"] for r in day_results)
         day_sl = np.mean([r["service_level"] for r in day_results if r["calls_handled"] > 0])
         
-        print(f"\n{day} Summary: {day_calls} calls, "
-              f"{day_handled} handled, "
-              f"{day_abandoned} abandoned, "
-              f"{day_sl:.1f}% service level")
+        reporter.emit('pattern_simulation_day', SUMMARY, day=day, calls_arrived=day_calls,
+                      calls_handled=day_handled, calls_abandoned=day_abandoned, service_level=day_sl)
     
     # Calculate weekly summary
     all_shifts = [shift for day_shifts in results.values() for shift in day_shifts]
@@ -194,9 +460,6 @@ def simulate_ideal_pattern(ideal_pattern):
     weekly_abandoned = sum(shift["calls_abandoned"] for shift in all_shifts)
     weekly_sl = np.mean([shift["service_level"] for shift in all_shifts if shift["calls_handled"] > 0])
     
-    print(f"\nWeekly Summary: {weekly_calls} calls, "
-          f"{weekly_handled} handled, "
-          f"{weekly_abandoned} abandoned, "
-          f"{weekly_sl:.1f}% service level")
-    
-    return results
\ No newline at end of file
+    reporter.emit('pattern_simulation_week', SUMMARY, calls_arrived=weekly_calls,
+                  calls_handled=weekly_handled, calls_abandoned=weekly_abandoned,
+                  service_level=weekly_sl)
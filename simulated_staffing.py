@@ -0,0 +1,163 @@
+from erlang_staffing import (calculate_required_staff_batch, DAYS_OF_WEEK, INTERVAL_MINUTES, SLA,
+                             interval_arrival_rates)
+from simulation import AHT, AVG_PATIENCE, SIM_DURATION, run_simulation
+from rng_streams import interval_streams, root_seed
+
+SEARCH_TARGET_SERVICE_LEVEL = SLA * 100  # % of answered calls within TARGET_SLA seconds
+SEARCH_REPLICATIONS = 10  # Replications behind every evaluated (agents, rate) point
+SEARCH_ENGINE = 'fast'  # Simulation engine used by the search
+
+
+class SimulatedStaffingSearch:
+    """
+    Find the smallest number of agents whose simulated service level meets the target
+
+    Erlang C ignores abandonment and answers a different question (the ASA target),
+    so its answer is only used as the starting point. From there the search brackets
+    the answer by doubling steps and bisects inside the bracket, so every hour takes
+    a handful of simulations. Starting from the offset found for the previous hour,
+    it usually needs just two: the answer and one agent fewer.
+
+    Every agent count tried for an arrival rate sees the same callers (common random
+    numbers keyed by the number of calls), which makes the simulated service level
+    increase with the number of agents and keeps the bisection consistent. Evaluated
+    (agents, rate) points are cached, so repeated rates across the week cost nothing.
+    """
+
+    def __init__(self, target_service_level=SEARCH_TARGET_SERVICE_LEVEL,
+                 replications=SEARCH_REPLICATIONS, seed=None, engine=SEARCH_ENGINE,
+                 service_time_seconds=AHT, avg_patience_seconds=AVG_PATIENCE,
+                 interval_seconds=SIM_DURATION):
+        """
+        Parameters:
+        target_service_level (float): Required % of calls answered within TARGET_SLA (default: 80)
+        replications (int): Replications per evaluated point (default: 10)
+        seed (int): Root seed of the simulations (default: None, fresh entropy)
+        engine (str): Simulation engine, see run_simulation (default: 'fast')
+        service_time_seconds (float): Average service time in seconds
+        avg_patience_seconds (float): Average caller patience in seconds
+        interval_seconds (float): Length of the staffing interval simulated for each
+                                  point (default: 3600)
+        """
+        self.target_service_level = target_service_level
+        self.replications = replications
+        self.seed = root_seed(seed)
+        self.engine = engine
+        self.service_time_seconds = service_time_seconds
+        self.avg_patience_seconds = avg_patience_seconds
+        self.interval_seconds = interval_seconds
+        self.evaluations = {}  # (agents, arrival rate) -> simulated service level
+        self.simulations = 0
+
+    def service_level(self, num_agents, arrival_rate):
+        """
+        Simulated service level of a number of agents at an arrival rate, cached
+
+        Parameters:
+        num_agents (int): Number of agents
+        arrival_rate (float): Calls per hour (per interval)
+
+        Returns:
+        float: Mean service level over the replications, in %
+        """
+        key = (num_agents, arrival_rate)
+        if key not in self.evaluations:
+            result = run_simulation(num_agents, arrival_rate, self.service_time_seconds,
+                                    self.avg_patience_seconds,
+                                    rng=interval_streams(self.seed, int(arrival_rate)),
+                                    engine=self.engine, replications=self.replications,
+                                    duration_seconds=self.interval_seconds)
+            self.evaluations[key] = result['service_level']
+            self.simulations += 1
+        return self.evaluations[key]
+
+    def meets_target(self, num_agents, arrival_rate):
+        """Whether num_agents reach the target service level at arrival_rate"""
+        return self.service_level(num_agents, arrival_rate) >= self.target_service_level
+
+    def required_staff(self, arrival_rate, start=None):
+        """
+        Smallest number of agents meeting the target service level
+
+        Parameters:
+        arrival_rate (float): Calls per hour (per interval)
+        start (int): First guess, e.g. the Erlang C answer (default: None, the Erlang C answer)
+
+        Returns:
+        int: Required number of agents (0 when no calls arrive)
+        """
+        if int(arrival_rate) <= 0:
+            return 0
+        if start is None:
+            start = int(calculate_required_staff_batch(arrival_rate, self.service_time_seconds / 60,
+                                                       interval=self.interval_seconds / 60))
+
+        # With one agent per call nobody waits, so the answer is never above that
+        upper_limit = max(1, int(arrival_rate))
+        start = min(max(start, 1), upper_limit)
+
+        # Bracket the answer: low fails the target and high meets it
+        step = 1
+        if self.meets_target(start, arrival_rate):
+            high, low = start, start - step
+            while low >= 1 and self.meets_target(low, arrival_rate):
+                high = low
+                step *= 2
+                # 0 agents never meet the target, so it closes the bracket from below
+                low = max(high - step, 0)
+        else:
+            low, high = start, start + step
+            while high < upper_limit and not self.meets_target(high, arrival_rate):
+                low = high
+                step *= 2
+                high = min(low + step, upper_limit)
+            high = min(high, upper_limit)
+
+        # Bisect inside the bracket
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.meets_target(middle, arrival_rate):
+                high = middle
+            else:
+                low = middle
+        return high
+
+
+def calculate_simulated_staffing_needs(arrival_rates=None, search=None,
+                                       interval_minutes=INTERVAL_MINUTES):
+    """
+    Calculate staffing needs for each hour (or interval) of each day by simulation
+
+    Each hour starts from its Erlang C answer shifted by the correction found for
+    the previous hour, since neighbouring hours tend to need the same correction.
+
+    Parameters:
+    arrival_rates (dict): Calls per day and hour (default: arrival_rate_urgent)
+    search (SimulatedStaffingSearch): Search settings and cache of evaluated points
+                                      (default: None, a new search with default settings)
+    interval_minutes (int): Length of the staffing intervals in minutes (default: 60)
+
+    Returns:
+    dict: Dictionary with staffing needs for each day and hour (or interval)
+    """
+    if search is None:
+        search = SimulatedStaffingSearch(interval_seconds=interval_minutes * 60)
+    if search.interval_seconds != interval_minutes * 60:
+        raise ValueError("The search simulates intervals of a different length than interval_minutes")
+
+    arrivals = interval_arrival_rates(arrival_rates, interval_minutes, whole_calls=True)
+    erlang_staff = calculate_required_staff_batch(arrivals, search.service_time_seconds / 60,
+                                                  interval=interval_minutes)
+
+    staffing_needs = {}
+    offset = 0
+    for day_index, day in enumerate(DAYS_OF_WEEK):
+        staffing_needs[day] = []
+        for period in range(arrivals.shape[1]):
+            erlang = int(erlang_staff[day_index, period])
+            required_staff = search.required_staff(arrivals[day_index, period], erlang + offset)
+            if required_staff > 0:
+                offset = required_staff - erlang
+            staffing_needs[day].append(required_staff)
+
+    return staffing_needs
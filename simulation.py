@@ -1,20 +1,111 @@
-import simpy
+from functools import partial
 import numpy as np
 import random
-from erlang_staffing import arrival_rate_urgent, URGENT_TASK_WORK_MINUTES, DAYS_OF_WEEK, HOURS_PER_DAY
+from erlang_staffing import (URGENT_TASK_WORK_MINUTES, DAYS_OF_WEEK, MINUTES_PER_HOUR,
+                             interval_arrival_rates, interval_length, period_label)
+from parallel_executor import run_seeded_tasks
+from fast_simulation import SIMULATION_ENGINES, run_queue, sample_calls
+from output import DETAIL, SUMMARY, get_reporter, text_format
+from replication import (DEFAULT_CONFIDENCE, MAX_REPLICATIONS, format_replications,
+                         run_replications, seed_from_rng)
+from rng_streams import as_call_streams, is_common_streams
+from wait_metrics import WaitHistogram, merge_wait_histograms
 
 # Convert minutes to seconds for simulation
 AHT = URGENT_TASK_WORK_MINUTES * 60  # Average handling time in seconds
 SIM_DURATION = 3600  # seconds (1 hour)
 TARGET_SLA = 20  # Target answer time in seconds for service level calculation
 AVG_PATIENCE = 120  # Average caller patience in seconds (2 minutes)
+RAW_RESULT_FIELDS = ('wait_metrics', 'wait_times')  # Result fields left out of output records
+
+
+@text_format('staffing_simulation_interval')
+def _format_interval(record):
+    # Progress with abandonment info
+    label = (f"Hour {record['interval']:2d}" if record['interval_minutes'] == MINUTES_PER_HOUR
+             else record['time'])
+    return (f"{label}: {record['calls_arrived']:.0f} calls arrived, "
+            f"{record['calls_handled']:3.0f} handled, "
+            f"{record['calls_abandoned']:3.0f} abandoned/Not Answered, "
+            f"{record['avg_wait']:5.1f}s avg wait, "
+            f"{record['service_level']:5.1f}% SL with {record['agents']} agents"
+            + format_replications(record))
+
+
+@text_format('staffing_simulation_day')
+def _format_day(record):
+    return (f"\n{record['day']} Summary: {record['calls_handled']:.0f} calls handled, "
+            f"{record['calls_abandoned']:.0f} abandoned/Not Answered, "
+            f"{record['agent_hours']:g} agent hours, "
+            f"{record['service_level']:.1f}% service level")
+
+
+@text_format('staffing_simulation_week')
+def _format_week(record):
+    return ("\nOverall Weekly Statistics:\n"
+            f"Total calls handled: {record['calls_handled']:.0f}\n"
+            f"Total calls abandoned/Not Answered: {record['calls_abandoned']:.0f}\n"
+            f"Total agent hours: {record['agent_hours']:g}\n"
+            f"Overall service level: {record['service_level']:.1f}%\n"
+            f"Wait percentiles: P50 {record['wait_p50']:.1f}s, "
+            f"P90 {record['wait_p90']:.1f}s, P99 {record['wait_p99']:.1f}s")
 
 
 def run_simulation(num_agents, arrival_rate_per_hour, service_time_seconds=AHT, 
-                   avg_patience_seconds=AVG_PATIENCE):
-    
+                   avg_patience_seconds=AVG_PATIENCE, rng=None, engine='simpy',
+                   replications=1, target_half_width=None, confidence=DEFAULT_CONFIDENCE,
+                   max_replications=MAX_REPLICATIONS, capture_waits=False,
+                   duration_seconds=SIM_DURATION):
+    """
+    Simulate one hour (or one interval) of calls with a fixed number of agents
+
+    Waits are summarized in a WaitHistogram ('wait_metrics'), which gives the P50,
+    P90 and P99 wait and the service level at any threshold in fixed memory.
+
+    Parameters:
+    num_agents (int): Number of agents available during the hour
+    arrival_rate_per_hour (float): Number of calls arriving in the hour (or in duration_seconds)
+    service_time_seconds (float): Average service time in seconds
+    avg_patience_seconds (float): Average caller patience in seconds
+    rng (numpy.random.Generator or CallStreams): Random generator for this run, or separate
+        arrival, service and patience streams from rng_streams.interval_streams for common
+        random numbers (default: None, the global numpy random state)
+    engine (str): 'simpy' for the SimPy reference model or 'fast' for the heap-based
+                  engine in fast_simulation (default: 'simpy')
+    replications (int): Number of independent replications; above 1 the result holds
+                        the means and confidence intervals (default: 1)
+    target_half_width (float): Keep adding replications until the service level
+                               confidence interval half-width is at most this many
+                               percentage points (default: None, fixed replications)
+    confidence (float): Confidence level of the intervals (default: 0.95)
+    max_replications (int): Upper limit on replications in sequential mode (default: 200)
+    capture_waits (bool): Also return every individual wait as 'wait_times' (default: False)
+    duration_seconds (float): Length of the simulated interval, e.g. 900 for a 15-minute
+                              interval (default: 3600)
+
+    Returns:
+    dict: Simulation results
+    """
+    if engine not in SIMULATION_ENGINES:
+        raise ValueError(f"Unknown simulation engine: {engine}")
+
+    if replications > 1 or target_half_width is not None:
+        # Every replication is a single run with its own random stream; common
+        # streams are passed on so replication r sees the same calls in every configuration
+        return run_replications(
+            partial(run_simulation, num_agents, arrival_rate_per_hour, service_time_seconds,
+                    avg_patience_seconds, engine=engine, capture_waits=capture_waits,
+                    duration_seconds=duration_seconds),
+            replications, rng if is_common_streams(rng) else seed_from_rng(rng),
+            confidence, target_half_width, max_replications)
+
+    # Arrival, service and patience draws; all three come from the global numpy random
+    # state when no generator is given
+    streams = as_call_streams(rng)
+    wait_metrics = WaitHistogram(thresholds=(TARGET_SLA,))
+
     if arrival_rate_per_hour == 0:
-        return {
+        result = {
             "calls_arrived": 0,
             "calls_handled": 0,
             "calls_abandoned": 0,
@@ -22,8 +113,54 @@ def run_simulation(num_agents, arrival_rate_per_hour, service_time_seconds=AHT,
             "avg_wait": 0,
             "max_wait": 0,
             "service_level": 100,
-            "wait_times": [],
+            "wait_metrics": wait_metrics,
+            **wait_metrics.percentiles(),
         }
+        if capture_waits:
+            result["wait_times"] = []
+        return result
+
+    # Number of calls to generate
+    NUM_CALLS = int(arrival_rate_per_hour)
+
+    if engine == 'fast':
+        arrival_times, service_times, patience_times = sample_calls(
+            streams, [(0, duration_seconds, NUM_CALLS)], service_time_seconds, avg_patience_seconds)
+        wait_times, calls_handled, calls_abandoned = run_queue(
+            num_agents, arrival_times, service_times, patience_times, duration_seconds)
+        calls_arrived = NUM_CALLS
+    else:
+        wait_times, calls_arrived, calls_handled, calls_abandoned = _run_simpy_hour(
+            num_agents, NUM_CALLS, service_time_seconds, avg_patience_seconds, streams,
+            duration_seconds)
+
+    # Analyze Results
+    wait_metrics.add_many(wait_times)
+    # Service level: percentage of calls answered within target time
+    service_level = wait_metrics.service_level(TARGET_SLA)
+
+    result = {
+        "calls_arrived": calls_arrived,
+        "calls_handled": calls_handled,
+        "calls_abandoned": calls_abandoned,
+        "calls_expected": arrival_rate_per_hour,
+        "avg_wait": wait_metrics.mean,
+        "max_wait": wait_metrics.max,
+        "service_level": service_level,
+        "wait_metrics": wait_metrics,
+        **wait_metrics.percentiles(),
+    }
+    # Individual waits are only kept on request, since they grow with the call volume
+    if capture_waits:
+        result["wait_times"] = wait_times
+    return result
+
+
+def _run_simpy_hour(num_agents, NUM_CALLS, service_time_seconds, avg_patience_seconds, streams,
+                    duration_seconds=SIM_DURATION):
+    """Run the SimPy model for one hour (or duration_seconds) and return (wait_times, arrived, handled, abandoned)"""
+    # Only the reference engine needs SimPy
+    import simpy
 
     # Setup simulation
     env = simpy.Environment()
@@ -34,13 +171,10 @@ def run_simulation(num_agents, arrival_rate_per_hour, service_time_seconds=AHT,
     calls_arrived = 0
     calls_abandoned = 0
 
-    # Number of calls to generate
-    NUM_CALLS = int(arrival_rate_per_hour)
-
     def call_generator(env, agents):
         nonlocal calls_arrived
         
-        arrival_times = np.sort(np.random.uniform(0, SIM_DURATION, NUM_CALLS))
+        arrival_times = np.sort(streams.arrivals.uniform(0, duration_seconds, NUM_CALLS))
         last_time = 0
         for i, scheduled_time in enumerate(arrival_times):
             yield env.timeout(scheduled_time - last_time)
@@ -54,9 +188,9 @@ def run_simulation(num_agents, arrival_rate_per_hour, service_time_seconds=AHT,
         arrival_time = env.now
         
         # Generate patience time for this caller (exponential distribution)
-        variable_service_time = np.random.exponential(service_time_seconds)
+        variable_service_time = streams.services.exponential(service_time_seconds)
         # print(f"service times: {variable_service_time:.2f} seconds")
-        patience = np.random.exponential(avg_patience_seconds)
+        patience = streams.patience.exponential(avg_patience_seconds)
         # print(f"patience: {patience:.2f} seconds")
 
         # Request an agent but might abandon if wait is too long
@@ -81,94 +215,180 @@ def run_simulation(num_agents, arrival_rate_per_hour, service_time_seconds=AHT,
     env.process(call_generator(env, agents))
 
     # Run the simulation for one hour
-    env.run(until=SIM_DURATION)
+    env.run(until=duration_seconds)
 
-    # Analyze Results
-    if len(wait_times) > 0:
-        wait_array = np.array(wait_times)
-        avg_wait = np.mean(wait_array)
-        max_wait = np.max(wait_array)
-        # Service level: percentage of calls answered within target time
-        service_level = np.mean(wait_array <= TARGET_SLA) * 100
+    return wait_times, calls_arrived, calls_handled, calls_abandoned
+
+
+def simulate_staffing_plan(staffing_needs, workers=1, seed=None, engine='simpy',
+                           replications=1, target_half_width=None, crn=False,
+                           capture_waits=False, arrival_rates=None):
+    """
+    Simulate every hour (or interval) of the week with the calculated staffing
+
+    The interval length follows the staffing needs: 96 values a day are simulated as
+    15-minute intervals, with hourly arrival rates spread evenly over them.
+
+    The hours are independent, so they can be spread over a process pool. With more than
+    one worker, or a seed, every hour gets its own random stream spawned from the seed
+    and the results are identical whatever the number of workers.
+
+    With crn=True the streams are keyed by day and hour instead (common random
+    numbers): every staffing plan simulated with the same seed sees exactly the same
+    callers in each hour, so two plans can be compared without the noise of different draws.
+
+    Parameters:
+    staffing_needs (dict): Dictionary with staffing needs for each day and hour (or interval)
+    workers (int): Number of worker processes; 0 uses every core (default: 1, in this process)
+    seed (int): Root seed for the per-hour random streams (default: None)
+    engine (str): Simulation engine passed to run_simulation (default: 'simpy')
+    replications (int): Replications per run, see run_simulation (default: 1)
+    target_half_width (float): Sequential stopping target for the service level
+                               confidence interval, see run_simulation (default: None)
+    crn (bool): Use common random numbers keyed by day and hour (default: False)
+    capture_waits (bool): Keep every individual wait in the results (default: False)
+    arrival_rates (dict): Calls per day and hour (default: arrival_rate_urgent)
+
+    Progress is reported to output.get_reporter(): a 'staffing_simulation_interval'
+    record per interval (DETAIL), then 'staffing_simulation_day' and
+    'staffing_simulation_week' summaries (SUMMARY).
+
+    Returns:
+    list: One result dict per day and interval, with its 'interval' number, start 'time'
+          and clock 'hour'
+    """
+    periods = len(staffing_needs[DAYS_OF_WEEK[0]])
+    interval_minutes = interval_length(periods)
+    arrivals = interval_arrival_rates(arrival_rates, interval_minutes, whole_calls=True).tolist()
+    cells = [(day_index, period) for day_index in range(len(DAYS_OF_WEEK)) for period in range(periods)]
+    all_results = _simulate_cells(staffing_needs, arrivals, cells, interval_minutes, workers, seed,
+                                  engine, replications, target_half_width, crn, capture_waits)
+
+    # Progress is reported once all the results have been gathered
+    _report_plan(all_results, interval_minutes, range(len(DAYS_OF_WEEK)))
+    return all_results
+
+
+def update_staffing_simulation(results, staffing_needs, cells, workers=1, seed=None, engine='simpy',
+                               replications=1, target_half_width=None, crn=False,
+                               capture_waits=False, arrival_rates=None):
+    """
+    Re-simulate only some intervals of a simulate_staffing_plan result
+
+    Used after part of the forecast (or of the staffing) changed: the intervals in
+    cells are simulated again with their new staffing and calls, and every other
+    interval keeps its result. With crn=True and a seed, each interval draws from the
+    streams of its day and interval whatever else is simulated, so the result is the
+    same as simulating the whole plan again.
+
+    The re-simulated days and the week are reported as in simulate_staffing_plan.
+
+    Parameters:
+    results (list): simulate_staffing_plan result to update, left unchanged
+    staffing_needs (dict): The new staffing needs
+    cells (numpy.ndarray): Boolean (7, intervals per day) mask of the intervals to simulate
+    workers, seed, engine, replications, target_half_width, crn, capture_waits,
+    arrival_rates: As for simulate_staffing_plan, with arrival_rates the new forecast
+
+    Returns:
+    list: One result dict per day and interval, as simulate_staffing_plan returns
+    """
+    periods = len(staffing_needs[DAYS_OF_WEEK[0]])
+    interval_minutes = interval_length(periods)
+    arrivals = interval_arrival_rates(arrival_rates, interval_minutes, whole_calls=True).tolist()
+    changed = [tuple(cell) for cell in np.argwhere(cells).tolist()]
+    updated = list(results)
+    for (day_index, period), result in zip(changed, _simulate_cells(
+            staffing_needs, arrivals, changed, interval_minutes, workers, seed, engine,
+            replications, target_half_width, crn, capture_waits)):
+        updated[day_index * periods + period] = result
+
+    _report_plan(updated, interval_minutes, sorted({day_index for day_index, _ in changed}))
+    return updated
+
+
+def _simulate_cells(staffing_needs, arrivals, cells, interval_minutes, workers, seed, engine,
+                    replications, target_half_width, crn, capture_waits):
+    """Simulate the (day index, period) cells and return one result dict for each"""
+    tasks = [(staffing_needs[DAYS_OF_WEEK[day_index]][period], arrivals[day_index][period])
+             for day_index, period in cells]
+    stream_keys = list(cells) if crn else None
+    if workers == 1 and seed is None and not crn:
+        results = [run_simulation(*task, engine=engine, replications=replications,
+                                  target_half_width=target_half_width,
+                                  capture_waits=capture_waits,
+                                  duration_seconds=interval_minutes * 60) for task in tasks]
     else:
-        avg_wait = 0
-        max_wait = 0
-        service_level = 100
-        
+        results = run_seeded_tasks(run_simulation, tasks, workers=workers, seed=seed,
+                                   stream_keys=stream_keys, engine=engine,
+                                   replications=replications,
+                                   target_half_width=target_half_width,
+                                   capture_waits=capture_waits,
+                                   duration_seconds=interval_minutes * 60)
 
-    return {
-        "calls_arrived": calls_arrived,
-        "calls_handled": calls_handled,
-        "calls_abandoned": calls_abandoned,
-        "calls_expected": arrival_rate_per_hour,
-        "avg_wait": avg_wait,
-        "max_wait": max_wait,
-        "service_level": service_level,
-        "wait_times": wait_times,
-    }
+    simulation_results = []
+    for (day_index, period), (num_agents, arrival_rate), result in zip(cells, tasks, results):
+        simulation_result = {
+            "day": DAYS_OF_WEEK[day_index],
+            "hour": period * interval_minutes // MINUTES_PER_HOUR,
+            "interval": period,
+            "time": period_label(period, interval_minutes),
+            "calls_expected": arrival_rate,
+            "calls_arrived": result["calls_arrived"],
+            "calls_handled": result["calls_handled"],
+            "calls_abandoned": result["calls_abandoned"],
+            "agents": num_agents,
+            "avg_wait": result["avg_wait"],
+            "max_wait": result["max_wait"],
+            "service_level": result["service_level"],
+            "wait_metrics": result["wait_metrics"],
+            **result["wait_metrics"].percentiles(),
+        }
+        if capture_waits:
+            simulation_result["wait_times"] = result["wait_times"]
+        # Replicated runs also carry their confidence intervals
+        if "replications" in result:
+            simulation_result.update(
+                {key: value for key, value in result.items() if key not in simulation_result})
+        simulation_results.append(simulation_result)
+    return simulation_results
 
 
-def simulate_staffing_plan(staffing_needs):
-    
-    all_results = []
-
-    for day in DAYS_OF_WEEK:
-        day_results = []
-        print(f"\nSimulating {day}:")
-
-        for hour in range(HOURS_PER_DAY):
-            num_agents = staffing_needs[day][hour]
-            arrival_rate = arrival_rate_urgent[day][hour]
-
-            # Run the simulation
-            result = run_simulation(num_agents, arrival_rate)
-            simulation_result = {
-                "day": day,
-                "hour": hour,
-                "calls_expected": arrival_rate,
-                "calls_arrived": result["calls_arrived"],
-                "calls_handled": result["calls_handled"],
-                "calls_abandoned": result["calls_abandoned"],
-                "agents": num_agents,
-                "avg_wait": result["avg_wait"],
-                "max_wait": result["max_wait"],
-                "service_level": result["service_level"],
-                "wait_times": result["wait_times"]
-            }
-
-            day_results.append(simulation_result)
-
-            # Print progress with abandonment info
-            print(f"Hour {hour:2d}: {result['calls_arrived']} calls arrived, "
-                  f"{result['calls_handled']:3.0f} handled, "
-                  f"{result['calls_abandoned']:3.0f} abandoned/Not Answered, "
-                  f"{result['avg_wait']:5.1f}s avg wait, "
-                  f"{result['service_level']:5.1f}% SL with {num_agents} agents")
-
-        all_results.extend(day_results)
+def _report_plan(all_results, interval_minutes, day_indices):
+    """Report the intervals and summary of the given days, then the weekly statistics"""
+    reporter = get_reporter()
+    detail = reporter.enabled(DETAIL)
+    periods = len(all_results) // len(DAYS_OF_WEEK)
+    for day_index in day_indices:
+        day = DAYS_OF_WEEK[day_index]
+        day_results = all_results[day_index * periods:(day_index + 1) * periods]
+        reporter.message(f"\nSimulating {day}:", DETAIL)
+
+        if detail:
+            for simulation_result in day_results:
+                reporter.emit('staffing_simulation_interval', DETAIL, interval_minutes=interval_minutes,
+                              **{key: value for key, value in simulation_result.items()
+                                 if key not in RAW_RESULT_FIELDS})
 
         # Calculate day summary
         day_calls_handled = sum(r["calls_handled"] for r in day_results)
         day_calls_abandoned = sum(r["calls_abandoned"] for r in day_results)
-        day_agents = sum(r["agents"] for r in day_results)
+        day_agents = sum(r["agents"] for r in day_results) * interval_minutes / MINUTES_PER_HOUR
         day_sl = np.mean([r["service_level"] for r in day_results if r["calls_handled"] > 0])
 
-        print(f"\n{day} Summary: {day_calls_handled:.0f} calls handled, "
-              f"{day_calls_abandoned:.0f} abandoned/Not Answered, "
-              f"{day_agents} agent hours, "
-              f"{day_sl:.1f}% service level")
+        reporter.emit('staffing_simulation_day', SUMMARY, day=day, calls_handled=day_calls_handled,
+                      calls_abandoned=day_calls_abandoned, agent_hours=day_agents,
+                      service_level=day_sl)
 
     # Calculate overall statistics
     total_calls_handled = sum(r["calls_handled"] for r in all_results)
     total_calls_abandoned = sum(r["calls_abandoned"] for r in all_results)
-    total_agents = sum(r["agents"] for r in all_results)
+    total_agents = sum(r["agents"] for r in all_results) * interval_minutes / MINUTES_PER_HOUR
     overall_sl = np.mean([r["service_level"] for r in all_results if r["calls_handled"] > 0])
+    weekly_waits = merge_wait_histograms(r["wait_metrics"] for r in all_results)
 
-    print("\nOverall Weekly Statistics:")
-    print(f"Total calls handled: {total_calls_handled:.0f}")
-    print(f"Total calls abandoned/Not Answered: {total_calls_abandoned:.0f}")
-    print(f"Total agent hours: {total_agents}")
-    print(f"Overall service level: {overall_sl:.1f}%")
-
-    return all_results
+    reporter.emit('staffing_simulation_week', SUMMARY, calls_handled=total_calls_handled,
+                  calls_abandoned=total_calls_abandoned, agent_hours=total_agents,
+                  service_level=overall_sl, wait_p50=weekly_waits.quantile(0.5),
+                  wait_p90=weekly_waits.quantile(0.9), wait_p99=weekly_waits.quantile(0.99))
 
@@ -0,0 +1,247 @@
+import sqlite3
+from collections import OrderedDict
+import numpy as np
+from erlang_staffing import (URGENT_TASK_WORK_MINUTES, SLA, AVERAGE_SPEED_OF_ANSWER, AVERAGE_PATIENCE_MINUTES,
+                             MINUTES_PER_HOUR, calculate_required_staff_batch)
+
+DEFAULT_MAX_ENTRIES = 100000  # Number of staffing results kept in memory
+# SQLite table and key columns by key length: Erlang C keys, and Erlang A keys with the patience
+KEY_TABLES = {
+    5: ('required_staff', ('arrival_rate', 'aht', 'asa', 'sla', 'interval')),
+    6: ('required_staff_erlang_a', ('arrival_rate', 'aht', 'asa', 'sla', 'interval', 'patience')),
+}
+
+
+class StaffingCache:
+    """
+    Cache of required staff keyed by (arrival rate, AHT, ASA, SLA, interval)
+
+    Erlang A results (required_staff_erlang_a) also carry the caller patience in their key
+    and are stored apart from the Erlang C ones. Results are kept in memory with
+    least-recently-used eviction once max_entries is reached. When a path is given, every
+    computed result is also written to an SQLite file, so later runs and scenario sweeps
+    that open the same file start warm.
+
+    Parameters:
+    max_entries (int): Maximum number of results kept in memory (default: 100000)
+    path (str): Optional SQLite file used as a persistent store (default: None, memory only)
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, path=None):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be greater than 0")
+
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._connection = None
+        if path is not None:
+            self._connection = sqlite3.connect(path, timeout=30)
+            for table, columns in KEY_TABLES.values():
+                self._connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    + "".join(f"{column} REAL, " for column in columns)
+                    + f"staff INTEGER, PRIMARY KEY ({', '.join(columns)}))")
+            self._connection.commit()
+
+    @staticmethod
+    def make_key(arrival_rate, service_time_minutes=URGENT_TASK_WORK_MINUTES,
+                 target_wait_probability=SLA, asa=AVERAGE_SPEED_OF_ANSWER,
+                 interval=MINUTES_PER_HOUR):
+        """Build the cache key for one staffing calculation"""
+        return (float(arrival_rate), float(service_time_minutes), float(asa),
+                float(target_wait_probability), float(interval))
+
+    @staticmethod
+    def make_erlang_a_key(arrival_rate, service_time_minutes=URGENT_TASK_WORK_MINUTES,
+                          patience_minutes=AVERAGE_PATIENCE_MINUTES, target_wait_probability=SLA,
+                          asa=AVERAGE_SPEED_OF_ANSWER, interval=MINUTES_PER_HOUR):
+        """Build the cache key for one Erlang A staffing calculation"""
+        return StaffingCache.make_key(arrival_rate, service_time_minutes, target_wait_probability,
+                                      asa, interval) + (float(patience_minutes),)
+
+    def lookup(self, key):
+        """
+        Look up a staffing result, first in memory and then in the persistent store
+
+        Parameters:
+        key (tuple): Key built with make_key or make_erlang_a_key
+
+        Returns:
+        int: The cached number of staff, or None if the key has not been computed yet
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        if self._connection is not None:
+            table, columns = KEY_TABLES[len(key)]
+            row = self._connection.execute(
+                f"SELECT staff FROM {table} WHERE " + " AND ".join(f"{column} = ?" for column in columns),
+                key).fetchone()
+            if row is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self._remember(key, row[0])
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    def store(self, key, staff):
+        """Store a computed staffing result in memory and in the persistent store"""
+        self.store_many([(key, staff)])
+
+    def store_many(self, items):
+        """Store several (key, staff) results, writing them to disk in one transaction"""
+        items = [(key, int(staff)) for key, staff in items]
+        for key, staff in items:
+            self._remember(key, staff)
+
+        if self._connection is not None and items:
+            for length, (table, columns) in KEY_TABLES.items():
+                rows = [key + (staff,) for key, staff in items if len(key) == length]
+                if rows:
+                    self._connection.executemany(
+                        f"INSERT OR REPLACE INTO {table} VALUES ({', '.join('?' * (length + 1))})", rows)
+            self._connection.commit()
+
+    def required_staff(self, arrival_rates, service_time_minutes=URGENT_TASK_WORK_MINUTES,
+                       target_wait_probability=SLA, asa=AVERAGE_SPEED_OF_ANSWER,
+                       interval=MINUTES_PER_HOUR):
+        """
+        Cached version of erlang_staffing.calculate_required_staff_batch
+
+        Each distinct combination is looked up once; the misses are solved together in a
+        single batched call and added to the cache.
+
+        Parameters:
+        arrival_rates (array-like): Arrival rate for each interval
+        service_time_minutes (float or array-like): Average service time in minutes
+        target_wait_probability (float or array-like): Target service level
+        asa (float or array-like): Target answer time (minutes)
+        interval (float or array-like): Interval length in minutes
+
+        Returns:
+        numpy.ndarray: Required number of staff, with the broadcast shape of the inputs
+        """
+        return self._required(
+            (arrival_rates, service_time_minutes, target_wait_probability, asa, interval),
+            self.make_key,
+            lambda rates, aht, asa_values, service_levels, intervals: calculate_required_staff_batch(
+                rates, aht, service_levels, asa_values, intervals))
+
+    def required_staff_erlang_a(self, arrival_rates, service_time_minutes=URGENT_TASK_WORK_MINUTES,
+                                patience_minutes=AVERAGE_PATIENCE_MINUTES, target_wait_probability=SLA,
+                                asa=AVERAGE_SPEED_OF_ANSWER, interval=MINUTES_PER_HOUR):
+        """
+        Cached version of erlang_a.calculate_required_staff_erlang_a
+
+        Parameters:
+        arrival_rates (array-like): Arrival rate for each interval
+        service_time_minutes (float or array-like): Average service time in minutes
+        patience_minutes (float or array-like): Average caller patience in minutes
+        target_wait_probability (float or array-like): Target service level
+        asa (float or array-like): Target answer time (minutes)
+        interval (float or array-like): Interval length in minutes
+
+        Returns:
+        numpy.ndarray: Required number of staff, with the broadcast shape of the inputs
+        """
+        # Imported here because erlang_a is only needed for Erlang A staffing
+        from erlang_a import calculate_required_staff_erlang_a
+        return self._required(
+            (arrival_rates, service_time_minutes, patience_minutes, target_wait_probability, asa, interval),
+            self.make_erlang_a_key,
+            lambda rates, aht, asa_values, service_levels, intervals, patience: calculate_required_staff_erlang_a(
+                rates, aht, patience, service_levels, asa_values, intervals))
+
+    def _required(self, values, make_key, solve):
+        """
+        Required staff for broadcast input arrays, solving only the keys not cached yet
+
+        Parameters:
+        values (tuple): The inputs, in the argument order of make_key
+        make_key (callable): Builds the key of one cell from its inputs
+        solve (callable): Solves arrays of the missing keys' fields, in key order
+
+        Returns:
+        numpy.ndarray: Required number of staff, with the broadcast shape of the inputs
+        """
+        columns = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in values))
+        shape = columns[0].shape
+        keys = [make_key(*cell) for cell in
+                zip(*(column.ravel().tolist() for column in columns))]
+
+        # Group cells that share the same key so each one is resolved once
+        positions_by_key = {}
+        for position, key in enumerate(keys):
+            positions_by_key.setdefault(key, []).append(position)
+
+        required = np.zeros(len(keys), dtype=np.int64)
+        missing = []
+        for key, positions in positions_by_key.items():
+            staff = self.lookup(key)
+            if staff is None:
+                missing.append(key)
+            else:
+                required[positions] = staff
+
+        if missing:
+            solved = np.asarray(solve(*(np.array(field) for field in zip(*missing))))
+            for key, staff in zip(missing, solved):
+                required[positions_by_key[key]] = staff
+            self.store_many(zip(missing, solved.tolist()))
+
+        return required.reshape(shape)
+
+    def stats(self):
+        """
+        Report cache usage
+
+        Returns:
+        dict: Hits, disk hits, misses, evictions, current size and hit rate (0-1)
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+        }
+
+    def clear(self):
+        """Drop the in-memory entries and reset the statistics (the persistent store is kept)"""
+        self._entries.clear()
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def close(self):
+        """Close the persistent store"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _remember(self, key, staff):
+        """Insert a result in memory, evicting the least recently used entries"""
+        self._entries[key] = staff
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
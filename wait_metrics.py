@@ -0,0 +1,168 @@
+import bisect
+import numpy as np
+
+WAIT_HISTOGRAM_MIN = 0.01  # Waits below this many seconds (e.g. answered at once) share the first bin
+WAIT_HISTOGRAM_MAX = 86400.0  # Waits of this many seconds or more share the last bin
+WAIT_HISTOGRAM_GROWTH = 1.04  # Each bin is 4% wider than the previous, so quantiles are within 2%
+WAIT_PERCENTILES = (50, 90, 99)  # Percentiles reported with every simulation result
+
+# Bin edges shared by every histogram, so histograms merge by adding their counts
+WAIT_BIN_EDGES = WAIT_HISTOGRAM_MIN * WAIT_HISTOGRAM_GROWTH ** np.arange(
+    int(np.ceil(np.log(WAIT_HISTOGRAM_MAX / WAIT_HISTOGRAM_MIN) / np.log(WAIT_HISTOGRAM_GROWTH))) + 1)
+_EDGES = WAIT_BIN_EDGES.tolist()
+
+
+class WaitHistogram:
+    """
+    Fixed-size streaming summary of wait times
+
+    Waits are counted in logarithmic bins instead of being kept, so memory does not
+    grow with the number of calls and two histograms merge by adding their counts,
+    whatever replication or worker process they come from. The count, mean and
+    maximum are exact, and so is the share of waits within each of the thresholds
+    given when the histogram is created (e.g. the SLA target). Quantiles and the
+    share within any other threshold are interpolated within a bin.
+    """
+
+    def __init__(self, thresholds=()):
+        """
+        Parameters:
+        thresholds (tuple): Wait times in seconds whose service level is counted exactly
+        """
+        self.thresholds = tuple(sorted(set(thresholds)))
+        self.counts = np.zeros(len(_EDGES) + 1, dtype=np.int64)
+        self.within = np.zeros(len(self.thresholds), dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, wait):
+        """Record a single wait in seconds"""
+        self.counts[bisect.bisect_right(_EDGES, wait)] += 1
+        for index, threshold in enumerate(self.thresholds):
+            if wait <= threshold:
+                self.within[index] += 1
+        self.count += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+
+    def add_many(self, waits):
+        """Record an array or list of waits in seconds"""
+        waits = np.asarray(waits, dtype=float)
+        if waits.size == 0:
+            return
+        self.counts += np.bincount(np.searchsorted(WAIT_BIN_EDGES, waits, side='right'),
+                                   minlength=self.counts.size)
+        for index, threshold in enumerate(self.thresholds):
+            self.within[index] += np.count_nonzero(waits <= threshold)
+        self.count += waits.size
+        self.total += float(np.sum(waits))
+        self.max = max(self.max, float(np.max(waits)))
+
+    def merge(self, other):
+        """
+        Add the waits of another histogram to this one
+
+        Parameters:
+        other (WaitHistogram): Histogram with the same thresholds
+
+        Returns:
+        WaitHistogram: This histogram
+        """
+        if other.thresholds != self.thresholds:
+            raise ValueError("Cannot merge wait histograms with different thresholds")
+        self.counts += other.counts
+        self.within += other.within
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self):
+        """Average wait in seconds (0 without waits)"""
+        return self.total / self.count if self.count > 0 else 0
+
+    def service_level(self, threshold):
+        """
+        Percentage of waits of at most threshold seconds
+
+        Parameters:
+        threshold (float): Answer time target in seconds
+
+        Returns:
+        float: Service level in %, exact for the histogram's thresholds (100 without waits)
+        """
+        if self.count == 0:
+            return 100
+        if threshold in self.thresholds:
+            return self.within[self.thresholds.index(threshold)] / self.count * 100
+        if threshold >= self.max:
+            return 100.0
+
+        index = bisect.bisect_right(_EDGES, threshold)
+        below = float(self.counts[:index].sum())
+        if 0 < index < len(_EDGES):
+            # Part of the bin holding the threshold, assuming waits spread evenly in it
+            low, high = _EDGES[index - 1], _EDGES[index]
+            below += self.counts[index] * (threshold - low) / (high - low)
+        return below / self.count * 100
+
+    def quantile(self, q):
+        """
+        Wait time below which a share q of the waits fall
+
+        Parameters:
+        q (float): Quantile between 0 and 1
+
+        Returns:
+        float: Wait in seconds (0 without waits)
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be between 0 and 1")
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, rank, side='left'))
+        if index == 0:
+            # Answered (almost) at once
+            return 0.0
+        if index >= len(_EDGES):
+            return self.max
+
+        low, high = _EDGES[index - 1], min(_EDGES[index], self.max)
+        previous = cumulative[index - 1]
+        fraction = (rank - previous) / self.counts[index]
+        return min(low + (high - low) * fraction, self.max)
+
+    def percentiles(self, percentiles=WAIT_PERCENTILES):
+        """
+        Wait percentiles for result dicts
+
+        Parameters:
+        percentiles (tuple): Percentiles to report (default: 50, 90 and 99)
+
+        Returns:
+        dict: e.g. {'wait_p50': 0.0, 'wait_p90': 14.2, 'wait_p99': 61.0}
+        """
+        return {f"wait_p{percentile}": self.quantile(percentile / 100) for percentile in percentiles}
+
+
+def merge_wait_histograms(histograms):
+    """
+    Combine wait histograms, e.g. of several replications or of every hour of a week
+
+    Parameters:
+    histograms (iterable): WaitHistogram objects with the same thresholds
+
+    Returns:
+    WaitHistogram: A new histogram with all the waits (None if there are no histograms)
+    """
+    merged = None
+    for histogram in histograms:
+        if merged is None:
+            merged = WaitHistogram(histogram.thresholds)
+        merged.merge(histogram)
+    return merged